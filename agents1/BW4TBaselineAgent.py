@@ -2,9 +2,9 @@
 from typing import final, List, Dict, Final
 import enum, random
 from bw4t.BW4TBrain import BW4TBrain
+from bw4t.TrustModel import TrustModel, FoundWithoutColourRule
 from matrx.agents.agent_utils.state import State
-from matrx.agents.agent_utils.navigator import Navigator
-from matrx.agents.agent_utils.state_tracker import StateTracker
+from bw4t.Navigation import CachedNavigator
 from matrx.actions.door_actions import OpenDoorAction
 from matrx.actions.object_actions import GrabObject, DropObject
 from matrx.messages.message import Message
@@ -21,12 +21,14 @@ class BaseLineAgent(BW4TBrain):
         super().__init__(settings)
         self._phase = Phase.PLAN_PATH_TO_CLOSED_DOOR
         self._teamMembers = []
+        self._receivedMessages = {}
+        # You can change the default trust value to your preference
+        self._trustModel = TrustModel(FoundWithoutColourRule(penalty=0.1), default=0.5)
 
     def initialize(self):
         super().initialize()
-        self._state_tracker = StateTracker(agent_id=self.agent_id)
-        self._navigator = Navigator(agent_id=self.agent_id, 
-            action_set=self.action_set, algorithm=Navigator.A_STAR_ALGORITHM)
+        self._trustModel = TrustModel(FoundWithoutColourRule(penalty=0.1), default=0.5)
+        self._navigator = CachedNavigator(self.agent_id, self.getPathCache())
 
     def filter_bw4t_observations(self, state):
         return state
@@ -40,14 +42,14 @@ class BaseLineAgent(BW4TBrain):
         # Process messages from team members
         receivedMessages = self._processMessages(self._teamMembers)
         # Update trust beliefs for team members
-        self._trustBlief(self._teamMembers, receivedMessages)
+        self._trustBlief(self._teamMembers)
         
         while True:
             if Phase.PLAN_PATH_TO_CLOSED_DOOR==self._phase:
                 self._navigator.reset_full()
-                closedDoors = [door for door in state.values()
-                    if 'class_inheritance' in door and 'Door' in door['class_inheritance'] and not door['is_open']]
+                closedDoors = self.getStateIndex().getClosedDoors()
                 if len(closedDoors)==0:
+                    self.idleUntil()
                     return None, {}
                 # Randomly pick a closed door
                 self._door = random.choice(closedDoors)
@@ -60,9 +62,8 @@ class BaseLineAgent(BW4TBrain):
                 self._phase=Phase.FOLLOW_PATH_TO_CLOSED_DOOR
 
             if Phase.FOLLOW_PATH_TO_CLOSED_DOOR==self._phase:
-                self._state_tracker.update(state)
                 # Follow path to door
-                action = self._navigator.get_move_action(self._state_tracker)
+                action = self._navigator.get_move_action(self.getStateIndex())
                 if action!=None:
                     return action, {}   
                 self._phase=Phase.OPEN_DOOR
@@ -78,34 +79,27 @@ class BaseLineAgent(BW4TBrain):
         Enable sending messages in one line of code
         '''
         msg = Message(content=mssg, from_id=sender)
-        if msg.content not in self.received_messages:
-            self.send_message(msg)
+        self.send_message(msg)
 
     def _processMessages(self, teamMembers):
         '''
-        Process incoming messages and create a dictionary with received messages from each team member.
+        Process incoming messages and add the new ones to the dictionary with received messages from each team member.
         '''
-        receivedMessages = {}
         for member in teamMembers:
-            receivedMessages[member] = []
-        for mssg in self.received_messages:
-            for member in teamMembers:
-                if mssg.from_id == member:
-                    receivedMessages[member].append(mssg.content)       
-        return receivedMessages
+            self._receivedMessages.setdefault(member, [])
+        for mssg in self.received_messages.getNew():
+            if mssg.from_id in self._receivedMessages:
+                self._receivedMessages[mssg.from_id].append(mssg.content)
+        return self._receivedMessages
 
-    def _trustBlief(self, member, received):
+    def _trustBlief(self, members):
         '''
-        Baseline implementation of a trust belief. Creates a dictionary with trust belief scores for each team member, for example based on the received messages.
+        Baseline implementation of a trust belief. Updates the trust belief scores for each team member with the
+        messages received since the previous call, and returns the trust table.
         '''
-        # You can change the default value to your preference
-        default = 0.5
-        trustBeliefs = {}
-        for member in received.keys():
-            trustBeliefs[member] = default
-        for member in received.keys():
-            for message in received[member]:
-                if 'Found' in message and 'colour' not in message:
-                    trustBeliefs[member]-=0.1
-                    break
-        return trustBeliefs
+        for member in members:
+            self._trustModel.addMember(member)
+        return self._trustModel.update(self.received_messages.getNew('trust'))
+
+    def getTrustModel(self):
+        return self._trustModel
@@ -1,12 +1,15 @@
 
 from typing import final, List, Dict, Final
 import enum, random
+import numpy as np
 from bw4t.BW4TBrain import BW4TBrain
+from bw4t.TrustModel import TrustModel, FoundWithoutColourRule
 from matrx.agents.agent_utils.state import State
-from matrx.agents.agent_utils.navigator import Navigator
-from matrx.agents.agent_utils.state_tracker import StateTracker
+from bw4t.Navigation import CachedNavigator
+from bw4t.BW4TBlocks import CollectableBlock
 from matrx.actions.door_actions import OpenDoorAction, CloseDoorAction
 from matrx.actions.object_actions import GrabObject, DropObject
+from matrx.actions.move_actions import MoveEast
 from matrx.messages.message import Message
 
 # Procedure
@@ -42,18 +45,23 @@ class Phase(enum.Enum):
     CLOSE_DOOR = 15
 
 class Team40Agent(BW4TBrain):
+    # The number of times the agent plans a path to the drop zone before it gives up and drops the block
+    MAX_DROP_ATTEMPTS:int = 10
 
     def __init__(self, settings:Dict[str,object]):
         super().__init__(settings)
         self._isFirstAction = True
         self._phase = Phase.DECIDE_ACTION
         self._teamMembers = []
+        self._receivedMessages = {}
+        # You can change the default trust value to your preference
+        self._trustModel = TrustModel(FoundWithoutColourRule(penalty=0.1), default=0.5)
         self._activeObjectives = []
 
     def initialize(self):
         super().initialize()
-        self._state_tracker = StateTracker(agent_id=self.agent_id)
-        self._navigator = Navigator(agent_id=self.agent_id, action_set=self.action_set, algorithm=Navigator.A_STAR_ALGORITHM)
+        self._trustModel = TrustModel(FoundWithoutColourRule(penalty=0.1), default=0.5)
+        self._navigator = CachedNavigator(self.agent_id, self.getPathCache())
 
     def filter_bw4t_observations(self, state):
         return state
@@ -69,14 +77,15 @@ class Team40Agent(BW4TBrain):
         # Process messages from team members
         receivedMessages = self._processMessages(self._teamMembers)
         # Update trust beliefs for team members
-        self._trustBlief(self._teamMembers, receivedMessages)
+        self._trustBlief(self._teamMembers)
 
-        # get goal objectives initially
+        # get goal objectives initially, zone by zone in the order they have to be delivered
         if self._isFirstAction:
-            self._activeObjectives = [goal for goal in state.values()
-                                      if 'is_goal_block' in goal and goal['is_goal_block']]
+            self._activeObjectives = self.getStateIndex().getGoalBlocksInOrder()
 
         self._isFirstAction = False
+        # Forget the objectives team members delivered
+        self._removeDelivered(self.received_messages.getNew('objectives'))
 
         while True:
             if Phase.DECIDE_ACTION == self._phase:
@@ -84,12 +93,20 @@ class Team40Agent(BW4TBrain):
 
                 # carrying something, go drop it
                 if len(self._carrying) != 0:
-                    ind = self._indexObjEquals(self._activeObjectives, self._carrying[0])
-
-                    # holding a useless block
-                    if ind == -1:
+                    self._goal_obj = self._findDeliverable(self._carrying[0])
+
+                    # holding a block that no objective needs anymore, drop it and look for another
+                    if self._indexObjEquals(self._activeObjectives, self._carrying[0]) == -1:
+                        # not on a drop zone, where it would be in the way. The zones are columns.
+                        if self._isAtGoalLocation(state[self.agent_id]['location']):
+                            return MoveEast.__name__, {}
+                        return DropObject.__name__, {'object_id': self._carrying[0]['obj_id']}
+                    # holding a block that is needed after other blocks of its zone
+                    elif self._goal_obj is None:
+                        self.idleUntil()
                         return None, {}
                     else:
+                        self._dropAttempts = 0
                         self._phase = Phase.PLAN_PATH_TO_DROP_OBJECT
 
                 # still have to look for goal objects
@@ -98,39 +115,53 @@ class Team40Agent(BW4TBrain):
 
                 # no job left to do
                 else:
+                    self.idleUntil()
                     return None, {}
 
             if Phase.PLAN_PATH_TO_DROP_OBJECT == self._phase:
                 self._navigator.reset_full()
 
-                ind = self._indexObjEquals(self._activeObjectives, self._carrying[0])
-                self._loc_goal = self._activeObjectives[ind]['location']
+                self._loc_goal = self._goal_obj['location']
 
                 self._navigator.add_waypoint(self._loc_goal)
                 self._phase = Phase.FOLLOW_PATH_TO_DROP_OBJECT
 
             if Phase.FOLLOW_PATH_TO_DROP_OBJECT == self._phase:
-                self._state_tracker.update(state)
-                action = self._navigator.get_move_action(self._state_tracker)
+                # a team member delivered the objective first
+                if self._goal_obj not in self._activeObjectives:
+                    self._phase = Phase.DECIDE_ACTION
+                    continue
+                action = self._navigator.get_move_action(self.getStateIndex())
                 if action is not None:
                     return action, {}
                 self._phase = Phase.DROP_OBJECT
 
             if Phase.DROP_OBJECT == self._phase:
+                location = state[self.agent_id]['location']
+                if tuple(location) != tuple(self._loc_goal):
+                    self._dropAttempts += 1
+                    # the path was blocked, e.g. by another agent. Wait and try again
+                    if self._dropAttempts < self.MAX_DROP_ATTEMPTS:
+                        self._phase = Phase.PLAN_PATH_TO_DROP_OBJECT
+                        return None, {}
+                    # there is no path to the drop zone, drop the block and look for other work.
+                    # Not on a drop zone, where it would be in the way
+                    if self._isAtGoalLocation(location):
+                        return MoveEast.__name__, {}
+                    self._phase = Phase.DECIDE_ACTION
+                    return DropObject.__name__, {'object_id': self._carrying[0]['obj_id']}
                 self._phase = Phase.DECIDE_ACTION
                 self._sendMessage('Dropped goal block ' + str(self._carrying[0]['visualization'])
                                   + ' at location ' + str(self._loc_goal),
                                   agent_name)
-                self._activeObjectives.pop(0)
+                self._activeObjectives.remove(self._goal_obj)
                 return DropObject.__name__, {'object_id': self._carrying[0]['obj_id']}
 
             if Phase.PLAN_PATH_TO_CLOSED_DOOR == self._phase:
                 self._navigator.reset_full()
-                closedDoors = [door for door in state.values()
-                               if 'class_inheritance' in door
-                               and 'Door' in door['class_inheritance']
-                               and not door['is_open']]
+                closedDoors = self.getStateIndex().getClosedDoors()
                 if len(closedDoors) == 0:
+                    self.idleUntil()
                     return None, {}
                 # Randomly pick a closed door
                 self._door = random.choice(closedDoors)
@@ -143,9 +174,8 @@ class Team40Agent(BW4TBrain):
                 self._phase = Phase.FOLLOW_PATH_TO_CLOSED_DOOR
 
             if Phase.FOLLOW_PATH_TO_CLOSED_DOOR == self._phase:
-                self._state_tracker.update(state)
                 # Follow path to door
-                action = self._navigator.get_move_action(self._state_tracker)
+                action = self._navigator.get_move_action(self.getStateIndex())
                 if action is not None:
                     return action, {}   
                 self._phase = Phase.OPEN_DOOR
@@ -163,37 +193,39 @@ class Team40Agent(BW4TBrain):
                              (doorLoc[0], doorLoc[1]-2),
                              (doorLoc[0]-1, doorLoc[1]-2),
                              (doorLoc[0]-1, doorLoc[1]-1)]
+                # rooms larger than the 2 by 4 seen from there need more waypoints
+                waypoints += self._getSearchWaypoints(self._door['room_name'], waypoints)
                 self._navigator.add_waypoints(waypoints)
                 self._sendMessage('Searching through ' + self._door['room_name'], agent_name)
                 self._roomIsEmpty = True
                 self._phase = Phase.SEARCH_ROOM
 
             if Phase.SEARCH_ROOM == self._phase:
-                self._state_tracker.update(state)
 
-                nearby_objects = [obj for obj in state.values()
-                                  if 'is_collectable' in obj and obj['is_collectable']]
-                if len(nearby_objects) != 0:
+                index = self.getStateIndex()
+                if len(index.getCollectables()) != 0:
                     self._roomIsEmpty = False
-                nby_obj_ind = self._indexObjEquals(nearby_objects, self._activeObjectives[0])
-                if nby_obj_ind != -1:
+                # blocks on a drop zone were delivered already
+                nearby_goal_objects = [obj for objective in self._getDeliverable()
+                                       for obj in index.getCollectablesLike(objective)
+                                       if not self._isAtGoalLocation(obj['location'])]
+                if len(nearby_goal_objects) != 0:
                     self._navigator.reset_full()
-                    self._searched_obj = nearby_objects[nby_obj_ind]
+                    self._searched_obj = nearby_goal_objects[0]
                     self._navigator.add_waypoint(self._searched_obj['location'])
                     self._phase = Phase.FOUND_BLOCK
                     self._sendMessage('Found goal block ' + str(self._searched_obj['visualization'])
                                       + ' at location ' + str(self._searched_obj['location']),
                                       agent_name)
                 else:
-                    action = self._navigator.get_move_action(self._state_tracker)
+                    action = self._navigator.get_move_action(self.getStateIndex())
                     if action is not None:
                         return action, {}
                     self._phase = Phase.EXIT_ROOM
 
             if Phase.FOUND_BLOCK == self._phase:
-                self._state_tracker.update(state)
 
-                action = self._navigator.get_move_action(self._state_tracker)
+                action = self._navigator.get_move_action(self.getStateIndex())
                 if action is not None:
                     return action, {}
                 self._phase = Phase.EXIT_ROOM
@@ -206,8 +238,7 @@ class Team40Agent(BW4TBrain):
                 self._navigator.reset_full()
                 doorLoc = self._door['location']
                 self._navigator.add_waypoint((doorLoc[0], doorLoc[1] + 1))
-                self._state_tracker.update(state)
-                action = self._navigator.get_move_action(self._state_tracker)
+                action = self._navigator.get_move_action(self.getStateIndex())
                 if action is not None:
                     return action, {}
                 self._phase = Phase.DECIDE_ACTION
@@ -220,34 +251,84 @@ class Team40Agent(BW4TBrain):
         Enable sending messages in one line of code
         '''
         msg = Message(content=mssg, from_id=sender)
-        if msg.content not in self.received_messages:
-            self.send_message(msg)
+        self.send_message(msg)
 
     def _processMessages(self, teamMembers):
         '''
-        Process incoming messages and create a dictionary with received messages from each team member.
+        Process incoming messages and add the new ones to the dictionary with received messages from each team member.
         '''
-        receivedMessages = {}
         for member in teamMembers:
-            receivedMessages[member] = []
-        for mssg in self.received_messages:
-            for member in teamMembers:
-                if mssg.from_id == member:
-                    receivedMessages[member].append(mssg.content)       
-        return receivedMessages
-
-    def _trustBlief(self, member, received):
-        # You can change the default value to your preference
-        default = 0.5
-        trustBeliefs = {}
-        for member in received.keys():
-            trustBeliefs[member] = default
-        for member in received.keys():
-            for message in received[member]:
-                if 'Found' in message and 'colour' not in message:
-                    trustBeliefs[member] -= 0.1
-                    break
-        return trustBeliefs
+            self._receivedMessages.setdefault(member, [])
+        for mssg in self.received_messages.getNew():
+            if mssg.from_id in self._receivedMessages:
+                self._receivedMessages[mssg.from_id].append(mssg.content)
+        return self._receivedMessages
+
+    def _trustBlief(self, members):
+        '''
+        Baseline implementation of a trust belief. Updates the trust belief scores for each team member with the
+        messages received since the previous call, and returns the trust table.
+        '''
+        for member in members:
+            self._trustModel.addMember(member)
+        return self._trustModel.update(self.received_messages.getNew('trust'))
+
+    def getTrustModel(self):
+        return self._trustModel
+
+    def _getDeliverable(self)->List[dict]:
+        '''
+        @return the objectives that can be delivered now: the first remaining one of each drop zone
+        '''
+        deliverable = {}
+        for objective in self._activeObjectives:
+            deliverable.setdefault(objective['drop_zone_nr'], objective)
+        return list(deliverable.values())
+
+    def _findDeliverable(self, obj):
+        '''
+        @return the first objective that can be delivered now with the given block, or None
+        '''
+        for objective in self._getDeliverable():
+            if self._objEquals(objective, obj):
+                return objective
+        return None
+
+    def _getSearchWaypoints(self, room_name, waypoints)->List[tuple]:
+        '''
+        @return the extra waypoints needed to see all tiles of the room
+        that are not seen from the given waypoints, row by row from the
+        bottom of the room, zigzagging.
+        '''
+        sense_range = self.sense_capability.get_capabilities().get(CollectableBlock, 1)
+        tiles = [tuple(tile['location']) for tile in self.getStateIndex().getRoomTiles(room_name)]
+        if len(tiles) == 0:
+            return []
+        top = min(y for _, y in tiles)
+        seen_from = list(waypoints)
+        rows:Dict[int,list] = {}
+        for x, y in sorted(tiles, key=lambda loc: (-loc[1], loc[0])):
+            if all(np.hypot(x - wx, y - wy) > sense_range for wx, wy in seen_from):
+                waypoint = (x, max(y - sense_range, top))
+                seen_from.append(waypoint)
+                rows.setdefault(waypoint[1], []).append(waypoint)
+        extra = []
+        for nr, (_, row) in enumerate(sorted(rows.items(), reverse=True)):
+            extra += row if nr % 2 == 0 else row[::-1]
+        return extra
+
+    def _isAtGoalLocation(self, location)->bool:
+        return any(tuple(block['location']) == tuple(location) for block in self.getStateIndex().getGoalBlocks())
+
+    def _removeDelivered(self, messages):
+        '''
+        Removes the objectives that team members reported to have dropped a block at.
+        '''
+        for mssg in messages:
+            if mssg.from_id in self._teamMembers and isinstance(mssg.content, str) \
+                    and mssg.content.startswith('Dropped goal block '):
+                self._activeObjectives = [objective for objective in self._activeObjectives
+                    if not mssg.content.endswith(' at location ' + str(objective['location']))]
 
     def _indexObjEquals(self, objList, obj):
         for i in range(len(objList)):
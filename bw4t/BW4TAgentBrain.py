@@ -5,6 +5,7 @@ from matrx.agents.agent_brain import AgentBrain
 from matrx.actions import GrabObject, RemoveObject, OpenDoorAction, CloseDoorAction
 from matrx.agents.agent_utils.state import State
 from matrx.messages import Message
+from bw4t.MessageInbox import MessageInbox
 
 
 class BW4TAgentBrain(AgentBrain):
@@ -13,7 +14,7 @@ class BW4TAgentBrain(AgentBrain):
     """
 
 
-    def __init__(self,memorize_for_ticks=None):
+    def __init__(self,memorize_for_ticks=None, max_messages=None):
         """ Defines the behavior of an agent.
         This class is the place where all the decision logic of an agent is
         contained. This class together with the
@@ -59,8 +60,9 @@ class BW4TAgentBrain(AgentBrain):
         previous_action_result: ActionResult
             The :class:`matrx.actions.action.ActionResult` of the previously
             performed or attempted action.
-        received_messages: [Message, ...]
-            The list of received messages.
+        received_messages: MessageInbox
+            The received messages, indexed by sender and content. At most
+            `max_messages` of the most recent messages are kept if given.
         rnd_gen: Random
             The random generator for this agent.
         rnd_seed: int
@@ -75,7 +77,8 @@ class BW4TAgentBrain(AgentBrain):
         # A list of messages that may be filled by this agent, which is retrieved by the GridWorld and send towards the
         # appropriate agents.
         self.messages_to_send = []
-        self.received_messages = []
+        self.__max_messages = max_messages
+        self.received_messages = MessageInbox(max_messages)
 
         # Filled by the WorldFactory during self.factory_initialise()
         self.agent_id = None
@@ -111,7 +114,7 @@ class BW4TAgentBrain(AgentBrain):
         self.previous_action = None
         self.previous_action_result = None
         self.messages_to_send = []
-        self.received_messages = []
+        self.received_messages = MessageInbox(self.__max_messages)
         self._init_state()
 
     def filter_observations(self, state):
@@ -1,6 +1,11 @@
 from abc import  ABC
 from matrx.agents.agent_utils.state import State
 from bw4t.BW4TAgentBrain import BW4TAgentBrain
+from bw4t.StateIndex import StateIndex
+from bw4t.Navigation import PathCache
+from bw4t.TrustModel import TrustModel
+from bw4t.ObservationBuffer import ObservationBuffer, Observation
+from bw4t.IdleCondition import IdleCondition
 from typing import final, List, Dict, Final, Set
 from matrx.messages import Message
 
@@ -12,7 +17,11 @@ class BW4TBrain(BW4TAgentBrain, ABC):
         
     NOT_ALLOWED_PARAMS:Final[Set[str]] ={'remove_range', 'grab_range', 'door_range', 'action_duration'}
    
-    DEFAULT_SETTINGS:Final[Dict[str,object]]={'slowdown':1, 'grab_range':1}
+    DEFAULT_SETTINGS:Final[Dict[str,object]]={'slowdown':1, 'grab_range':1, 'max_messages':None}
+
+    # True for brains that only use getObservation. With 'observation_arrays'
+    # their State then holds only the agent itself and the world info.
+    OBSERVATION_ARRAYS:bool = False
 
     def __init__(self, settings:Dict[str,object]):
         '''
@@ -20,20 +29,34 @@ class BW4TBrain(BW4TAgentBrain, ABC):
         * slowdown : integer. Basically this sets action_duration
         field to the given slowdown. 1 implies normal speed
         of 1 action per tick. 3 givs 1 allowed action every 3 ticks. etc
+        * max_messages : integer or None. The number of most recent received
+        messages to keep in received_messages. None keeps all messages.
         Implementors of BW4TBrain are NOT ALLOWED TO CHANGE THE VALUES OF NOT ALLOWED PARAMS.
         This is to ensure that agents run at the required speed.      
         Missing values get the value from DEFAULT_SETTINGS.
         '''
         self.__settings = self.DEFAULT_SETTINGS.copy()
         self.__settings.update(settings)
-        super().__init__()
+        self.__index = None
+        self.__index_tick = None
+        self.__path_cache = None
+        self.__observations = None
+        self.__idle = None
+        super().__init__(max_messages=self.__settings['max_messages'])
     
     @final
     def initialize(self):
+        self.__index = None
+        self.__index_tick = None
         super().initialize()
         
+    @final
+    def filter_observations(self, state:State)->State:
+        return self.filter_bw4t_observations(state)
+
     @final
     def decide_on_action(self, state:State):
+        self.__idle = None
         act,params = self.decide_on_bw4t_action(state)  
         params['grab_range']=1
         # Max objects should be changed for the strong agent
@@ -43,6 +66,93 @@ class BW4TBrain(BW4TAgentBrain, ABC):
             raise ValueError("Parameter use not allowed ", self.__settings['grab_range'])
         return act,params 
     
+    @final
+    def getStateIndex(self)->StateIndex:
+        '''
+        @return a StateIndex of the current (filtered) state, for constant
+        time lookups of doors, blocks, goal blocks and agents.
+        It is built on first use in a tick and then reused for the rest
+        of that tick, so use this instead of scanning state.values().
+        '''
+        tick = self.state.get_world_info()['nr_ticks']
+        if self.__index_tick != tick:
+            self.__index = StateIndex(self.state)
+            self.__index_tick = tick
+        return self.__index
+
+    @final
+    def setPathCache(self, path_cache:PathCache):
+        '''
+        Called by BW4TWorld before the world starts.
+        @param path_cache the PathCache of the world, shared by all agents.
+        '''
+        self.__path_cache = path_cache
+
+    @final
+    def getPathCache(self)->PathCache:
+        '''
+        @return the PathCache of the world, for use with a CachedNavigator.
+        The cache is shared with the other agents and must not be modified.
+        '''
+        return self.__path_cache
+
+    @final
+    def setObservationBuffer(self, observations:ObservationBuffer):
+        '''
+        Called by BW4TWorld before the world starts, with 'observation_arrays'.
+        @param observations the ObservationBuffer of the world, shared by all agents.
+        '''
+        self.__observations = observations
+
+    @final
+    def getObservation(self)->Observation:
+        '''
+        @return the Observation of the current tick, a view on the world
+        arrays masked by the sense ranges of this agent. None unless the
+        world runs with 'observation_arrays'.
+        '''
+        if self.__observations is None:
+            return None
+        return self.__observations.getObservation(self.agent_id)
+
+    @final
+    def idleUntil(self, timeout:int=None, messages:bool=True, doors:bool=True, blocks:bool=True):
+        '''
+        Declares that this agent has nothing to do until something
+        changes, call it from decide_on_bw4t_action when returning None.
+        With 'idle_scheduling' the world then skips this agent (no state,
+        no filter_bw4t_observations, no decide_on_bw4t_action) until a
+        wake condition holds. Otherwise this has no effect.
+        @param timeout the number of ticks after which the agent wakes
+        anyway, None for no timeout
+        @param messages wake when a message arrives
+        @param doors wake when a door opens or closes
+        @param blocks wake when a block comes into view
+        '''
+        self.__idle = IdleCondition(timeout, messages, doors, blocks)
+
+    @final
+    def getIdleCondition(self)->IdleCondition:
+        '''
+        @return the IdleCondition given with idleUntil in the last
+        decision, None if the agent did not go idle
+        '''
+        return self.__idle
+
+    def getTrustModel(self)->TrustModel:
+        '''
+        @return the TrustModel of this agent, or None if it has none.
+        Override this to expose the trust beliefs of the agent, the
+        trust table is then given to the loggers every tick.
+        '''
+        return None
+
+    def get_log_data(self):
+        trust_model = self.getTrustModel()
+        if trust_model is None:
+            return {}
+        return {'trust': trust_model.getTrustTable()}
+
     def filter_bw4t_observations(self,state)->State:
         """ 
         Filters the world state before deciding on an action.
@@ -0,0 +1,364 @@
+from typing import Dict, List, Tuple
+import multiprocessing
+import os
+import random
+import tempfile
+import numpy as np
+from matrx.actions import OpenDoorAction, CloseDoorAction
+from matrx.agents.agent_utils.state import State
+from matrx.grid_world import GrabObject, DropObject
+from bw4t.BW4TBrain import BW4TBrain
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.Navigation import MOVES
+from bw4t.StateIndex import StateIndex
+from bw4t.VectorWorld import IDLE, OPEN_DOOR, CLOSE_DOOR, GRAB, DROP
+
+# The number of actions. The actions are the action codes of VectorWorld, see BW4TEnv.
+NR_ACTIONS:int = DROP + 1
+
+
+class EnvBrain(BW4TBrain):
+    '''
+    The brain of an agent that is controlled through a BW4TEnv: it does
+    the action the env set, once.
+    '''
+    def __init__(self, settings:Dict[str,object]):
+        super().__init__(settings)
+        self._action:Tuple[str,dict] = (None, {})
+
+    def setAction(self, action_name:str, action_kwargs:dict):
+        '''
+        @param action_name the action to do when the agent decides next, None for none
+        @param action_kwargs the arguments of the action
+        '''
+        self._action = (action_name, action_kwargs)
+
+    def decide_on_bw4t_action(self, state:State):
+        action_name, action_kwargs = self._action
+        self._action = (None, {})
+        return action_name, dict(action_kwargs)
+
+
+class BW4TEnv:
+    '''
+    A step-driven environment over a BW4TWorld, in the style of gym.
+    The agents with an EnvBrain are controlled through step, the other
+    agents use their own brains. reset starts a world and step runs it
+    until a controlled agent decides again, so the world does not own
+    the loop.
+    The actions are the action codes of VectorWorld, with the targets
+    chosen from the agent's state: OPEN_DOOR and CLOSE_DOOR take the
+    nearest closed or open door, GRAB the nearest block in range and
+    DROP the carried block. Actions without a target do nothing.
+    The observation of an agent is an int8 array (channels, width,
+    height) made from its State, see getChannels. The reward is the
+    increase of the CollectionGoal progress, shared by the team.
+    '''
+    def __init__(self, agents:List[dict], worldsettings:dict=DEFAULT_WORLDSETTINGS, log_dir:str=None):
+        '''
+        @param agents the agents as for BW4TWorld. Those with an EnvBrain
+        botclass are controlled through step, in the order of this list.
+        @param worldsettings the worldsettings, the world always runs
+        fast_forward, with its brains in this process. random_seed is set by reset.
+        @param log_dir the directory to log each episode in, in an
+        episode_<nr> folder. None logs in a temporary directory that is
+        removed by close.
+        '''
+        self._agents = agents
+        self._worldsettings = dict(worldsettings, fast_forward=True, checkpoint_interval=0, parallel_agents=0)
+        self._controlled = [agent['name'] for agent in agents if issubclass(agent['botclass'], EnvBrain)]
+        if len(self._controlled) == 0:
+            raise ValueError("There are no agents with an EnvBrain to control")
+        self._temp_dir = None
+        if log_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory()
+            log_dir = self._temp_dir.name
+        self._log_dir = log_dir
+        self._nr_episodes = 0
+        self._channels = ['wall', 'door', 'agent'] + [f"{kind}_{colour}" for kind in ['block', 'goal', 'carried']
+                                                     for colour in self._worldsettings['block_colors']]
+        self._world:BW4TWorld = None
+        self._states:Dict[str,State] = {}
+        self._deciding = np.zeros(len(self._controlled), dtype=bool)
+        self._progress = 0.
+        self._done = True
+
+    def getControlled(self)->List[str]:
+        '''
+        @return the names of the controlled agents, in the order of the actions and observations
+        '''
+        return self._controlled
+
+    def getChannels(self)->List[str]:
+        '''
+        @return the name of each channel of an observation:
+        * wall: 1 for a wall
+        * door: 1 for a closed and 2 for an open door
+        * agent: 1 for the agent itself and 2 for other agents
+        * block_<colour>: shape + 1 of a block of that colour
+        * goal_<colour>: shape + 1 of a goal block of that colour
+        * carried_<colour>: shape + 1 of a carried block of that
+          colour, at the location of the agent that carries it
+        Only what is in the agent's state is in the observation, so
+        blocks and agents out of its sense range are not.
+        '''
+        return self._channels
+
+    def getWorld(self)->BW4TWorld:
+        '''
+        @return the world of the current episode
+        '''
+        return self._world
+
+    def reset(self, seed:int=None)->np.ndarray:
+        '''
+        Starts a new world, and runs it until a controlled agent decides.
+        @param seed the random_seed of the world. python random is also
+        seeded with it. None keeps the seed of the worldsettings.
+        @return the observations, (controlled agents, channels, width, height)
+        '''
+        self.close(remove_logs=False)
+        worldsettings = self._worldsettings
+        if seed is not None:
+            random.seed(seed)
+            worldsettings = dict(worldsettings, random_seed=seed)
+        self._nr_episodes += 1
+        log_dir = os.path.join(self._log_dir, f"episode_{self._nr_episodes}")
+        os.makedirs(log_dir, exist_ok=True)
+        self._world = BW4TWorld(self._agents, worldsettings, log_dir=log_dir)
+        self._progress = 0.
+        self._done = False
+        self._run(first=True)
+        return self._observe()
+
+    def step(self, actions:List[int])->Tuple[np.ndarray,float,bool,dict]:
+        '''
+        Gives the controlled agents that decide their action, and runs
+        the world until a controlled agent decides again or the world is
+        done.
+        @param actions the action code of each controlled agent. Those of
+        agents that do not decide now (see info 'deciding') are ignored.
+        @return (observations, reward, done, info). info has the 'tick',
+        the 'progress' and 'deciding', true for the controlled agents that
+        decide on the next action.
+        '''
+        if self._done:
+            raise ValueError("The episode is done, call reset first")
+        for agent_id, action, deciding in zip(self._controlled, actions, self._deciding):
+            if deciding:
+                self._world.getBrain(agent_id).setAction(*self._getAction(agent_id, int(action)))
+        self._run(first=False)
+        observations = self._observe()
+        progress = self._world.getGridWorld().simulation_goal.getProgress()
+        reward = progress - self._progress
+        self._progress = progress
+        return observations, reward, self._done, {'tick': self._world.getGridWorld().current_nr_ticks,
+                                                  'progress': progress, 'deciding': self._deciding.copy()}
+
+    def close(self, remove_logs:bool=True):
+        '''
+        Ends the current episode, writing its logs.
+        @param remove_logs false to keep the temporary log directory
+        '''
+        if self._world is not None:
+            self._world.flushLoggers()
+            self._world = None
+        if remove_logs and self._temp_dir is not None:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+
+    def _run(self, first:bool):
+        '''
+        Runs ticks until a controlled agent decides at the start of the
+        coming tick, or the world is done.
+        @param first true if no tick was run yet. Then the agents may
+        decide right away.
+        '''
+        world = self._world
+        gridworld = world.getGridWorld()
+        while True:
+            if not first:
+                world.step()
+            first = False
+            # the world checks its goal at the start of the tick, this check is the same
+            if gridworld.simulation_goal.goal_reached(gridworld):
+                # the tick that sees the goal also logs the last row
+                world.step()
+                world.flushLoggers()
+                self._done = True
+                self._deciding[:] = False
+                return
+            tick = gridworld.current_nr_ticks
+            for nr, agent_id in enumerate(self._controlled):
+                body = gridworld.registered_agents[agent_id]
+                self._deciding[nr] = tick > body.current_action_tick_started + body.current_action_duration_in_ticks
+            if self._deciding.any():
+                return
+
+    def _observe(self)->np.ndarray:
+        '''
+        @return the observations of the controlled agents, made from the
+        states they get at the start of the coming tick.
+        '''
+        gridworld = self._world.getGridWorld()
+        observations = np.zeros((len(self._controlled), len(self._channels)) + tuple(gridworld.shape), dtype=np.int8)
+        for nr, agent_id in enumerate(self._controlled):
+            state = self._world.getRunner().getAgentState(agent_id)
+            self._states[agent_id] = state
+            self._encode(state, agent_id, observations[nr])
+        return observations
+
+    def _encode(self, state:State, agent_id:str, observation:np.ndarray):
+        '''
+        Fills the observation of an agent with its state, see getChannels.
+        '''
+        channels = {name: nr for nr, name in enumerate(self._channels)}
+        for obj_id, obj in state.as_dict().items():
+            if obj_id == 'World':
+                continue
+            x, y = obj['location']
+            if 'Wall' in obj['class_inheritance']:
+                observation[channels['wall'], x, y] = 1
+            elif 'Door' in obj['class_inheritance']:
+                observation[channels['door'], x, y] = 2 if obj['is_open'] else 1
+            elif obj.get('isAgent', False):
+                if obj_id == agent_id or observation[channels['agent'], x, y] == 0:
+                    observation[channels['agent'], x, y] = 1 if obj_id == agent_id else 2
+                for block in obj['is_carrying']:
+                    self._encodeBlock(observation, channels, 'carried', block, x, y)
+            elif obj.get('is_collectable', False):
+                self._encodeBlock(observation, channels, 'block', obj, x, y)
+            elif obj.get('is_goal_block', False):
+                self._encodeBlock(observation, channels, 'goal', obj, x, y)
+
+    @staticmethod
+    def _encodeBlock(observation:np.ndarray, channels:Dict[str,int], kind:str, block:dict, x:int, y:int):
+        shape, colour = StateIndex.kind(block)
+        channel = channels.get(f"{kind}_{colour}")
+        # the first block at a location is the one that counts, as in CollectionGoal
+        if channel is not None and observation[channel, x, y] == 0:
+            observation[channel, x, y] = shape + 1
+
+    def _getAction(self, agent_id:str, action:int)->Tuple[str,dict]:
+        '''
+        @return the action name and arguments for an action code, with
+        the target chosen from the agent's state
+        '''
+        if 1 <= action <= len(MOVES):
+            return list(MOVES.keys())[action - 1], {}
+        state = self._states[agent_id]
+        index = StateIndex(state)
+        loc = np.array(state[agent_id]['location'])
+        distance = lambda obj: np.linalg.norm(np.array(obj['location']) - loc)
+        targets:List[dict] = []
+        action_name = None
+        if action == OPEN_DOOR:
+            targets, action_name = index.getClosedDoors(), OpenDoorAction.__name__
+        elif action == CLOSE_DOOR:
+            targets, action_name = index.getOpenDoors(), CloseDoorAction.__name__
+        elif action == GRAB:
+            targets, action_name = index.getCollectables(), GrabObject.__name__
+        elif action == DROP:
+            targets, action_name = state[agent_id]['is_carrying'][-1:], DropObject.__name__
+        elif action != IDLE:
+            raise ValueError(f"Unknown action {action}, actions are 0 to {NR_ACTIONS - 1}")
+        if len(targets) == 0:
+            return None, {}
+        return action_name, {'object_id': min(targets, key=distance)['obj_id']}
+
+
+def _runEnv(connection, agents:List[dict], worldsettings:dict, log_dir:str):
+    '''
+    The loop of a subprocess of VectorBW4TEnv: does the env calls it receives.
+    '''
+    env = BW4TEnv(agents, worldsettings, log_dir)
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == 'reset':
+                connection.send(env.reset(data))
+            elif command == 'step':
+                connection.send(env.step(data))
+            elif command == 'close':
+                break
+    finally:
+        env.close()
+        connection.close()
+
+
+class VectorBW4TEnv:
+    '''
+    Runs several BW4TEnvs, each in its own subprocess, and steps them
+    together with batched observations. A done env is reset right away
+    with its next seed; the last observation of the episode is then in
+    its info as 'final_observation'.
+    '''
+    def __init__(self, nr_envs:int, agents:List[dict], worldsettings:dict=DEFAULT_WORLDSETTINGS,
+                 log_dir:str=None):
+        '''
+        @param nr_envs the number of envs
+        @param agents the agents of each env, see BW4TEnv
+        @param worldsettings the worldsettings of each env
+        @param log_dir the directory to log in, in an env_<nr> folder per
+        env. None logs in temporary directories.
+        '''
+        self._nr_envs = nr_envs
+        self._connections = []
+        self._processes = []
+        self._seeds = [None] * nr_envs
+        for nr in range(nr_envs):
+            env_dir = None if log_dir is None else os.path.join(log_dir, f"env_{nr}")
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_runEnv, args=(child, agents, worldsettings, env_dir),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def getNrEnvs(self)->int:
+        return self._nr_envs
+
+    def reset(self, seed:int=None)->np.ndarray:
+        '''
+        Resets all envs. Env nr gets seed + nr, and the seed of its next
+        episode is that plus the number of envs.
+        @param seed the seed of the first env, None to keep the worldsettings seed
+        @return the observations, (envs, controlled agents, channels, width, height)
+        '''
+        self._seeds = [None if seed is None else seed + nr for nr in range(self._nr_envs)]
+        for connection, env_seed in zip(self._connections, self._seeds):
+            connection.send(('reset', env_seed))
+        return np.stack([connection.recv() for connection in self._connections])
+
+    def step(self, actions:np.ndarray)->Tuple[np.ndarray,np.ndarray,np.ndarray,List[dict]]:
+        '''
+        @param actions (envs, controlled agents) the action codes
+        @return (observations, rewards, dones, infos), see BW4TEnv.step
+        '''
+        for connection, env_actions in zip(self._connections, actions):
+            connection.send(('step', list(env_actions)))
+        results = [connection.recv() for connection in self._connections]
+        for nr, (connection, (observations, _, done, info)) in enumerate(zip(self._connections, results)):
+            if done:
+                info['final_observation'] = observations
+                if self._seeds[nr] is not None:
+                    self._seeds[nr] += self._nr_envs
+                connection.send(('reset', self._seeds[nr]))
+        observations = []
+        for connection, (env_observations, _, done, _) in zip(self._connections, results):
+            observations.append(connection.recv() if done else env_observations)
+        return (np.stack(observations), np.array([result[1] for result in results]),
+                np.array([result[2] for result in results]), [result[3] for result in results])
+
+    def close(self):
+        '''
+        Stops the subprocesses, which write the logs of their episodes.
+        '''
+        for connection in self._connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
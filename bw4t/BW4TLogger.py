@@ -1,16 +1,86 @@
+from typing import Iterator
+import csv
+import functools
+import gzip
+import json
+import os
 import numpy as np
 from matrx.logger.logger import GridWorldLogger
 from matrx.grid_world import GridWorld
+from matrx.objects import Door
+from bw4t.BinaryLog import BinaryLogWriter
+from bw4t.BackgroundLogWriter import BackgroundLogWriter
 
 
 class BW4TLogger(GridWorldLogger):
     '''
     Logs the things we need for bw4t:
-    agent actions, world-completed info, messages info
+    agent actions, world-completed info, messages info.
+    With background=True the rows are built in the simulation thread
+    but written by a BackgroundLogWriter thread, in batches. The queued
+    rows are written when the world ends (see flush).
     '''
-    def __init__(self, save_path="", file_name_prefix="", file_extension=".csv", delimeter=";"):
+    def __init__(self, save_path="", file_name_prefix="", file_extension=".csv", delimeter=";",
+                 background=False, queue_size=10, batch_size=100):
         super().__init__(save_path=save_path, file_name=file_name_prefix, file_extension=file_extension,
                          delimiter=delimeter, log_strategy=1)
+        self._delimiter = delimeter
+        self._columns:list = []
+        self._writer:BackgroundLogWriter = None
+        if background:
+            self._writer = BackgroundLogWriter(self._writeRows, queue_size, batch_size)
+        # Running count per agent of the ticks in which it sent a message.
+        # Only ticks from _next_mssg_tick onwards still need to be scanned.
+        self._mssg_counts:dict = {}
+        self._next_mssg_tick = 0
+
+    def _grid_world_log(self, grid_world, agent_data, last_tick=False, goal_status=None):
+        # Same as GridWorldLogger._grid_world_log, but the rows go through _writeRows
+        if not self._needs_to_log(grid_world, last_tick, goal_status):
+            return
+        data = self.log(grid_world, agent_data)
+        if data is None or data == {}:
+            return
+        if len(self._columns) > 0:
+            new_columns = set(data.keys()) - set(self._columns)
+            if len(new_columns) > 0:
+                raise Exception(f"Cannot append columns to the log file when we already logged with different "
+                                f"columns. THe following columns are new; {list(new_columns)}")
+        data.setdefault('world_nr', self._GridWorldLogger__world_nr)
+        data.setdefault('tick_nr', grid_world.current_nr_ticks)
+        if len(self._columns) == 0:
+            self._columns = list(data.keys())
+
+        if self._writer is not None:
+            self._writer.put(data)
+        else:
+            self._writeRows([data])
+        if last_tick:
+            self.flush()
+
+    def _writeRows(self, rows:list):
+        '''
+        Appends rows to the log file, in the csv layout of GridWorldLogger.
+        Called by the background writer thread if there is one.
+        @param rows list of dicts with the logged columns.
+        '''
+        filename = self.getFileName()
+        write_columns = not os.path.isfile(filename)
+        with open(filename, mode="w+" if write_columns else "a", newline='') as data_file:
+            csv_writer = csv.DictWriter(data_file, delimiter=self._delimiter, quotechar='"',
+                                        quoting=csv.QUOTE_MINIMAL, fieldnames=self._columns)
+            if write_columns:
+                csv_writer.writeheader()
+            csv_writer.writerows(rows)
+
+    def flush(self):
+        '''
+        Writes the rows that are still queued and stops the background
+        writer. Called on the last tick, and by BW4TWorld after a run
+        as the world may have been stopped before its last tick.
+        '''
+        if self._writer is not None:
+            self._writer.close()
 
     def log(self, grid_world:GridWorld, agent_data):
         # So agent_data is a dictionary of shape: {<agent id>: <result from agent's get_log_data>, ...}
@@ -22,16 +92,91 @@ class BW4TLogger(GridWorldLogger):
         for agent_id, agent_body in grid_world.registered_agents.items():
             data[agent_id+'_acts'] = agent_body.current_action
 
+        data.update(self._count_messages(grid_world))
+        return data
+
+    def _count_messages(self, grid_world:GridWorld):
+        '''
+        Updates the running message counts with the ticks that were
+        completed since the previous call. An agent counts at most
+        one message per tick.
+        @return dict with for each agent the key agent_id+'_mssg' and as
+        value the number of ticks before the previous tick in which
+        that agent sent a message.
+        '''
         gwmm = grid_world.message_manager
         t = grid_world.current_nr_ticks-1
-        for agent_id, agent_body in grid_world.registered_agents.items():
-            data[agent_id+'_mssg']=0
-            for i in range(0,t):
-                if i in gwmm.preprocessed_messages.keys():
-                    for mssg in gwmm.preprocessed_messages[i]:
-                        if mssg.from_id==agent_id:
-                            data[agent_id+'_mssg']+=1
-                            break
+        for agent_id in grid_world.registered_agents.keys():
+            self._mssg_counts.setdefault(agent_id, 0)
+        for i in range(self._next_mssg_tick, t):
+            if i in gwmm.preprocessed_messages.keys():
+                senders = {mssg.from_id for mssg in gwmm.preprocessed_messages[i]}
+                for agent_id in senders:
+                    if agent_id in self._mssg_counts:
+                        self._mssg_counts[agent_id]+=1
+        self._next_mssg_tick = max(self._next_mssg_tick, t)
+        return {agent_id+'_mssg': self._mssg_counts[agent_id]
+                for agent_id in grid_world.registered_agents.keys()}
+
+    # workaround for issue matrx267
+    def getFileName(self):
+        '''
+        @return the log filename written by this logger
+        '''
+        return self._GridWorldLogger__file_name
+    
+
+class BW4TBinaryLogger(BW4TLogger):
+    '''
+    Logs the same as BW4TLogger, but writes a compact columnar binary
+    file (see BinaryLog) in blocks of block_size ticks instead of one
+    csv row per tick. Statistics reads these files directly, and
+    BinaryLogReader.toCsv converts them to the csv layout.
+    '''
+    def __init__(self, save_path="", file_name_prefix="", file_extension=".bw4t", block_size=1000,
+                 background=False, queue_size=10, batch_size=100):
+        super().__init__(save_path=save_path, file_name_prefix=file_name_prefix, file_extension=file_extension,
+                         background=background, queue_size=queue_size, batch_size=batch_size)
+        self._block_size = block_size
+        self._binary_writer:BinaryLogWriter = None
+
+    def _writeRows(self, rows:list):
+        if self._binary_writer is None:
+            self._binary_writer = BinaryLogWriter(self.getFileName(), self._block_size)
+        for row in rows:
+            self._binary_writer.append(row)
+
+    def flush(self):
+        '''
+        Writes the rows that are still queued or buffered.
+        '''
+        super().flush()
+        if self._binary_writer is not None:
+            self._binary_writer.flush()
+
+
+class BW4TTrustLogger(GridWorldLogger):
+    '''
+    Logs the trust tables that agents expose through get_log_data
+    under the key 'trust' (see BW4TBrain.getTrustModel).
+    There is a column <agent>_trust_<member> for each agent that
+    has a trust model and each other agent. It is empty as long as
+    the agent has no trust belief about that member.
+    '''
+    def __init__(self, save_path="", file_name_prefix="trust", file_extension=".csv", delimeter=";"):
+        super().__init__(save_path=save_path, file_name=file_name_prefix, file_extension=file_extension,
+                         delimiter=delimeter, log_strategy=1)
+
+    def log(self, grid_world:GridWorld, agent_data):
+        data = {}
+        agent_ids = grid_world.registered_agents.keys()
+        for agent_id in agent_ids:
+            if 'trust' not in agent_data[agent_id]:
+                continue
+            trust = agent_data[agent_id]['trust']
+            for member in agent_ids:
+                if member != agent_id:
+                    data[agent_id+'_trust_'+member] = trust.get(member, '')
         return data
 
     # workaround for issue matrx267
@@ -40,4 +185,146 @@ class BW4TLogger(GridWorldLogger):
         @return the log filename written by this logger
         '''
         return self._GridWorldLogger__file_name
-    
\ No newline at end of file
+
+
+class BW4TEventLogger(GridWorldLogger):
+    '''
+    Logs a stream of events, to see what happened in a run without
+    running it again with the visualizer. The file is gzipped json
+    lines, one event per line, and is only appended to. Every event has
+    the tick 't' in which it happened and its type 'e':
+    * start: 'agents' the location of each agent and 'doors' for each
+      door whether it is open, at the start of the world.
+    * action: agent 'a' did 'action', 'ok' whether it succeeded and if
+      not 'reason' the reason it failed. Idle ticks are not logged.
+    * move: agent 'a' is now at 'loc'.
+    * grab, drop: agent 'a' picked up or dropped the object 'obj'.
+    * door: door 'door' is now open or closed ('open').
+    * message: 'from' sent 'content' to 'to' (None is everyone).
+    * end: the world ended, 'done' whether all blocks were placed.
+    Events of a tick are written when the next tick is logged.
+    readEvents reads the file back.
+    '''
+    def __init__(self, save_path="", file_name_prefix="events", file_extension=".jsonl.gz",
+                 background=False, queue_size=10, batch_size=100):
+        super().__init__(save_path=save_path, file_name=file_name_prefix, file_extension=file_extension,
+                         log_strategy=1)
+        self._writer:BackgroundLogWriter = None
+        if background:
+            self._writer = BackgroundLogWriter(self._writeRows, queue_size, batch_size)
+        # results of the actions of the current tick, set by the wrapped set_action_result_func
+        self._results:list = []
+        self._locations:dict = {}
+        self._carrying:dict = {}
+        self._doors:dict = {}
+
+    def _grid_world_log(self, grid_world, agent_data, last_tick=False, goal_status=None):
+        if not self._needs_to_log(grid_world, last_tick, goal_status):
+            return
+        agents = grid_world.registered_agents
+        if len(self._locations) == 0:
+            events = [self._start(grid_world)]
+        else:
+            events = self._results
+            self._results = []
+            events.extend(self._changes(grid_world, grid_world.current_nr_ticks - 1))
+        if last_tick:
+            events.append({'t': grid_world.current_nr_ticks, 'e': 'end',
+                           'done': grid_world.simulation_goal.isBlocksPlaced(grid_world)})
+        for event in events:
+            if self._writer is not None:
+                self._writer.put(event)
+            else:
+                self._writeRows([event])
+        if last_tick:
+            self.flush()
+
+    def _start(self, grid_world:GridWorld)->dict:
+        '''
+        Takes the first snapshot of the world and starts recording the
+        action results of all agents.
+        @return the start event
+        '''
+        for agent_id, body in grid_world.registered_agents.items():
+            self._locations[agent_id] = body.location
+            self._carrying[agent_id] = [obj.obj_id for obj in body.is_carrying]
+            body.set_action_result_func = functools.partial(self._recordResult, grid_world, agent_id,
+                                                            body.set_action_result_func)
+        self._doors = {obj_id: obj.is_open for obj_id, obj in grid_world.environment_objects.items()
+                       if isinstance(obj, Door)}
+        return {'t': grid_world.current_nr_ticks, 'e': 'start',
+                'agents': {agent_id: list(loc) for agent_id, loc in self._locations.items()},
+                'doors': dict(self._doors)}
+
+    def _recordResult(self, grid_world:GridWorld, agent_id:str, set_action_result, result):
+        '''
+        Replaces the set_action_result_func of the agent bodies (bound to
+        the first three arguments), to also add an action event.
+        '''
+        event = {'t': grid_world.current_nr_ticks, 'e': 'action', 'a': agent_id,
+                 'action': grid_world.registered_agents[agent_id].current_action, 'ok': bool(result.succeeded)}
+        if not result.succeeded:
+            event['reason'] = str(result.result)
+        self._results.append(event)
+        return set_action_result(result)
+
+    def _changes(self, grid_world:GridWorld, tick:int)->list:
+        '''
+        @return the move, grab, drop, door and message events of the
+        given tick, found by comparing the world with the previous snapshot.
+        '''
+        events = []
+        for agent_id, body in grid_world.registered_agents.items():
+            if body.location != self._locations[agent_id]:
+                self._locations[agent_id] = body.location
+                events.append({'t': tick, 'e': 'move', 'a': agent_id, 'loc': list(body.location)})
+            carrying = [obj.obj_id for obj in body.is_carrying]
+            if carrying != self._carrying[agent_id]:
+                events.extend({'t': tick, 'e': 'grab', 'a': agent_id, 'obj': obj_id}
+                              for obj_id in carrying if obj_id not in self._carrying[agent_id])
+                events.extend({'t': tick, 'e': 'drop', 'a': agent_id, 'obj': obj_id}
+                              for obj_id in self._carrying[agent_id] if obj_id not in carrying)
+                self._carrying[agent_id] = carrying
+        for door_id, is_open in self._doors.items():
+            door = grid_world.environment_objects.get(door_id)
+            if door is not None and door.is_open != is_open:
+                self._doors[door_id] = door.is_open
+                events.append({'t': tick, 'e': 'door', 'door': door_id, 'open': door.is_open})
+        for mssg in grid_world.message_manager.preprocessed_messages.get(tick, []):
+            events.append({'t': tick, 'e': 'message', 'from': mssg.from_id, 'to': mssg.to_id,
+                           'content': mssg.content})
+        return events
+
+    def _writeRows(self, rows:list):
+        '''
+        Appends events to the log file. Each call adds a gzip member,
+        gzip readers read them as one stream.
+        '''
+        with gzip.open(self.getFileName(), 'at', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(',', ':'), default=str))
+                f.write('\n')
+
+    def flush(self):
+        '''
+        Writes the events that are still queued and stops the background writer.
+        '''
+        if self._writer is not None:
+            self._writer.close()
+
+    @staticmethod
+    def readEvents(filename:str)->Iterator[dict]:
+        '''
+        @param filename an event log written by BW4TEventLogger
+        @return iterator over the events, in the order they happened
+        '''
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    # workaround for issue matrx267
+    def getFileName(self):
+        '''
+        @return the log filename written by this logger
+        '''
+        return self._GridWorldLogger__file_name
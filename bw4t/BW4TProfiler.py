@@ -0,0 +1,67 @@
+from typing import Dict, List, Tuple
+import functools
+import json
+import time
+import numpy as np
+
+
+class BW4TProfiler:
+    '''
+    Opt-in wall-clock profiler for the parts of a BW4T tick.
+    Methods are timed by replacing them on the instance with a timing
+    wrapper, so objects that are not instrumented run without any
+    overhead. Each call of an instrumented method is one sample.
+    '''
+    def __init__(self):
+        # key (component, agent), value list of call durations in seconds
+        self._timings:Dict[Tuple[str,str],List[float]] = {}
+
+    def instrument(self, obj, method_name:str, component:str=None, agent:str='world'):
+        '''
+        Times all calls of obj.method_name from now on.
+        @param obj the object whose method is to be timed
+        @param method_name the name of the method
+        @param component the name used in the profile, default method_name
+        @param agent the agent id the timings belong to, 'world' for
+        objects that are not part of an agent.
+        '''
+        method = getattr(obj, method_name)
+        timings = self._timings.setdefault((component or method_name, agent), [])
+        # a partial instead of a closure, so that instrumented worlds can be pickled
+        setattr(obj, method_name, functools.partial(_timed, method, timings))
+
+    def getProfile(self)->Dict[str,Dict[str,Dict[str,float]]]:
+        '''
+        @return dict with as keys the components, and as values a dict
+        with for each agent the number of calls, the total time and the
+        p50, p95 and p99 of the call durations, all times in milliseconds.
+        '''
+        profile:dict = {}
+        for (component, agent), timings in self._timings.items():
+            if len(timings) == 0:
+                continue
+            ms = np.array(timings) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            profile.setdefault(component, {})[agent] = {
+                'calls': len(ms), 'total_ms': round(float(ms.sum()), 3),
+                'p50_ms': round(float(p50), 4), 'p95_ms': round(float(p95), 4),
+                'p99_ms': round(float(p99), 4)}
+        return profile
+
+    def write(self, filename:str):
+        '''
+        Writes the profile as json to the given file.
+        '''
+        with open(filename, 'w') as f:
+            json.dump(self.getProfile(), f, indent=1)
+
+
+def _timed(method, timings:List[float], *args, **kwargs):
+    '''
+    Calls method and appends its duration to timings. See BW4TProfiler.instrument.
+    '''
+    start = time.perf_counter()
+    try:
+        return method(*args, **kwargs)
+    finally:
+        timings.append(time.perf_counter() - start)
@@ -2,25 +2,53 @@ import numpy as np
 import random
 import pathlib
 import os
-from typing import Final, List
+import io
+import copyreg
+import pickle
+import types
+import zlib
+from collections import OrderedDict
+from typing import Final, List, Dict
 from matrx.actions.move_actions import MoveEast, MoveSouth, MoveWest 
 from matrx.actions import MoveNorth, OpenDoorAction, CloseDoorAction 
 from matrx.grid_world import GridWorld, DropObject, GrabObject, AgentBody 
 from matrx import WorldBuilder 
-from matrx.world_builder import RandomProperty
 from matrx.agents import SenseCapability 
 from matrx.utils import get_room_locations
 from bw4t.BW4TBlocks import CollectableBlock, GhostBlock
 from agents1.BW4THuman import Human
 from bw4t.CollectionGoal import CollectionGoal
-from bw4t.BW4TLogger import BW4TLogger
+from bw4t.BW4TLogger import BW4TLogger, BW4TBinaryLogger, BW4TTrustLogger, BW4TEventLogger
 from bw4t.BW4THumanBrain import HumanBrain
+from bw4t.BW4TBrain import BW4TBrain
+from bw4t.BW4TProfiler import BW4TProfiler
+from bw4t.Recorder import Recorder
+from bw4t.Navigation import PathCache
+from bw4t.FastForward import FastForwardRunner
+from bw4t.BrainPool import BrainPool
+from bw4t.ObservationBuffer import ObservationBuffer, PLANE_RANGES
+from bw4t.WorldTemplate import WorldTemplate
+from bw4t.LayoutGenerator import LayoutGenerator
+from matrx.objects import Door, AreaTile
 
 DEFAULT_WORLDSETTINGS: dict={
     'deadline': 3000, # Ticks after which world terminates anyway 
     'tick_duration': 0.1, # Set to 0 for fastest possible runs.
     'random_seed': 1,
     'verbose': False,
+    'fast_forward': False, # run headless without api, visualizer and sleeping. Prints the ticks per second.
+    'cache_template': True, # build the static layout once and reuse it for worlds with the same layout
+    'profile': False, # time the parts of each tick and write a _profile.json next to the log
+    'log_format': 'csv', # 'csv', or 'binary' for a compact columnar .bw4t log, see BinaryLog
+    'log_async': True, # write the log in a background thread, in batches
+    'log_trust': False, # also log the trust tables of agents in a trust_ csv next to the log
+    'log_events': False, # also log actions, moves, grabs, drops, doors and messages in an events_ file, see BW4TEventLogger
+    'record': False, # record the run in a recording_ file so that it can be replayed, see Replay
+    'snapshot_interval': 100, # ticks between the world state snapshots of a recording
+    'checkpoint_interval': 0, # ticks between checkpoints of a fast_forward run, 0 for none. See BW4TWorld.resume
+    'observation_arrays': False, # keep the world in an ObservationBuffer for BW4TBrain.getObservation. Needs fast_forward
+    'idle_scheduling': False, # skip agents while they are idle, see BW4TBrain.idleUntil. Needs fast_forward
+    'parallel_agents': 0, # number of worker processes in which the agents decide, 0 for none. See BrainPool. Needs fast_forward
     'matrx_paused':True,
     'run_matrx_api':True, # If you want to allow web connection
     'run_matrx_visualizer':True, # if you want to allow web visualizer
@@ -35,17 +63,24 @@ DEFAULT_WORLDSETTINGS: dict={
         'r': OpenDoorAction.__name__,
         'f': CloseDoorAction.__name__,
     },
+    'layout': 'grid', # 'grid' for rows of equal rooms, 'generated' for rooms of random sizes and doors. See LayoutGenerator
+    'layout_seed': 1, # the seed of a 'generated' layout, it does not change with random_seed
+    'layout_dir': None, # directory in which layouts are saved and from which they are loaded, None to make them in each process
     'room_size' : (6, 4),  # width, height
+    'room_size_range': ((5, 4), (8, 6)), # min and max (width, height) of the rooms of a 'generated' layout
+    'max_doors_per_room': 2, # max nr of doors in the bottom wall of a room of a 'generated' layout
     'nr_rooms' : 9, # total number of rooms.
     'rooms_per_row':3, #number of rooms per row.
     'average_blocks_per_room': 2,
+    'guarantee_goal_blocks': False, # make sure there is a block in the rooms for every goal block, see _addBlocks
     'block_shapes': [0, 1, 2], # possible shapes of the blocks
     'block_colors': ['#0008ff', '#ff1500', '#0dff00'], #possible colors of blocks
     'room_colors': ['#0008ff', '#ff1500', '#0dff00'],
     'wall_color': "#8a8a8a",
     'drop_off_color': "#878787",
     'block_size' : 0.5,
-    'nr_drop_zones':  1, # All code assumes this is 1, don't change this.
+    'nr_drop_zones':  1, # nr of drop zones, each with its own goal blocks. The goal is reached when all are complete
+    'drop_zones_per_row': 0, # nr of drop zones per row below the rooms, 0 for all in one row
     'nr_blocks_needed':  3, # nr of drop tiles/target blocks
     'hallway_space': 2, # width, height of corridors
 
@@ -68,7 +103,7 @@ class BW4TWorld:
     internally creates the gridworld using WorldBuilder.
     
     '''
-    def __init__(self, agents:List[dict], worldsettings:dict=DEFAULT_WORLDSETTINGS):
+    def __init__(self, agents:List[dict], worldsettings:dict=DEFAULT_WORLDSETTINGS, log_dir:str='.'):
         '''
            @param agents a list like 
             [
@@ -77,12 +112,41 @@ class BW4TWorld:
             ]
             Names must all be unique.
             Check BW4TBrain for more on the agents specification.
+           @param log_dir the directory in which the world_1 log folder is created.
         '''
+        if worldsettings.get('fast_forward', False):
+            worldsettings = dict(worldsettings, tick_duration=0, run_matrx_api=False,
+                run_matrx_visualizer=False, matrx_paused=False)
+        if worldsettings.get('checkpoint_interval', 0) > 0 and not worldsettings.get('fast_forward', False):
+            raise ValueError("checkpoint_interval needs fast_forward")
+        if worldsettings.get('observation_arrays', False) and not worldsettings.get('fast_forward', False):
+            raise ValueError("observation_arrays needs fast_forward")
+        if worldsettings.get('idle_scheduling', False) and not worldsettings.get('fast_forward', False):
+            raise ValueError("idle_scheduling needs fast_forward")
+        if worldsettings.get('parallel_agents', 0) > 0:
+            if not worldsettings.get('fast_forward', False):
+                raise ValueError("parallel_agents needs fast_forward")
+            if worldsettings.get('observation_arrays', False):
+                raise ValueError("parallel_agents can not be combined with observation_arrays")
+        if not worldsettings.get('observation_arrays', False) and \
+                any(getattr(agent['botclass'], 'OBSERVATION_ARRAYS', False) for agent in agents):
+            raise ValueError("agents with OBSERVATION_ARRAYS need observation_arrays")
         self._worldsettings=worldsettings;
         self._agents=agents
+        # the world is built with python random, a replay must start from the same state
+        random_state = random.getstate()
         
         np.random.seed(worldsettings['random_seed'])
+        self._layout = LayoutGenerator.get(worldsettings)
         world_size = self.world_size()
+
+        template = None
+        if worldsettings.get('cache_template', True):
+            template = WorldTemplate.get(worldsettings)
+        if template is None:
+            template = self._buildTemplate(world_size)
+            if worldsettings.get('cache_template', True):
+                WorldTemplate.put(worldsettings, template)
     
         # Create the goal
         goal = CollectionGoal(worldsettings['deadline'])
@@ -96,11 +160,13 @@ class BW4TWorld:
         
         self._builder.api_info['_matrx_paused']=worldsettings['matrx_paused']
     
-        # Add the world bounds (not needed, as agents cannot 'walk off' the grid, but for visual effects)
-        self._builder.add_room(top_left_location=(0, 0), width=world_size[0], height=world_size[1], name="world_bounds")
-        room_locations = self._addRooms()
-        self._addBlocks(room_locations)
-        self._addDropOffZones(world_size)
+        # The bounds, rooms and drop zone areas come from the template
+        room_colours = self._pickRoomColours()
+        # The blocks and goal blocks are drawn up front, so that only the real blocks are added
+        rng = np.random.default_rng(worldsettings['random_seed'])
+        goal_kinds = self._pickGoalKinds(rng)
+        self._addBlocks(template.getRoomLocations(), goal_kinds, rng)
+        self._addGoalBlocks(goal_kinds)
     
         # Add the agents and human agents to the top row of the world
         self._addAgents()
@@ -108,67 +174,366 @@ class BW4TWorld:
         #media_folder = os.path.dirname(os.path.join(os.path.realpath(__file__), "media"))
         media_folder = pathlib.Path().resolve()
         self._builder.startup(media_folder=media_folder)
-        self._builder.add_logger(BW4TLogger, save_path='.')
+        logger_class = BW4TBinaryLogger if worldsettings.get('log_format', 'csv') == 'binary' else BW4TLogger
+        self._builder.add_logger(logger_class, save_path=log_dir, background=worldsettings.get('log_async', True))
+        if worldsettings.get('log_trust', False):
+            self._builder.add_logger(BW4TTrustLogger, save_path=log_dir, file_name_prefix='trust')
+        if worldsettings.get('log_events', False):
+            self._builder.add_logger(BW4TEventLogger, save_path=log_dir,
+                                     background=worldsettings.get('log_async', True))
+        if worldsettings.get('record', False):
+            self._builder.add_logger(Recorder, save_path=log_dir, worldsettings=worldsettings, agents=agents,
+                                     random_state=random_state,
+                                     snapshot_interval=worldsettings.get('snapshot_interval', 100))
 
         self._gridworld = self._builder.worlds(nr_of_worlds=1).__next__()
+        template.install(self._gridworld, room_colours)
+
+        # the spawn fields go in the template, so later worlds with the same team get them too
+        template.addKeyPoints([body.location for body in self._gridworld.registered_agents.values()])
+        path_cache = template.getPathCache()
+        for brain in self._brains:
+            if isinstance(brain, BW4TBrain):
+                brain.setPathCache(path_cache)
+
+        observations = None
+        array_agents = set()
+        if worldsettings.get('observation_arrays', False):
+            observations = ObservationBuffer(self._gridworld, worldsettings['block_colors'],
+                {key: worldsettings[key] for key in PLANE_RANGES.values()})
+            for brain in self._brains:
+                if isinstance(brain, BW4TBrain):
+                    brain.setObservationBuffer(observations)
+                    if brain.OBSERVATION_ARRAYS:
+                        array_agents.add(brain.agent_id)
+
+        idle_brains = None
+        if worldsettings.get('idle_scheduling', False):
+            idle_brains = {brain.agent_id: brain for brain in self._brains if isinstance(brain, BW4TBrain)}
+
+        brain_pool = None
+        if worldsettings.get('parallel_agents', 0) > 0:
+            brain_pool = BrainPool({brain.agent_id: brain for brain in self._brains if isinstance(brain, BW4TBrain)},
+                                   worldsettings['parallel_agents'])
+
+        self._runner = None
+        if worldsettings.get('fast_forward', False):
+            self._runner = FastForwardRunner(self._gridworld, observations, array_agents, idle_brains, brain_pool)
+        self._initialized = False
+
+        self._profiler = None
+        if worldsettings.get('profile', False):
+            self._profiler = self._instrument()
 
     def run(self):
         '''
-        run the world till termination
+        run the world till termination. The logs are written also when
+        the run is interrupted, e.g. by Ctrl-C or an error in an agent.
         '''
-        self._gridworld.run(self._builder.api_info)
+        try:
+            if self._runner is not None:
+                # a resumed world is initialized already
+                api_info = None if self._initialized else self._builder.api_info
+                self._initialized = True
+                self._runner.run(api_info, self.saveCheckpoint, self._worldsettings.get('checkpoint_interval', 0))
+                print(f"Fast forward: {self._gridworld.current_nr_ticks} ticks at {self._runner.getTicksPerSecond():.1f} ticks/s")
+                if os.path.exists(self.getCheckpointFileName()):
+                    os.remove(self.getCheckpointFileName())
+            else:
+                self._gridworld.run(self._builder.api_info)
+        finally:
+            self.flushLoggers()
         return self
+
+    def step(self)->bool:
+        '''
+        Runs a single tick of a fast_forward world, for driving the world
+        from outside (see BW4TEnv) instead of with run. Call flushLoggers
+        when done.
+        @return true if the world is done
+        '''
+        if self._runner is None:
+            raise ValueError("step needs fast_forward")
+        if not self._initialized:
+            self._gridworld.initialize(self._builder.api_info)
+            self._initialized = True
+        return self._runner.step()
+
+    def flushLoggers(self):
+        '''
+        Writes what the loggers still hold, and the profile. The world
+        may have been stopped before its last tick.
+        '''
+        for logger in self._gridworld._GridWorld__loggers:
+            if isinstance(logger, (BW4TLogger, BW4TEventLogger, Recorder)):
+                logger.flush()
+        if self._profiler is not None:
+            self._profiler.write(os.path.splitext(self.getLogger().getFileName())[0] + '_profile.json')
+
+    def getGridWorld(self)->GridWorld:
+        '''
+        @return the matrx world
+        '''
+        return self._gridworld
+
+    def getBrain(self, name:str):
+        '''
+        @param name the name of an agent
+        @return the brain of the agent
+        '''
+        return self._brains[[agent['name'] for agent in self._agents].index(name)]
+
+    def getRunner(self)->FastForwardRunner:
+        '''
+        @return the runner of a fast_forward world, None otherwise
+        '''
+        return self._runner
         
     def getLogger(self)->BW4TLogger:
         '''
         @return the logger. We assume there is only 1: BW4TLogger
         '''
         return self._gridworld._GridWorld__loggers[0]
+
+    def getCheckpointFileName(self)->str:
+        '''
+        @return the file saveCheckpoint writes to, next to the log
+        '''
+        return os.path.splitext(self.getLogger().getFileName())[0] + '_checkpoint.pkl'
+
+    def saveCheckpoint(self, filename:str=None):
+        '''
+        Saves the complete state of the world between two ticks: all
+        objects, the goal, the agent brains, the loggers, and the python
+        and numpy random state, plus the size of each log file so far.
+        With 'checkpoint_interval' a fast_forward run calls this every
+        that many ticks. The file is replaced atomically.
+        @param filename the file to write, default getCheckpointFileName()
+        '''
+        if filename is None:
+            filename = self.getCheckpointFileName()
+        if self._runner is not None:
+            self._runner.syncBrains()
+        # pickling the loggers first waits for their background writers
+        world = zlib.compress(_dumps(self))
+        log_sizes = {}
+        for logger in self._gridworld._GridWorld__loggers:
+            name = logger.file_name
+            log_sizes[name] = os.path.getsize(name) if os.path.isfile(name) else None
+        checkpoint = {'world': world, 'log_sizes': log_sizes, 'random_state': random.getstate(),
+                      'np_random_state': np.random.get_state()}
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(checkpoint, f)
+        os.replace(filename + '.tmp', filename)
+
+    @classmethod
+    def resume(cls, filename:str)->'BW4TWorld':
+        '''
+        Loads a world from a checkpoint. The log files are cut back to
+        their size at the checkpoint, so that running the world writes
+        the same logs as an uninterrupted run. Log paths are as they
+        were, so resume from the same working directory.
+        @param filename a checkpoint written by saveCheckpoint
+        @return the world, ready to continue with run()
+        '''
+        with open(filename, 'rb') as f:
+            checkpoint = pickle.load(f)
+        for name, size in checkpoint['log_sizes'].items():
+            if size is None:
+                if os.path.isfile(name):
+                    os.remove(name)
+            else:
+                with open(name, 'r+b') as f:
+                    f.truncate(size)
+        random.setstate(checkpoint['random_state'])
+        np.random.set_state(checkpoint['np_random_state'])
+        return pickle.loads(zlib.decompress(checkpoint['world']))
+
+    def __getstate__(self):
+        # the builder is only needed to start a world, not to resume it
+        state = dict(self.__dict__)
+        state['_builder'] = None
+        return state
+
+    def getProfiler(self)->BW4TProfiler:
+        '''
+        @return the profiler, None if the 'profile' setting is off
+        '''
+        return self._profiler
         
         
+    def _instrument(self)->BW4TProfiler:
+        '''
+        @return a profiler timing the tick, the goal checks, the logger
+        and the filter and decide methods of all BW4TBrain agents.
+        '''
+        profiler = BW4TProfiler()
+        if self._runner is not None:
+            profiler.instrument(self._runner, '_step', 'tick')
+        else:
+            profiler.instrument(self._gridworld, '_GridWorld__step', 'tick')
+        # the world uses a copy of our goal
+        goal = self._gridworld.simulation_goal
+        profiler.instrument(goal, 'goal_reached')
+        profiler.instrument(goal, 'isBlocksPlaced')
+        profiler.instrument(self.getLogger(), 'log')
+        for brain in self._brains:
+            # brains in a BrainPool run in its workers, out of reach of the profiler
+            if isinstance(brain, BW4TBrain) and self._worldsettings.get('parallel_agents', 0) == 0:
+                for method_name in ['decide_on_action', 'filter_bw4t_observations', 'decide_on_bw4t_action']:
+                    profiler.instrument(brain, method_name, agent=brain.agent_id)
+        return profiler
+
+    def _buildTemplate(self, world_size)->WorldTemplate:
+        '''
+        @return a new WorldTemplate with the world bounds, the rooms and
+        the drop zone areas for the current settings.
+        '''
+        builder = WorldBuilder(shape=world_size, run_matrx_api=False,
+            run_matrx_visualizer=False, verbose=self._worldsettings['verbose'])
+        # Add the world bounds (not needed, as agents cannot 'walk off' the grid, but for visual effects)
+        builder.add_room(top_left_location=(0, 0), width=world_size[0], height=world_size[1], name="world_bounds")
+        room_locations = self._addRooms(builder)
+        nr_room_objects = len(builder.object_settings)
+        self._addDropOffZones(builder)
+        gridworld = builder.worlds(nr_of_worlds=1).__next__()
+        return WorldTemplate(gridworld, nr_room_objects, room_locations,
+            self._buildPathCache(gridworld, world_size))
+
+    def _buildPathCache(self, gridworld, world_size)->PathCache:
+        '''
+        @param gridworld a world with the static layout, all doors closed
+        @return a PathCache for the layout, with the paths to the doors,
+        the tiles in front of them and the drop zone tiles precomputed
+        for the closed doors. The spawn tiles are added per team, see
+        WorldTemplate.addKeyPoints.
+        '''
+        walls = []
+        doors = {}
+        closed_doors = []
+        for obj in gridworld.environment_objects.values():
+            if isinstance(obj, Door):
+                doors[obj.obj_id] = obj.location
+                if not obj.is_open:
+                    closed_doors.append(obj.obj_id)
+            elif not obj.is_traversable and not obj.is_movable:
+                walls.append(obj.location)
+
+        key_points = []
+        for loc in doors.values():
+            key_points += [loc, (loc[0], loc[1] + 1)]
+        key_points += [obj.location for obj in gridworld.environment_objects.values()
+                       if isinstance(obj, AreaTile) and obj.custom_properties.get('is_drop_zone', False)]
+        # computed once per layout: the template, and with it the fields, is reused and can be saved in layout_dir
+        return PathCache(world_size, walls, doors, closed_doors, key_points)
+
     def world_size(self):
         '''
-        returns (width,height) (number of tiles)
+        returns (width,height) (number of tiles), as the layout has it
         '''
-        worldsettings=self._worldsettings
-        nr_room_rows = np.ceil(worldsettings['nr_rooms'] / worldsettings['rooms_per_row'])
-    
-        # calculate the total width
-        world_width = max(worldsettings['rooms_per_row'] * worldsettings['room_size'][0] + 2 * worldsettings['hallway_space'],
-                          (worldsettings['nr_drop_zones'] + 1) * worldsettings['hallway_space'] + worldsettings['nr_drop_zones']) + 2
-    
-        # calculate the total height
-        world_height = nr_room_rows * worldsettings['room_size'][1] + (nr_room_rows + 1) * worldsettings['hallway_space'] + worldsettings['nr_blocks_needed'] + 2
-    
-        return int(world_width), int(world_height)   
-    
-        
-    def _addBlocks(self, room_locations):
+        return self._layout.getWorldSize()
+
+    def _addBlocks(self, room_locations, goal_kinds:np.ndarray, rng:np.random.Generator):
         '''
-        Add blocks to all given room locations
+        Add blocks to all given room locations. For each room the number
+        of blocks is drawn as if every tile gets a block with a probability
+        that gives on average the requested number of blocks per room.
+        Then the tiles and the shape and colour of the blocks are drawn,
+        all at once, and only those blocks are added.
+        With 'guarantee_goal_blocks' every goal block gets a block of its
+        kind: blocks of kinds that are not needed are changed into the
+        missing kinds, and if there are too few of those, blocks of the
+        missing kinds are added to free tiles.
+        @param goal_kinds the kinds of the goal blocks, see _pickGoalKinds
+        @param rng the generator of the world, seeded with its random_seed
         '''
-        for room_name, locations in room_locations.items():
-            for loc in locations:
-                # Get the block's name
-                name = f"Block in {room_name}"
-    
-                # Get the probability for adding a block so we get the on average the requested number of blocks per room
-                prob = min(1.0, self._worldsettings['average_blocks_per_room'] / len(locations))
-    
-                # Create a MATRX random property of shape and color so each block varies per created world.
-                # These random property objects are used to obtain a certain value each time a new world is
-                # created from this builder.
-                colour_property = RandomProperty(values=self._worldsettings['block_colors'])
-                shape_property = RandomProperty(values=self._worldsettings['block_shapes'])
-    
-                # Add the block; a regular SquareBlock as denoted by the given 'callable_class' which the
-                # builder will use to create the object. In addition to setting MATRX properties, we also
-                # provide a `is_block` boolean as custom property so we can identify this as a collectible
-                # block.
-                self._builder.add_object_prospect(loc, name, 
-                    callable_class=CollectableBlock, probability=prob,
-                    visualize_shape=shape_property, visualize_colour=colour_property,
-                    block_size=self._worldsettings['block_size'])
+        names = list(room_locations.keys())
+        sizes = np.array([len(room_locations[name]) for name in names], dtype=int)
+        # Get the probability for adding a block so we get the on average the requested number of blocks per room
+        probs = np.minimum(1.0, self._worldsettings['average_blocks_per_room'] / np.maximum(sizes, 1))
+        counts = rng.binomial(sizes, probs)
+        rooms = np.repeat(np.arange(len(names)), counts)
+        tiles = np.concatenate([np.sort(rng.choice(size, size=count, replace=False))
+                                for size, count in zip(sizes, counts)] + [np.zeros(0, dtype=int)]).astype(int)
+        kinds = rng.integers(self._getNrKinds(), size=len(rooms))
+
+        if self._worldsettings.get('guarantee_goal_blocks', False):
+            rooms, tiles, kinds = self._addMissingGoalKinds(sizes, rooms, tiles, kinds, goal_kinds.ravel(), rng)
+
+        for room, tile, kind in zip(rooms.tolist(), tiles.tolist(), kinds.tolist()):
+            shape, colour = self._getKind(kind)
+            # Add the block; a regular SquareBlock as denoted by the given 'callable_class' which the
+            # builder will use to create the object. In addition to setting MATRX properties, we also
+            # provide a `is_block` boolean as custom property so we can identify this as a collectible
+            # block.
+            self._builder.add_object(room_locations[names[room]][tile], f"Block in {names[room]}",
+                callable_class=CollectableBlock,
+                visualize_shape=shape, visualize_colour=colour,
+                block_size=self._worldsettings['block_size'])
+
+    def _addMissingGoalKinds(self, sizes:np.ndarray, rooms:np.ndarray, tiles:np.ndarray, kinds:np.ndarray,
+                             goal_kinds:np.ndarray, rng:np.random.Generator):
+        '''
+        @param sizes the number of tiles of each room
+        @param rooms, tiles, kinds the room, tile in the room and kind of each block
+        @param goal_kinds the kinds of all goal blocks
+        @return rooms, tiles, kinds with a block for every goal block. Blocks
+        are kept in the order of rooms and tiles.
+        '''
+        nr_kinds = self._getNrKinds()
+        missing = np.maximum(np.bincount(goal_kinds, minlength=nr_kinds) - np.bincount(kinds, minlength=nr_kinds), 0)
+        missing_kinds = rng.permutation(np.repeat(np.arange(nr_kinds), missing))
+        if len(missing_kinds) == 0:
+            return rooms, tiles, kinds
+
+        # a block is spare if there are more blocks of its kind than goal blocks, picked at random
+        kinds = kinds.copy()
+        spare_left = np.bincount(kinds, minlength=nr_kinds) - np.bincount(goal_kinds, minlength=nr_kinds)
+        spare = []
+        for block in rng.permutation(len(kinds)).tolist():
+            if spare_left[kinds[block]] > 0:
+                spare_left[kinds[block]] -= 1
+                spare.append(block)
+        nr_changed = min(len(spare), len(missing_kinds))
+        kinds[spare[:nr_changed]] = missing_kinds[:nr_changed]
+        missing_kinds = missing_kinds[nr_changed:]
+        if len(missing_kinds) == 0:
+            return rooms, tiles, kinds
+
+        # the rest goes to free tiles, drawn over all rooms
+        taken = np.zeros(sizes.sum(), dtype=bool)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(int)
+        taken[offsets[rooms] + tiles] = True
+        free = np.flatnonzero(~taken)
+        if len(free) < len(missing_kinds):
+            raise ValueError(f"The rooms have no free tiles left for {len(missing_kinds)} more goal blocks")
+        new = rng.choice(free, size=len(missing_kinds), replace=False)
+        new_rooms = np.searchsorted(offsets, new, side='right') - 1
+        rooms = np.concatenate([rooms, new_rooms])
+        tiles = np.concatenate([tiles, new - offsets[new_rooms]])
+        kinds = np.concatenate([kinds, missing_kinds])
+        order = np.lexsort((tiles, rooms))
+        return rooms[order], tiles[order], kinds[order]
+
+    def _getNrKinds(self)->int:
+        '''
+        @return the number of kinds (shape and colour) of blocks
+        '''
+        return len(self._worldsettings['block_shapes']) * len(self._worldsettings['block_colors'])
+
+    def _getKind(self, kind:int):
+        '''
+        @return (shape, colour) of the given kind of block
+        '''
+        nr_colours = len(self._worldsettings['block_colors'])
+        return self._worldsettings['block_shapes'][kind // nr_colours], self._worldsettings['block_colors'][kind % nr_colours]
+
+    def _createBrain(self, agent:dict):
+        '''
+        @param agent an element of the agents list, see __init__
+        @return the brain for the agent
+        '''
+        return agent['botclass'](agent['settings'])
 
     def _addAgents(self):
         '''
@@ -180,11 +545,17 @@ class BW4TWorld:
             CollectableBlock: self._worldsettings['block_sense_range'],
             None: self._worldsettings['other_sense_range']})
     
-        loc = (0,1) # agents start in horizontal row at top left corner.
+        # agents start in horizontal rows at top left corner, as many rows as the top hallway has.
+        row_length = self.world_size()[0] - 2
+        if len(self._agents) > row_length * self._worldsettings['hallway_space']:
+            raise ValueError(f"The top hallway has room for {row_length * self._worldsettings['hallway_space']} "
+                             f"agents, there are {len(self._agents)}")
         team_name = "Team 1" # currently this supports 1 team 
-        for agent in self._agents:
-            brain = agent['botclass'](agent['settings'])
-            loc = (loc[0] + 1, loc[1])
+        self._brains = []
+        for nr, agent in enumerate(self._agents):
+            brain = self._createBrain(agent)
+            self._brains.append(brain)
+            loc = (1 + nr % row_length, 1 + nr // row_length)
             if agent['botclass']==Human:
                 self._builder.add_human_agent(loc, brain,
                 team=team_name, name=agent['name'],
@@ -195,82 +566,109 @@ class BW4TWorld:
                 team=team_name, name=agent['name'], 
                 sense_capability=sense_capability, visualize_shape=1, visualize_colour=self._worldsettings['block_colors'][random.randint(0,2)])
      
-    def _addRooms(self):
+    def _addRooms(self, builder:WorldBuilder):
         '''
+        Adds the rooms to the builder of a template. The area colours
+        are picked for each world, see _pickRoomColours.
         @return room locations
         '''
         room_locations = {}
-        for room_nr in range(self._worldsettings['nr_rooms']):
-            room_top_left, door_loc = self.get_room_loc(room_nr)
-    
-            # We assign a simple random color to each room. Not for any particular reason except to brighting up the place.
-            room_color = random.choice(self._worldsettings['room_colors'])
-                                       
-    
+        for room_nr, (room_top_left, room_size, door_locs) in enumerate(self._layout.getRooms()):
             # Add the room
             room_name = f"room_{room_nr}"
-            self._builder.add_room(top_left_location=room_top_left, 
-                 width=self._worldsettings['room_size'][0], 
-                 height=self._worldsettings['room_size'][1], name=room_name,
-                 door_locations=[door_loc], 
+            builder.add_room(top_left_location=room_top_left, 
+                 width=room_size[0], 
+                 height=room_size[1], name=room_name,
+                 door_locations=door_locs, 
                  wall_visualize_colour=self._worldsettings['wall_color'],
-                 with_area_tiles=True, area_visualize_colour=room_color, 
+                 with_area_tiles=True, area_visualize_colour=self._worldsettings['room_colors'][0], 
                  area_visualize_opacity=0.1)
     
             # Find all inner room locations where we allow objects (making sure that the location behind to door is free)
-            room_locations[room_name] = get_room_locations(room_top_left, self._worldsettings['room_size'][0], self._worldsettings['room_size'][1])
+            room_locations[room_name] = get_room_locations(room_top_left, room_size[0], room_size[1])
     
         return room_locations       
+
+    def _pickRoomColours(self)->Dict[str,str]:
+        '''
+        @return the area colour for each room, by room name
+        '''
+        # We assign a simple random color to each room. Not for any particular reason except to brighting up the place.
+        return {f"room_{room_nr}": random.choice(self._worldsettings['room_colors'])
+                for room_nr in range(self._worldsettings['nr_rooms'])}
     
         
     def get_room_loc(self,room_nr):
         '''
-        @return room location (room_x, room_y), (door_x, door_y) for given room nr
+        @return room location (room_x, room_y), (door_x, door_y) of the first door for given room nr
+        '''
+        room_top_left, _, door_locs = self._layout.getRooms()[room_nr]
+        return room_top_left, door_locs[0]
+
+    def _addDropOffZones(self, builder:WorldBuilder):
+        '''
+        Adds the areas of the drop zones to the builder of a template.
         '''
-        row = np.floor(room_nr / self._worldsettings['rooms_per_row'])
-        column = room_nr % self._worldsettings['rooms_per_row']
-    
-        # x is: +1 for the edge, +edge hallway, +room width * column nr, +1 off by one
-        room_x = int(1 + self._worldsettings['hallway_space'] + (self._worldsettings['room_size'][0] * column) )
-    
-        # y is: +1 for the edge, +hallway space * (nr row + 1 for the top hallway), +row * room height, +1 off by one
-        room_y = int(1 + self._worldsettings['hallway_space'] * (row + 1) + row * self._worldsettings['room_size'][1] + 1)
-    
-        # door location is always center bottom
-        door_x = room_x + int(np.ceil(self._worldsettings['room_size'][0] / 2))
-        door_y = room_y + self._worldsettings['room_size'][1] - 1
-    
-        return (room_x, room_y), (door_x, door_y)
-    
-    
-    def _addDropOffZones(self, world_size):
-        x = int(np.ceil(world_size[0] / 2)) - \
-            (int(np.floor(self._worldsettings['nr_drop_zones'] / 2)) * \
-                (self._worldsettings['hallway_space'] + 1))
-        y = world_size[1] - 1 - 1  # once for off by one, another for world bound
         for nr_zone in range(self._worldsettings['nr_drop_zones']):
+            x, y = self._layout.getDropZoneLoc(nr_zone)
             # Add the zone's tiles. Area tiles are special types of objects in MATRX that simply function as
             # a kind of floor. They are always traversable and cannot be picked up.
-            self._builder.add_area((x, y - self._worldsettings['nr_blocks_needed'] + 1), 
+            builder.add_area((x, y - self._worldsettings['nr_blocks_needed'] + 1), 
                  width=1, height=self._worldsettings['nr_blocks_needed'], 
                  name=f"Drop off {nr_zone}",
                  visualize_colour=self._worldsettings['drop_off_color'], 
                  drop_zone_nr=nr_zone, is_drop_zone=True, 
                  is_goal_block=False, is_collectable=False)
-    
+
+    def _pickGoalKinds(self, rng:np.random.Generator)->np.ndarray:
+        '''
+        @param rng the generator of the world, seeded with its random_seed
+        @return array with for each drop zone and each of its goal blocks
+        the kind (shape and colour) to collect, see _getKind.
+        '''
+        return rng.integers(self._getNrKinds(),
+                            size=(self._worldsettings['nr_drop_zones'], self._worldsettings['nr_blocks_needed']))
+
+    def _addGoalBlocks(self, goal_kinds:np.ndarray):
+        '''
+        Adds the goal blocks of all drop zones.
+        @param goal_kinds the kinds of the goal blocks, see _pickGoalKinds
+        '''
+        for nr_zone in range(self._worldsettings['nr_drop_zones']):
+            x, y = self._layout.getDropZoneLoc(nr_zone)
             # Go through all needed blocks
             for nr_block in range(self._worldsettings['nr_blocks_needed']):
-                # Create a MATRX random property of shape and color so each world contains different blocks to collect
-                colour_property = RandomProperty(values=self._worldsettings['block_colors'])
-                shape_property = RandomProperty(values=self._worldsettings['block_shapes'])
+                shape, colour = self._getKind(int(goal_kinds[nr_zone, nr_block]))
     
                 # Add a 'ghost image' of the block that should be collected. This can be seen by both humans and agents to
                 # know what should be collected in what order.
                 loc = (x, y - nr_block)
                 self._builder.add_object(loc, 
                    name="Collect Block", callable_class=GhostBlock,
-                   visualize_colour=colour_property, visualize_shape=shape_property,
+                   visualize_colour=colour, visualize_shape=shape,
                    drop_zone_nr=nr_zone, block_size=self._worldsettings['block_size'])
-                
-            # Change the x to the next zone
-            x = x + self._worldsettings['hallway_space'] + 1
+
+
+def _dumps(obj)->bytes:
+    '''
+    pickle.dumps that also handles what matrx keeps in a world: dict
+    key views (e.g. the agent ids in the message manager), pickled as
+    lists, and callbacks to private methods (e.g. the action check the
+    agents get), pickled by their mangled name.
+    '''
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    for keys_type in (type({}.keys()), type(OrderedDict().keys())):
+        pickler.dispatch_table[keys_type] = lambda keys: (list, (list(keys),))
+    pickler.dispatch_table[types.MethodType] = _reduceMethod
+    pickler.dump(obj)
+    return f.getvalue()
+
+
+def _reduceMethod(method:types.MethodType):
+    name = method.__func__.__name__
+    if name.startswith('__') and not name.endswith('__'):
+        classname = method.__func__.__qualname__.rsplit('.', 1)[0].split('.')[-1]
+        name = '_' + classname.lstrip('_') + name
+    return getattr, (method.__self__, name)
@@ -0,0 +1,114 @@
+from typing import Callable, List
+import queue
+import threading
+
+
+class BackgroundLogWriter:
+    '''
+    Writes log rows in a background thread, so that file I/O does not
+    add to the tick time. Rows are collected in batches of batch_size
+    rows, and each full batch is handed to the thread through a bounded
+    queue. The simulation only blocks when more than queue_size batches
+    wait to be written. Rows are written in the order in which they
+    were put.
+    '''
+    # Put on the queue to stop the thread
+    _STOP = object()
+
+    def __init__(self, write_rows:Callable[[List[dict]], None], queue_size:int=10, batch_size:int=100):
+        '''
+        @param write_rows function that writes a list of rows. It is
+        only called from the background thread.
+        @param queue_size the max number of batches waiting to be written
+        @param batch_size the number of rows per write_rows call. The
+        last batch may be smaller.
+        '''
+        self._write_rows = write_rows
+        self._batch_size = batch_size
+        self._batch:List[dict] = []
+        self._queue_size = queue_size
+        self._queue:queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread:threading.Thread = None
+        self._error:BaseException = None
+        self._closed = False
+
+    def put(self, row:dict):
+        '''
+        Adds a row, and queues the batch if it is full. Starts the
+        thread on the first batch.
+        @param row the row. It must not be changed afterwards.
+        @raise the error of the writer thread if writing failed
+        '''
+        if self._closed:
+            raise ValueError("The log writer is closed")
+        self._batch.append(row)
+        if len(self._batch) >= self._batch_size:
+            self._queueBatch()
+
+    def close(self):
+        '''
+        Writes all rows and stops the thread. Calling close again has
+        no effect.
+        @raise the error of the writer thread if writing failed
+        '''
+        if not self._closed:
+            self._closed = True
+            if len(self._batch) > 0:
+                self._queueBatch()
+            if self._thread is not None:
+                self._queue.put(self._STOP)
+                self._thread.join()
+        self._raiseError()
+
+    def drain(self):
+        '''
+        Waits until all queued batches are written. Rows of the batch
+        that is not full yet stay in the batch.
+        @raise the error of the writer thread if writing failed
+        '''
+        if self._thread is not None:
+            self._queue.join()
+        self._raiseError()
+
+    def __getstate__(self):
+        # for checkpoints: the file is complete up to the unqueued batch,
+        # which is kept. The thread is started again after a resume.
+        self.drain()
+        state = dict(self.__dict__)
+        del state['_queue']
+        state['_thread'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._queue = queue.Queue(maxsize=self._queue_size)
+
+    def _queueBatch(self):
+        self._raiseError()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='BW4TLogWriter', daemon=True)
+            self._thread.start()
+        self._queue.put(self._batch)
+        self._batch = []
+
+    def _raiseError(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        '''
+        The loop of the writer thread. After an error the remaining
+        batches are dropped, so that the simulation never blocks on a
+        dead writer.
+        '''
+        while True:
+            rows = self._queue.get()
+            if rows is self._STOP:
+                self._queue.task_done()
+                return
+            if self._error is None:
+                try:
+                    self._write_rows(rows)
+                except BaseException as error:
+                    self._error = error
+            self._queue.task_done()
@@ -0,0 +1,204 @@
+from typing import Dict, Iterator, List, Tuple
+import csv
+import json
+import struct
+import numpy as np
+
+# A binary log file is MAGIC, a json header with the columns and their
+# types, and then blocks of rows. A block is the number of rows, the
+# new entries of the string dictionary (json) and then for each column
+# a fixed width little-endian array with the values of those rows.
+MAGIC = b'BW4TLOG\x01'
+
+# The column types and their array dtype. 'str' columns hold indices
+# into the string dictionary of the file, so a file can have at most
+# 65536 distinct strings.
+DTYPES:Dict[str,str] = {'bool': '<u1', 'int': '<i8', 'str': '<u2'}
+
+
+def _columnType(value)->str:
+    '''
+    @return the column type for a logged value
+    '''
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    return 'str'
+
+
+def _writeJson(f, obj):
+    data = json.dumps(obj).encode('utf-8')
+    f.write(struct.pack('<I', len(data)))
+    f.write(data)
+
+
+def _readJson(f):
+    size, = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(size).decode('utf-8'))
+
+
+class BinaryLogWriter:
+    '''
+    Writes rows of a log as columns of fixed width arrays. Rows are
+    buffered and written in blocks of block_size rows. Strings (like
+    action names) are dictionary encoded, None is stored as ''.
+    The columns are taken from the first row, every next row must
+    have the same columns.
+    '''
+    def __init__(self, filename:str, block_size:int=1000):
+        '''
+        @param filename the file to write, it is overwritten
+        @param block_size the number of rows that are buffered before
+        they are written.
+        '''
+        self._filename = filename
+        self._block_size = block_size
+        self._columns:List[Tuple[str,str]] = []
+        self._buffer:Dict[str,list] = {}
+        self._nr_buffered = 0
+        self._strings:Dict[str,int] = {}
+        self._nr_written_strings = 0
+
+    def append(self, row:dict):
+        '''
+        Adds a row, and writes a block if the buffer is full.
+        @param row dict with as keys the column names
+        @raise ValueError if the row has other columns than the first
+        row, or a new string when the string dictionary is full. The
+        row is not added then.
+        '''
+        if len(self._columns) == 0:
+            self._columns = [(name, _columnType(value)) for name, value in row.items()]
+            self._buffer = {name: [] for name in row.keys()}
+            with open(self._filename, 'wb') as f:
+                f.write(MAGIC)
+                _writeJson(f, {'columns': self._columns})
+        elif row.keys() != self._buffer.keys():
+            raise ValueError(f"Columns of the row {list(row.keys())} differ from the logged "
+                             f"columns {list(self._buffer.keys())}")
+
+        values = []
+        for name, kind in self._columns:
+            value = row[name]
+            if kind == 'str':
+                value = '' if value is None else str(value)
+                if value not in self._strings:
+                    # checked before any value of the row is buffered
+                    if len(self._strings) > np.iinfo(DTYPES['str']).max:
+                        raise ValueError(f"Column {name} has the string {value!r}, but the log already has "
+                                         f"{len(self._strings)} distinct strings, the most it can index")
+                    self._strings[value] = len(self._strings)
+                value = self._strings[value]
+            values.append(value)
+        for (name, _), value in zip(self._columns, values):
+            self._buffer[name].append(value)
+        self._nr_buffered += 1
+        if self._nr_buffered >= self._block_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered rows as a block.
+        '''
+        if self._nr_buffered == 0:
+            return
+        new_strings = list(self._strings.keys())[self._nr_written_strings:]
+        with open(self._filename, 'ab') as f:
+            f.write(struct.pack('<I', self._nr_buffered))
+            _writeJson(f, new_strings)
+            for name, kind in self._columns:
+                f.write(np.asarray(self._buffer[name], dtype=DTYPES[kind]).tobytes())
+                self._buffer[name] = []
+        self._nr_written_strings = len(self._strings)
+        self._nr_buffered = 0
+
+
+class BinaryLogReader:
+    '''
+    Reads a log written by BinaryLogWriter, column by column.
+    '''
+    def __init__(self, filename:str):
+        self._filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not a binary BW4T log")
+            self._columns:List[Tuple[str,str]] = [tuple(column) for column in _readJson(f)['columns']]
+            self._start = f.tell()
+
+    def getColumns(self)->List[Tuple[str,str]]:
+        '''
+        @return list of (column name, type), type is 'bool', 'int' or 'str'
+        '''
+        return self._columns
+
+    def getBlocks(self)->Iterator[Tuple[Dict[str,np.ndarray],List[str]]]:
+        '''
+        Reads the file block by block, so memory use is bounded by the block size.
+        @return iterator over tuples (block, strings). The block is a dict
+        with for each column the array of its values in that block. str
+        columns hold indices into strings, which is the string dictionary
+        of the file up to and including that block.
+        '''
+        strings:List[str] = []
+        with open(self._filename, 'rb') as f:
+            f.seek(self._start)
+            while True:
+                size = f.read(4)
+                if len(size) < 4:
+                    return
+                nr_rows, = struct.unpack('<I', size)
+                strings = strings + _readJson(f)
+                block = {}
+                for name, kind in self._columns:
+                    dtype = np.dtype(DTYPES[kind])
+                    block[name] = np.frombuffer(f.read(nr_rows * dtype.itemsize), dtype=dtype)
+                yield block, strings
+
+    def getRow(self, block:Dict[str,np.ndarray], strings:List[str], index:int)->Dict[str,str]:
+        '''
+        @param block a block from getBlocks
+        @param strings the strings that came with the block
+        @param index the index of the row in the block, -1 for the last
+        @return the row as dict with the values as they would be in the csv log.
+        '''
+        return {name: _toStrings(block[name][[index]], kind, strings)[0] for name, kind in self._columns}
+
+    def getRows(self)->Iterator[Dict[str,str]]:
+        '''
+        @return iterator over the rows, as dicts with the values as
+        they would be in the csv log.
+        '''
+        for block, strings in self.getBlocks():
+            columns = [(name, _toStrings(block[name], kind, strings)) for name, kind in self._columns]
+            for i in range(len(columns[0][1]) if len(columns) > 0 else 0):
+                yield {name: values[i] for name, values in columns}
+
+    def toCsv(self, filename:str, delimiter:str=';'):
+        '''
+        Writes the log in the csv layout of BW4TLogger.
+        '''
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL,
+                                    fieldnames=[name for name, _ in self._columns])
+            writer.writeheader()
+            for row in self.getRows():
+                writer.writerow(row)
+
+
+def _toStrings(values:np.ndarray, kind:str, strings:List[str])->List[str]:
+    '''
+    @return the values as strings, as written in a csv log
+    '''
+    if kind == 'bool':
+        return ['True' if value else 'False' for value in values]
+    if kind == 'str':
+        return [strings[value] for value in values]
+    return [str(value) for value in values]
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        raise ValueError("usage: python -m bw4t.BinaryLog <binary log> <csv file>")
+    BinaryLogReader(sys.argv[1]).toCsv(sys.argv[2])
@@ -0,0 +1,359 @@
+from typing import Dict, List, Tuple
+import multiprocessing
+import pickle
+import random
+from matrx.grid_world import GridWorld
+from matrx.agents.agent_utils.state import State
+
+# The callback to the world that brains get for is_action_possible. It
+# is not sent to the workers, brains in a worker can not use it.
+_WORLD_CALLBACK = '_BW4TAgentBrain__callback_is_action_possible'
+
+
+class BrainPool:
+    '''
+    Runs BW4TBrains in worker processes, so that the agents of a tick
+    filter and decide concurrently. Each worker keeps its brains for the
+    whole run. Every tick the pool sends each worker the object
+    properties that changed and, for each of its agents, which objects
+    it perceives; the workers start right away, and the FastForwardRunner
+    takes the results in agent order, as if the brains ran in the world
+    process:
+    * the agent bodies call a _BrainProxy instead of the brain, so
+      loggers and the Recorder see the same calls and results
+    * the python random state is handed from agent to agent in that
+      order. A worker only asks for it, and waits for it, when its brain
+      draws a random number (matrx does so for every new Message), and
+      gives the state back after the call.
+    So a run gives the same logs as a sequential fast_forward run with
+    the same seed, provided brains only use the global random or their
+    own generators, and only while filtering or deciding, and do not
+    call is_action_possible. Agents perceive each other as at the start
+    of the tick: the action properties (like current_action) of the
+    agents that decide earlier in the tick are those of their previous
+    action.
+    '''
+    def __init__(self, brains:Dict[str,object], nr_workers:int):
+        '''
+        @param brains the BW4TBrains to run in the workers, by agent id
+        @param nr_workers the number of worker processes
+        '''
+        self._brains = brains
+        self._nr_workers = min(nr_workers, len(brains))
+        self._worker_nrs = {agent_id: nr % self._nr_workers for nr, agent_id in enumerate(brains)}
+        self._proxies = {agent_id: _BrainProxy(self, agent_id) for agent_id in brains}
+        self._installed = False
+        self._connections:List = None
+        self._processes:List = None
+        # the properties the workers have, to send only the changes
+        self._sent:Dict[str,dict] = {}
+        # the ids of the perceived objects the workers have, by agent id
+        self._sent_ids:Dict[str,list] = {}
+        # per worker: the action results and messages to give its brains
+        self._events:List[list] = [[] for _ in range(self._nr_workers)]
+        # per worker: whether the reply with log data still has to be read
+        self._log_pending:List[bool] = [False] * self._nr_workers
+        self._log_data:Dict[str,dict] = {}
+
+    def hasBrain(self, agent_id:str)->bool:
+        return agent_id in self._brains
+
+    def getProxy(self, agent_id:str)->'_BrainProxy':
+        '''
+        @return the stand-in for the brain of the agent in the world process
+        '''
+        return self._proxies[agent_id]
+
+    def isStarted(self)->bool:
+        return self._processes is not None
+
+    def start(self, gridworld:GridWorld):
+        '''
+        Sends the brains to new worker processes. The first start also
+        lets the agent bodies call the proxies instead of the brains, so
+        call it before the first tick, after the brains are initialized.
+        '''
+        if not self._installed:
+            self._installed = True
+            for agent_id, proxy in self._proxies.items():
+                body = gridworld.registered_agents[agent_id]
+                body.get_action_func = proxy.getAction
+                body.filter_observations = proxy.fetchState
+                body.get_messages_func = proxy.getMessages
+                body.set_messages_func = proxy.setMessages
+                body.set_action_result_func = proxy.setActionResult
+                body.get_log_data = proxy.getLogData
+                self._log_data[agent_id] = self._brains[agent_id]._get_log_data()
+        self._sent = {}
+        self._sent_ids = {}
+        self._connections = []
+        self._processes = []
+        for nr in range(self._nr_workers):
+            brains = {agent_id: brain for agent_id, brain in self._brains.items() if self._worker_nrs[agent_id] == nr}
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_runWorker, args=(child, _dumpBrains(brains)), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def dispatch(self, properties:Dict[str,dict], requests:List[tuple]):
+        '''
+        Starts the filter and decide calls of a tick in the workers.
+        @param properties the properties of all objects, by id
+        @param requests (agent_id, busy, ids of the perceived objects,
+        world info, agent properties) in agent order. Busy agents only
+        filter their state.
+        '''
+        changed = {obj_id: props for obj_id, props in properties.items() if self._sent.get(obj_id) != props}
+        removed = [obj_id for obj_id in self._sent if obj_id not in properties]
+        self._sent = properties
+        # what an agent perceives seldom changes, the workers keep the last ids
+        requests = [self._dropSentIds(request) for request in requests]
+        for nr, connection in enumerate(self._connections):
+            connection.send(('tick', changed, removed,
+                             [request for request in requests if self._worker_nrs[request[0]] == nr]))
+
+    def flush(self):
+        '''
+        Gives the action results and messages of the tick to the brains,
+        called at the end of each tick.
+        '''
+        for nr, connection in enumerate(self._connections):
+            self._receiveLog(nr)
+            connection.send(('events', self._events[nr]))
+            self._events[nr] = []
+            self._log_pending[nr] = True
+
+    def sync(self):
+        '''
+        Copies the state of the brains in the workers to the brains in
+        this process, e.g. for a checkpoint or after the run.
+        '''
+        for nr, connection in enumerate(self._connections):
+            self._receiveLog(nr)
+            connection.send(('sync',))
+            for agent_id, brain in _loadBrains(self._receive(nr, 'brains')[1]).items():
+                self._brains[agent_id].__dict__.update(brain.__dict__)
+
+    def close(self):
+        '''
+        Syncs the brains and stops the workers. A next tick starts them again.
+        '''
+        if self.isStarted():
+            self.sync()
+            for connection, process in zip(self._connections, self._processes):
+                connection.send(('close',))
+                process.join()
+                connection.close()
+            self._connections = None
+            self._processes = None
+
+    def terminate(self):
+        '''
+        Stops the workers without syncing the brains, e.g. after an error.
+        '''
+        if self.isStarted():
+            for connection, process in zip(self._connections, self._processes):
+                process.terminate()
+                connection.close()
+            self._connections = None
+            self._processes = None
+
+    def __getstate__(self):
+        # for checkpoints: the brains of this process are synced, the
+        # workers are started again after a resume
+        if self.isStarted():
+            self.sync()
+        state = dict(self.__dict__)
+        state['_connections'] = None
+        state['_processes'] = None
+        return state
+
+    def _dropSentIds(self, request:tuple)->tuple:
+        '''
+        @return the request, with None for the ids if the worker has them already
+        '''
+        agent_id, busy, ids, world_info, agent_properties = request
+        if self._sent_ids.get(agent_id) == ids:
+            return agent_id, busy, None, world_info, agent_properties
+        self._sent_ids[agent_id] = ids
+        return request
+
+    def _addEvent(self, agent_id:str, kind:str, payload):
+        self._events[self._worker_nrs[agent_id]].append((agent_id, kind, payload))
+
+    def _getLogData(self, agent_id:str)->dict:
+        self._receiveLog(self._worker_nrs[agent_id])
+        return self._log_data[agent_id]
+
+    def _getResult(self, agent_id:str):
+        '''
+        Waits for the result of the call of the current tick of an
+        agent. Gives the worker the random state if the brain needs it,
+        and takes the state after the call.
+        '''
+        nr = self._worker_nrs[agent_id]
+        self._receiveLog(nr)
+        reply = self._connections[nr].recv()
+        if reply[0] == 'random':
+            self._connections[nr].send(random.getstate())
+            reply = self._connections[nr].recv()
+        _, replied_id, result, random_state = reply
+        if replied_id != agent_id:
+            raise RuntimeError(f"Worker {nr} replied for {replied_id} instead of {agent_id}")
+        if random_state is not None:
+            random.setstate(random_state)
+        return result
+
+    def _receiveLog(self, nr:int):
+        if self._log_pending[nr]:
+            self._log_pending[nr] = False
+            self._log_data.update(self._receive(nr, 'log')[1])
+
+    def _receive(self, nr:int, kind:str)->tuple:
+        reply = self._connections[nr].recv()
+        if reply[0] != kind:
+            raise RuntimeError(f"Worker {nr} sent {reply[0]} instead of {kind}")
+        return reply
+
+
+class _BrainProxy:
+    '''
+    Stands in for a brain in the world process: the agent body calls
+    these instead of the brain callbacks.
+    '''
+    def __init__(self, pool:BrainPool, agent_id:str):
+        self._pool = pool
+        self._agent_id = agent_id
+        self._messages:list = []
+        self._idle_condition = None
+
+    def getAction(self, state, agent_properties, agent_id, user_input=None):
+        agent_properties, action_name, action_kwargs, self._messages, self._idle_condition = \
+            self._pool._getResult(self._agent_id)
+        return None, agent_properties, action_name, action_kwargs
+
+    def fetchState(self, state):
+        return self._pool._getResult(self._agent_id)
+
+    def getMessages(self, all_agent_ids)->list:
+        messages = self._messages
+        self._messages = []
+        return messages
+
+    def setMessages(self, messages=None):
+        self._pool._addEvent(self._agent_id, 'messages', messages)
+
+    def setActionResult(self, action_result):
+        self._pool._addEvent(self._agent_id, 'result', action_result)
+
+    def getLogData(self)->dict:
+        return self._pool._getLogData(self._agent_id)
+
+    def getIdleCondition(self):
+        '''
+        @return the IdleCondition of the last decision, see BW4TBrain.getIdleCondition
+        '''
+        return self._idle_condition
+
+
+def _dumpBrains(brains:Dict[str,object])->bytes:
+    '''
+    @return the brains pickled without their world callback, so without the world
+    '''
+    return pickle.dumps({agent_id: (type(brain), {key: value for key, value in brain.__dict__.items()
+                                                  if key != _WORLD_CALLBACK})
+                         for agent_id, brain in brains.items()})
+
+
+def _loadBrains(data:bytes)->Dict[str,object]:
+    brains = {}
+    for agent_id, (brain_class, state) in pickle.loads(data).items():
+        brain = brain_class.__new__(brain_class)
+        brain.__dict__.update(state)
+        brains[agent_id] = brain
+    return brains
+
+
+def _makeState(agent_id:str, state_dict:Dict[str,dict], world_info:dict)->State:
+    '''
+    Same as FastForwardRunner._getAgentState, from the perceived properties.
+    '''
+    state = State(agent_id)
+    state._State__state_dict = state_dict
+    state._State__me = state_dict[agent_id]
+    state._add_world_info(world_info)
+    return state
+
+
+def _runWorker(connection, brains:bytes):
+    '''
+    The loop of a worker process of a BrainPool.
+    '''
+    brains = _loadBrains(brains)
+    # the properties of all objects, as last sent
+    properties:Dict[str,dict] = {}
+    # the ids of the objects each agent perceived, as last sent
+    perceived:Dict[str,list] = {}
+    # whether the brain being called got the random state of the world process
+    call:Dict[str,object] = {'agent_id': None, 'has_random': False}
+    generator = random._inst
+
+    def getRandomState():
+        if call['agent_id'] is not None and not call['has_random']:
+            connection.send(('random', call['agent_id']))
+            generator.setstate(connection.recv())
+            call['has_random'] = True
+
+    def wrap(method):
+        def wrapper(*args, **kwargs):
+            getRandomState()
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name, value in list(vars(random).items()):
+        if getattr(value, '__self__', None) is generator:
+            setattr(random, name, wrap(value))
+
+    while True:
+        command = connection.recv()
+        if command[0] == 'tick':
+            _, changed, removed, requests = command
+            properties.update(changed)
+            for obj_id in removed:
+                del properties[obj_id]
+            # every tick gets new property dicts, as in the world process
+            copies:Dict[str,dict] = {}
+            for agent_id, busy, ids, world_info, agent_properties in requests:
+                if ids is None:
+                    ids = perceived[agent_id]
+                perceived[agent_id] = ids
+                for obj_id in ids:
+                    if obj_id not in copies:
+                        copies[obj_id] = dict(properties[obj_id])
+                state = _makeState(agent_id, {obj_id: copies[obj_id] for obj_id in ids}, world_info)
+                brain = brains[agent_id]
+                call['agent_id'], call['has_random'] = agent_id, False
+                if busy:
+                    brain._fetch_state(state)
+                    result = None
+                else:
+                    _, agent_properties, action_name, action_kwargs = \
+                        brain._get_action(state, agent_properties, agent_id)
+                    result = (agent_properties, action_name, action_kwargs, brain._get_messages(None),
+                              brain.getIdleCondition())
+                connection.send(('done', agent_id, result, generator.getstate() if call['has_random'] else None))
+                call['agent_id'] = None
+        elif command[0] == 'events':
+            for agent_id, kind, payload in command[1]:
+                if kind == 'messages':
+                    brains[agent_id]._set_messages(payload)
+                else:
+                    brains[agent_id]._set_action_result(payload)
+            connection.send(('log', {agent_id: brain._get_log_data() for agent_id, brain in brains.items()}))
+        elif command[0] == 'sync':
+            connection.send(('brains', _dumpBrains(brains)))
+        elif command[0] == 'close':
+            connection.close()
+            return
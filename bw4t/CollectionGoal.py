@@ -2,7 +2,6 @@ import numpy as np # type: ignore
 
 from matrx.goals import WorldGoal # type: ignore
 from matrx.grid_world import GridWorld # type: ignore
-from matrx.objects.env_object import EnvObject # type: ignore
 
 
 class CollectionGoal(WorldGoal):
@@ -24,8 +23,30 @@ class CollectionGoal(WorldGoal):
         # the right order.
         self.__drop_off:dict = {}
 
-        # We also track the progress
+        # The location of each goal block, as (zone nr, rank) by location
+        self.__goal_at:dict = {}
+
+        # We also track the progress, per zone: the number of blocks delivered in order and whether the zone is
+        # complete. The totals are kept up to date with them, so a check only looks at the zones that changed.
         self.__progress = 0
+        self.__zone_progress:dict = {}
+        self.__zone_satisfied:dict = {}
+        self.__nr_delivered = 0
+        self.__nr_satisfied = 0
+        self.__nr_goal_blocks = 0
+
+        # Completion is computed once per tick, as isBlocksPlaced is called both by goal_reached and the logger.
+        self.__checked_tick = None
+        self.__is_satisfied = False
+
+        # Index with as key a drop off location and as value the collectable blocks at that location, and the
+        # location of each of these blocks by id. Blocks only move by being grabbed (they leave the world) and
+        # dropped (they come back), so the index is updated with the blocks whose carrier changed since the last
+        # check. The carried block ids by agent and the number of objects of that check are kept for this.
+        self.__blocks_at:dict = {}
+        self.__block_locs:dict = {}
+        self.__carried:dict = None
+        self.__nr_objects = None
 
     #override
     def goal_reached(self, grid_world: GridWorld):
@@ -38,16 +59,103 @@ class CollectionGoal(WorldGoal):
         @return true if all blocks have been placed in right order
         '''
 
+        if self.__checked_tick == grid_world.current_nr_ticks:
+            return self.__is_satisfied
+
         if self.__drop_off =={}:  # find all drop off locations, its tile ID's and goal blocks
             self.__find_drop_off_locations(grid_world)
 
-        # Go through each drop zone, and check if the blocks are there in the right order
-        is_satisfied, progress = self.__check_completion(grid_world)
+        # Only the zones where blocks may have been grabbed or dropped need to be checked again.
+        dirty_zones = self.__update_blocks_at(grid_world)
+        if len(dirty_zones) > 0:
+            for zone_nr in sorted(dirty_zones):
+                self.__check_zone(zone_nr, grid_world.current_nr_ticks)
+
+            # Progress in percentage
+            self.__progress = self.__nr_delivered / self.__nr_goal_blocks
+            self.__is_satisfied = self.__nr_satisfied == len(self.__drop_off)
+
+        self.__checked_tick = grid_world.current_nr_ticks
+        return self.__is_satisfied
+
+    def getProgress(self)->float:
+        '''
+        @return the fraction of the goal blocks that was delivered in
+        order, as of the last isBlocksPlaced
+        '''
+        return self.__progress
+
+    def getZoneProgress(self)->dict:
+        '''
+        @return the number of goal blocks delivered in order in each
+        drop zone, by zone nr, as of the last isBlocksPlaced
+        '''
+        return dict(self.__zone_progress)
+
+    def getCompletedZones(self)->list:
+        '''
+        @return the numbers of the drop zones that are complete, as of the last isBlocksPlaced
+        '''
+        return [zone_nr for zone_nr, satisfied in self.__zone_satisfied.items() if satisfied]
 
-        # Progress in percentage
-        self.__progress = progress / sum([len(goal_blocks)\
-            for goal_blocks in self.__drop_off.values()])
-        return is_satisfied
+    def __update_blocks_at(self, grid_world:GridWorld)->set:
+        '''
+        Updates the index of collectable blocks at each drop off location
+        with the blocks that were grabbed or dropped since the last call.
+        The whole index is rebuilt the first time, and when objects came
+        or went in another way.
+        @return the numbers of the zones whose blocks may have changed
+        '''
+        all_objs = grid_world.environment_objects
+        carried = {agent_id: tuple(obj.obj_id for obj in agent.is_carrying)
+            for agent_id, agent in grid_world.registered_agents.items() if len(agent.is_carrying) > 0}
+        if carried == self.__carried and len(all_objs) == self.__nr_objects:
+            return set()
+
+        was_carried = set() if self.__carried is None else \
+            {obj_id for obj_ids in self.__carried.values() for obj_id in obj_ids}
+        is_carried = {obj_id for obj_ids in carried.values() for obj_id in obj_ids}
+        grabbed = is_carried - was_carried
+        dropped = was_carried - is_carried
+        is_explained = self.__carried is not None and all(obj_id in all_objs for obj_id in dropped) and \
+            len(all_objs) == self.__nr_objects + len(dropped) - len(grabbed)
+        self.__carried = carried
+        self.__nr_objects = len(all_objs)
+        if not is_explained:
+            self.__index_drop_off_blocks(grid_world)
+            return set(self.__drop_off.keys())
+
+        dirty_zones = set()
+        for obj_id in grabbed:
+            loc = self.__block_locs.pop(obj_id, None)
+            if loc is not None:
+                self.__blocks_at[loc] = [b for b in self.__blocks_at[loc] if b.obj_id != obj_id]
+                dirty_zones.add(self.__goal_at[loc][0])
+        if len(dropped) > 1:
+            # dropped blocks are added to the objects, and to a location, in the order they were dropped
+            dropped = [obj_id for obj_id in all_objs.keys() if obj_id in dropped]
+        for obj_id in dropped:
+            obj = all_objs[obj_id]
+            loc = tuple(obj.location)
+            if loc in self.__goal_at and obj.properties.get("is_collectable", False):
+                self.__blocks_at[loc].append(obj)
+                self.__block_locs[obj_id] = loc
+                dirty_zones.add(self.__goal_at[loc][0])
+        return dirty_zones
+
+    def __index_drop_off_blocks(self, grid_world:GridWorld):
+        '''
+        Rebuilds the index of collectable blocks at each drop off location.
+        '''
+        all_objs = grid_world.environment_objects
+        self.__blocks_at = {loc: [] for loc in self.__goal_at.keys()}
+        self.__block_locs = {}
+        # A single pass over the objects, in their order, which is the order in which they are at a location
+        for obj_id, obj in all_objs.items():
+            loc = tuple(obj.location)
+            if loc in self.__goal_at and obj.properties.get("is_collectable", False):
+                self.__blocks_at[loc].append(obj)
+                self.__block_locs[obj_id] = loc
 
     def __find_drop_off_locations(self, grid_world:GridWorld):
 
@@ -88,55 +196,53 @@ class CollectionGoal(WorldGoal):
                     if block.location == loc:
                         # Add to self.drop_off
                         self.__drop_off[zone_nr][rank] = [loc, block.visualize_shape, block.visualize_colour, None]
+                        self.__goal_at[loc] = (zone_nr, rank)
 
-    def __check_completion(self, grid_world:GridWorld):
-        # Get the current tick number
-        curr_tick = grid_world.current_nr_ticks
-
-        # loop through all zones, check the blocks and set the tick if satisfied
-        for zone_nr, goal_blocks in self.__drop_off.items():
-            # Go through all ranks of this drop off zone
-            for rank, block_data in goal_blocks.items():
-                loc = block_data[0]  # the location, needed to find blocks here
-                shape = block_data[1]  # the desired shape
-                colour = block_data[2]  # the desired colour
-                tick = block_data[3]
-
-                # Retrieve all objects, the object ids at the location and obtain all BW4T Blocks from it
-                all_objs = grid_world.environment_objects
-                obj_ids = grid_world.get_objects_in_range(loc, object_type=EnvObject, sense_range=0)
-                blocks = [all_objs[obj_id] for obj_id in obj_ids
-                          if obj_id in all_objs.keys() and "is_collectable" in all_objs[obj_id].properties.keys()]
-                blocks = [b for b in blocks if b.properties["is_collectable"]]
-
-                # Check if there is a block, and if so if it is the right one and the tick is not yet set, then set the
-                # current tick.
-                if len(blocks) > 0 and blocks[0].visualize_shape == shape and blocks[0].visualize_colour == colour and \
-                        tick is None:
-                    self.__drop_off[zone_nr][rank][3] = curr_tick
-                # if there is no block, reset its tick to None
-                elif len(blocks) == 0:
-                    self.__drop_off[zone_nr][rank][3] = None
+            self.__zone_progress[zone_nr] = 0
+            self.__zone_satisfied[zone_nr] = False
+            self.__nr_goal_blocks += len(self.__drop_off[zone_nr])
+
+    def __check_zone(self, zone_nr:int, curr_tick:int):
+        '''
+        Checks the blocks of a zone, sets the tick of each rank that got
+        the right block and updates the progress and completion.
+        '''
+        goal_blocks = self.__drop_off[zone_nr]
+        # Go through all ranks of this drop off zone
+        for rank, block_data in goal_blocks.items():
+            loc = block_data[0]  # the location, needed to find blocks here
+            shape = block_data[1]  # the desired shape
+            colour = block_data[2]  # the desired colour
+            tick = block_data[3]
+            blocks = self.__blocks_at[loc]
+
+            # Check if there is a block, and if so if it is the right one and the tick is not yet set, then set the
+            # current tick.
+            if len(blocks) > 0 and blocks[0].visualize_shape == shape and blocks[0].visualize_colour == colour and \
+                    tick is None:
+                block_data[3] = curr_tick
+            # if there is no block, reset its tick to None
+            elif len(blocks) == 0:
+                block_data[3] = None
 
         # Now check if all blocks are collected in the right order
-        is_satisfied = True
+        zone_satisfied = True
         progress = 0
-        for zone_nr, goal_blocks in self.__drop_off.items():
-            zone_satisfied = True
-            ticks = [goal_blocks[r][3] for r in range(len(goal_blocks))]  # list of ticks in rank order
-
-            # check if all ticks are increasing
-            for idx, tick in enumerate(ticks[:-1]):
-                if tick is None or ticks[idx+1] is None or not tick < ticks[idx+1]:
-                    progress += (idx+1) if tick is not None else idx  # increment progress
-                    zone_satisfied = False  # zone is not complete or ordered
-                    break  # break this loop
-
-            # if all ticks were increasing, check if the last tick is set and set progress to full for this zone
-            if zone_satisfied and ticks[-1] is not None:
-                progress += len(goal_blocks)
-
-            # update our satisfied boolean
-            is_satisfied = is_satisfied and zone_satisfied
-
-        return is_satisfied, progress
\ No newline at end of file
+        ticks = [goal_blocks[r][3] for r in range(len(goal_blocks))]  # list of ticks in rank order
+
+        # check if all ticks are increasing
+        for idx, tick in enumerate(ticks[:-1]):
+            if tick is None or ticks[idx+1] is None or not tick < ticks[idx+1]:
+                progress = (idx+1) if tick is not None else idx
+                zone_satisfied = False  # zone is not complete or ordered
+                break  # break this loop
+
+        # if all ticks were increasing, check if the last tick is set and set progress to full for this zone
+        if zone_satisfied and ticks[-1] is not None:
+            progress = len(goal_blocks)
+
+        # update the totals with the change of this zone
+        self.__nr_delivered += progress - self.__zone_progress[zone_nr]
+        self.__nr_satisfied += int(zone_satisfied) - int(self.__zone_satisfied[zone_nr])
+        self.__zone_progress[zone_nr] = progress
+        self.__zone_satisfied[zone_nr] = zone_satisfied
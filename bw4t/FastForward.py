@@ -0,0 +1,406 @@
+from typing import Callable, Dict, FrozenSet, List, Set, Tuple
+from collections import OrderedDict
+import time
+from matrx.grid_world import GridWorld
+from matrx.goals import WorldGoalV2
+from matrx.logger.logger import GridWorldLoggerV2
+from matrx.agents.agent_utils.state import State
+from matrx.objects.env_object import EnvObject
+from matrx.objects.agent_body import AgentBody
+from matrx.objects import Door
+from bw4t.ObservationBuffer import ObservationBuffer
+from bw4t.IdleCondition import IdleCondition
+from bw4t.BW4TBlocks import CollectableBlock
+from bw4t.BrainPool import BrainPool
+
+
+class FastForwardRunner:
+    '''
+    Runs a headless GridWorld as fast as possible, for offline evaluation.
+    It replaces the GridWorld.run loop with one that does the same
+    agent, action, message and logging work per tick, but
+    * never publishes states to the API and never sleeps
+    * computes the properties of every object once per tick, instead of
+      once for every agent that perceives it
+    * only compares distances for the object types an agent senses with
+      a limited range, and finds the agent in its state by its id
+    * only builds the complete world state when a goal, logger or
+      object actually uses it
+    * collects the agent log data once per tick for all loggers.
+    The resulting logs are the same as those of GridWorld.run.
+    With an ObservationBuffer, it is updated once per tick before the
+    agents decide, and the array agents get a State with only themselves.
+    With idle brains, agents that declared themselves idle (see
+    BW4TBrain.idleUntil) are skipped until their IdleCondition wakes them.
+    With a BrainPool, the brains in the pool filter and decide in its
+    workers, and the results are taken in agent order.
+    '''
+    def __init__(self, gridworld:GridWorld, observations:ObservationBuffer=None, array_agents:Set[str]=frozenset(),
+                 idle_brains:Dict[str,object]=None, brain_pool:BrainPool=None):
+        '''
+        @param gridworld a world created by a WorldBuilder with
+        run_matrx_api=False, that has not been run yet.
+        @param observations the ObservationBuffer of the world, or None
+        @param array_agents the ids of the agents that only use the
+        ObservationBuffer, and so do not need a State of the objects around them.
+        @param idle_brains the BW4TBrains that may go idle, by agent id
+        @param brain_pool the BrainPool running the brains, or None to
+        run all brains in this process
+        '''
+        self._gridworld = gridworld
+        self._observations = observations
+        self._array_agents = frozenset(array_agents)
+        self._idle_brains = {} if idle_brains is None else idle_brains
+        # the armed IdleCondition of each idle agent
+        self._idle:Dict[str,IdleCondition] = {}
+        self._pool = brain_pool
+        self._door_ids:List[str] = None
+        # (tick, door states) and (tick, block locations by id) of the last tick they were needed
+        self._door_states:tuple = (None, None)
+        self._block_locations:tuple = (None, None)
+        self._nr_ticks = 0
+        self._seconds = 0.
+        # isinstance per (object class, sensed class), it only depends on the classes
+        self._is_type:Dict[tuple,bool] = {}
+
+    def run(self, api_info:dict=None, checkpoint:Callable[[], None]=None, checkpoint_interval:int=0):
+        '''
+        Runs the world until the goal is reached.
+        @param api_info the api_info of the builder, passed to initialize.
+        None for a world that is initialized already, e.g. one that was
+        resumed from a checkpoint.
+        @param checkpoint function that is called every checkpoint_interval
+        ticks, between two ticks.
+        @param checkpoint_interval the number of ticks between checkpoints,
+        0 for no checkpoints.
+        '''
+        gw = self._gridworld
+        if api_info is not None:
+            gw.initialize(api_info)
+        start = time.perf_counter()
+        is_done = False
+        try:
+            while not is_done:
+                is_done = self._step()
+                self._nr_ticks += 1
+                if checkpoint_interval > 0 and not is_done and gw.current_nr_ticks % checkpoint_interval == 0:
+                    checkpoint()
+        except BaseException:
+            if self._pool is not None:
+                self._pool.terminate()
+            raise
+        self.close()
+        self._seconds = time.perf_counter() - start
+
+    def step(self)->bool:
+        '''
+        Runs a single tick, for stepping through an initialized world.
+        @return true if the world is done
+        '''
+        is_done = self._step()
+        self._nr_ticks += 1
+        return is_done
+
+    def syncBrains(self):
+        '''
+        Brings the brains in this process up to date with those in the
+        workers of the BrainPool, if any.
+        '''
+        if self._pool is not None and self._pool.isStarted():
+            self._pool.sync()
+
+    def close(self):
+        '''
+        Stops the workers of the BrainPool, if any, after syncing the
+        brains. Called at the end of run; call it after stepping.
+        '''
+        if self._pool is not None:
+            self._pool.close()
+
+    def getAgentState(self, agent_id:str)->State:
+        '''
+        @return the state the agent perceives at the start of the coming
+        tick, before its brain filters it. Objects do not change before
+        the agents decide, so this is the state it will get, except for
+        the action properties (like is_blocked_by_action) of the agents
+        that decide before it in that tick.
+        '''
+        gw = self._gridworld
+        properties = {obj_id: obj.properties for obj_id, obj in gw.environment_objects.items()}
+        return self._getAgentState(gw.registered_agents[agent_id], properties)
+
+    def getTicksPerSecond(self)->float:
+        '''
+        @return the number of ticks per second of wall-clock time of the last run
+        '''
+        return self._nr_ticks / self._seconds if self._seconds > 0 else 0.
+
+    def _needsWorldState(self)->bool:
+        '''
+        @return true if a goal or logger takes the world state. Actions
+        get it too, but the matrx actions do not use it.
+        '''
+        goals = self._gridworld.simulation_goal
+        if not isinstance(goals, (list, tuple)):
+            goals = [goals]
+        return any(isinstance(goal, WorldGoalV2) for goal in goals) or \
+            any(isinstance(logger, GridWorldLoggerV2) for logger in self._gridworld._GridWorld__loggers)
+
+    def _step(self)->bool:
+        '''
+        One tick, in the order of GridWorld.__step.
+        @return true if the world is done
+        '''
+        gw = self._gridworld
+        agents = gw._GridWorld__registered_agents
+        tick = gw.current_nr_ticks
+        if self._pool is not None and not self._pool.isStarted():
+            # before the loggers, which may wrap the brain callbacks
+            self._pool.start(gw)
+            self._idle_brains = {agent_id: self._pool.getProxy(agent_id) if self._pool.hasBrain(agent_id) else brain
+                                 for agent_id, brain in self._idle_brains.items()}
+
+        world_state = gw._GridWorld__get_complete_state() if self._needsWorldState() else None
+        is_done, goal_status = gw._GridWorld__check_simulation_goal(world_state)
+        gw._GridWorld__is_done = is_done
+
+        loggers = gw._GridWorld__loggers
+        if len(loggers) > 0:
+            agent_data = {agent_id: body.get_log_data() for agent_id, body in agents.items()}
+            for logger in loggers:
+                if isinstance(logger, GridWorldLoggerV2):
+                    logger._grid_world_log(world_state=world_state, agent_data=agent_data, grid_world=gw,
+                                           last_tick=is_done, goal_status=goal_status)
+                else:
+                    logger._grid_world_log(agent_data=agent_data, grid_world=gw,
+                                           last_tick=is_done, goal_status=goal_status)
+        if is_done:
+            return True
+
+        if self._observations is not None:
+            self._observations.update(gw)
+        skipped = {agent_id for agent_id, agent_obj in agents.items() if self._isSkipped(agent_id, agent_obj)}
+        # Objects do not change while the agents decide, so their
+        # properties can be shared by all agents of this tick.
+        # They are only computed if some agent gets a full State.
+        properties = None
+        if self._pool is not None or any(agent_id not in skipped and agent_id not in self._array_agents
+                                         for agent_id in agents):
+            properties = {obj_id: obj.properties for obj_id, obj in gw.environment_objects.items()}
+        if self._pool is not None:
+            requests = [self._getRequest(agent_obj) for agent_id, agent_obj in agents.items()
+                        if agent_id not in skipped and self._pool.hasBrain(agent_id)]
+            # the agent bodies are not environment objects
+            self._pool.dispatch(dict(properties, **{agent_id: agent_obj.properties for agent_id, agent_obj
+                                                    in agents.items() if agent_id not in properties}), requests)
+
+        action_buffer = OrderedDict()
+        for agent_id, agent_obj in agents.items():
+            if agent_id in skipped:
+                continue
+            if self._pool is not None and self._pool.hasBrain(agent_id):
+                # the brain perceives in its worker
+                state = None
+            elif agent_id in self._array_agents:
+                state = self._getOwnState(agent_obj)
+            else:
+                state = self._getAgentState(agent_obj, properties)
+            if agent_obj._check_agent_busy(curr_tick=tick):
+                agent_obj.filter_observations(state)
+            else:
+                if agent_obj.is_human_agent:
+                    _, agent_properties, action_class_name, action_kwargs = agent_obj.get_action_func(
+                        state=state, agent_properties=agent_obj.properties, agent_id=agent_id, user_input=None)
+                else:
+                    _, agent_properties, action_class_name, action_kwargs = agent_obj.get_action_func(
+                        state=state, agent_properties=agent_obj.properties, agent_id=agent_id)
+                agent_obj._set_agent_changed_properties(agent_properties)
+                gw._GridWorld__set_agent_busy(action_name=action_class_name, action_kwargs=action_kwargs,
+                                              agent_id=agent_id)
+                all_agent_ids = agents.keys()
+                agent_messages = agent_obj.get_messages_func(all_agent_ids)
+                gw.message_manager.preprocess_messages(tick, agent_messages, all_agent_ids, gw._GridWorld__teams)
+                if agent_id in self._idle_brains:
+                    condition = self._idle_brains[agent_id].getIdleCondition()
+                    if condition is not None:
+                        condition.arm(tick, *self._getIdleView(agent_obj, condition))
+                        self._idle[agent_id] = condition
+
+            if agent_obj._at_last_action_duration_tick(curr_tick=tick):
+                action_buffer[agent_id] = agent_obj._get_duration_action()
+
+        message_buffer:Dict[str,List] = {}
+        for mssg in gw.message_manager.preprocessed_messages.get(tick, []):
+            message_buffer.setdefault(mssg.to_id, []).append(mssg)
+
+        for agent_id, (action_class_name, action_kwargs) in action_buffer.items():
+            gw._GridWorld__perform_action(agent_id, action_class_name,
+                                          {} if action_kwargs is None else action_kwargs, world_state)
+            gw._GridWorld__update_grid()
+
+        for receiver_id, messages in message_buffer.items():
+            if receiver_id in agents:
+                agents[receiver_id].set_messages_func(messages)
+            if receiver_id in self._idle:
+                self._idle[receiver_id].messageArrived()
+        if self._pool is not None:
+            self._pool.flush()
+
+        # Only objects that override update need the complete state
+        updating = [obj for obj in gw.environment_objects.values() if type(obj).update is not EnvObject.update]
+        if len(updating) > 0:
+            compl_state = gw._GridWorld__get_complete_state()
+            for env_obj in updating:
+                env_obj.update(gw, compl_state)
+
+        gw._GridWorld__current_nr_ticks += 1
+        return False
+
+    def _isSkipped(self, agent_id:str, agent_obj:AgentBody)->bool:
+        '''
+        @return true if the agent is idle and no wake condition holds.
+        An idle agent that is not busy has no action to perform either.
+        '''
+        if agent_id not in self._idle or agent_obj._check_agent_busy(curr_tick=self._gridworld.current_nr_ticks):
+            return False
+        condition = self._idle[agent_id]
+        if not condition.isWoken(self._gridworld.current_nr_ticks, *self._getIdleView(agent_obj, condition)):
+            return True
+        del self._idle[agent_id]
+        return False
+
+    def _getRequest(self, agent_obj:AgentBody)->tuple:
+        '''
+        @return the request for the BrainPool: (agent id, busy, ids of
+        the perceived objects, world info, agent properties)
+        '''
+        busy = agent_obj._check_agent_busy(curr_tick=self._gridworld.current_nr_ticks)
+        return (agent_obj.obj_id, busy, list(self._getPerceivedObjects(agent_obj).keys()),
+                self._getWorldInfo(agent_obj), None if busy else agent_obj.properties)
+
+    def _getIdleView(self, agent_obj:AgentBody, condition:IdleCondition)->Tuple[tuple,FrozenSet[str]]:
+        '''
+        @return (door states, ids of the blocks in view) of the agent in
+        the current tick, as far as the condition waits for them
+        '''
+        door_states = self._getDoorStates() if condition.waitsForDoors() else None
+        blocks_in_view = None
+        if condition.waitsForBlocks():
+            capabilities = agent_obj.sense_capability.get_capabilities()
+            sense_range = capabilities.get(CollectableBlock, capabilities.get(None, float('inf')))
+            x, y = agent_obj.location
+            blocks_in_view = frozenset(obj_id for obj_id, (bx, by) in self._getBlockLocations()
+                                       if (bx - x) * (bx - x) + (by - y) * (by - y) <= sense_range * sense_range)
+        return door_states, blocks_in_view
+
+    def _getDoorStates(self)->tuple:
+        '''
+        @return whether each door is open in the current tick
+        '''
+        gw = self._gridworld
+        if self._door_states[0] != gw.current_nr_ticks:
+            objects = gw.environment_objects
+            if self._door_ids is None:
+                self._door_ids = [obj_id for obj_id, obj in objects.items() if isinstance(obj, Door)]
+            self._door_states = (gw.current_nr_ticks, tuple(objects[door_id].is_open for door_id in self._door_ids))
+        return self._door_states[1]
+
+    def _getBlockLocations(self)->list:
+        '''
+        @return (id, location) of each collectable block in the current tick
+        '''
+        gw = self._gridworld
+        if self._block_locations[0] != gw.current_nr_ticks:
+            self._block_locations = (gw.current_nr_ticks, [(obj_id, obj.location)
+                for obj_id, obj in gw.environment_objects.items() if isinstance(obj, CollectableBlock)])
+        return self._block_locations[1]
+
+    def _getObjectsInRange(self, agent_loc, object_type, sense_range)->OrderedDict:
+        '''
+        Same as GridWorld.get_objects_in_range, but only computes the
+        distance for objects of the right type and with a finite range.
+        '''
+        gw = self._gridworld
+        objs = OrderedDict()
+        any_type = object_type is None or object_type == "*"
+        finite = sense_range != float('inf')
+        range2 = sense_range * sense_range
+        for objects in (gw.environment_objects, gw._GridWorld__registered_agents):
+            for obj_id, obj in objects.items():
+                if not any_type:
+                    key = (type(obj), object_type)
+                    if key not in self._is_type:
+                        self._is_type[key] = isinstance(obj, object_type)
+                    if not self._is_type[key]:
+                        continue
+                if finite:
+                    loc = obj.location
+                    dx, dy = loc[0] - agent_loc[0], loc[1] - agent_loc[1]
+                    if dx * dx + dy * dy > range2:
+                        continue
+                objs[obj_id] = obj
+        return objs
+
+    def _getAgentState(self, agent_obj:AgentBody, properties:Dict[str,dict])->State:
+        '''
+        Same as GridWorld.__get_agent_state, using the given properties
+        of the environment objects.
+        '''
+        objs_in_range = self._getPerceivedObjects(agent_obj)
+        state_dict = {obj_id: properties[obj_id] if obj_id in properties else obj.properties
+                      for obj_id, obj in objs_in_range.items()}
+        # state_update without the linear search for the agent itself
+        state = State(agent_obj.obj_id)
+        state._State__state_dict = state_dict
+        state._State__me = state_dict[agent_obj.obj_id]
+        state._add_world_info(self._getWorldInfo(agent_obj))
+        return state
+
+    def _getPerceivedObjects(self, agent_obj:AgentBody)->OrderedDict:
+        '''
+        Same as the first part of GridWorld.__get_agent_state.
+        @return the objects the agent perceives, by id
+        '''
+        agent_loc = agent_obj.location
+        sense_capabilities = agent_obj.sense_capability.get_capabilities()
+        wildcard_objs = {}
+        objs_in_range = OrderedDict()
+        if "*" in sense_capabilities:
+            wildcard_objs = self._getObjectsInRange(agent_loc, "*", sense_capabilities.pop("*"))
+        for obj_type, sense_range in sense_capabilities.items():
+            objs_in_range.update(self._getObjectsInRange(agent_loc, obj_type, sense_range))
+        for obj_id, obj in wildcard_objs.items():
+            if type(obj) not in sense_capabilities:
+                objs_in_range[obj_id] = obj
+        return objs_in_range
+
+    def _getOwnState(self, agent_obj:AgentBody)->State:
+        '''
+        @return the State of an array agent: only the agent itself and
+        the world info.
+        '''
+        properties = agent_obj.properties
+        state = State(agent_obj.obj_id)
+        state._State__state_dict = {agent_obj.obj_id: properties}
+        state._State__me = properties
+        state._add_world_info(self._getWorldInfo(agent_obj))
+        return state
+
+    def _getWorldInfo(self, agent_obj:AgentBody)->dict:
+        '''
+        @return the 'World' entry of the state of the agent
+        '''
+        gw = self._gridworld
+        agents = gw._GridWorld__registered_agents
+        return {
+            "nr_ticks": gw.current_nr_ticks,
+            "curr_tick_timestamp": int(round(time.time() * 1000)),
+            "grid_shape": gw.shape,
+            "tick_duration": gw.tick_duration,
+            "team_members": [agent_id for agent_id, other in agents.items() if agent_obj.team == other.team],
+            "world_ID": gw.world_id,
+            "vis_settings": {
+                "vis_bg_clr": gw._GridWorld__visualization_bg_clr,
+                "vis_bg_img": gw._GridWorld__visualization_bg_img
+            }
+        }
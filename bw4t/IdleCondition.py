@@ -0,0 +1,62 @@
+from typing import FrozenSet, Tuple
+
+
+class IdleCondition:
+    '''
+    What an idle agent waits for, see BW4TBrain.idleUntil. The
+    FastForwardRunner arms it with the world as the agent last saw it,
+    and asks the agent for actions again once isWoken holds.
+    '''
+    def __init__(self, timeout:int=None, messages:bool=True, doors:bool=True, blocks:bool=True):
+        '''
+        @param timeout the number of ticks after which the agent wakes
+        anyway, None for no timeout
+        @param messages wake when a message arrives for the agent
+        @param doors wake when a door opens or closes
+        @param blocks wake when a block comes into view that was not in view
+        '''
+        self._timeout = timeout
+        self._messages = messages
+        self._doors = doors
+        self._blocks = blocks
+        self._tick:int = None
+        self._door_states:Tuple[bool,...] = None
+        self._blocks_in_view:FrozenSet[str] = None
+        self._woken = False
+
+    def waitsForDoors(self)->bool:
+        return self._doors
+
+    def waitsForBlocks(self)->bool:
+        return self._blocks
+
+    def arm(self, tick:int, door_states:Tuple[bool,...], blocks_in_view:FrozenSet[str]):
+        '''
+        Called by the runner in the tick the agent went idle.
+        @param tick the tick
+        @param door_states whether each door is open, None if not waiting for doors
+        @param blocks_in_view the ids of the blocks the agent perceives,
+        None if not waiting for blocks
+        '''
+        self._tick = tick
+        self._door_states = door_states
+        self._blocks_in_view = blocks_in_view
+
+    def messageArrived(self):
+        '''
+        Called by the runner when a message for the agent is delivered.
+        '''
+        if self._messages:
+            self._woken = True
+
+    def isWoken(self, tick:int, door_states:Tuple[bool,...], blocks_in_view:FrozenSet[str])->bool:
+        '''
+        @param tick the current tick
+        @param door_states whether each door is open, None if not waiting for doors
+        @param blocks_in_view the ids of the blocks the agent perceives,
+        None if not waiting for blocks
+        @return true if the agent has to decide again
+        '''
+        return self._woken or (self._timeout is not None and tick >= self._tick + self._timeout) \
+            or (self._doors and door_states != self._door_states) \
+            or (self._blocks and not blocks_in_view <= self._blocks_in_view)
@@ -0,0 +1,268 @@
+from typing import Dict, List, Tuple
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# A room is ((x, y) of its top left corner, (width, height), [(x, y) of each door])
+Room = Tuple[Tuple[int,int], Tuple[int,int], List[Tuple[int,int]]]
+
+
+class Layout:
+    '''
+    Where the rooms, their doors and the drop zones of a world are, and
+    the size of the world that holds them. A Layout is made by the
+    LayoutGenerator and is saved as a compressed .npz file of a few
+    small integer arrays.
+    '''
+    def __init__(self, world_size:Tuple[int,int], rooms:List[Room], drop_zones:List[Tuple[int,int]]):
+        '''
+        @param world_size (width, height) of the world, including the bounds
+        @param rooms the rooms, see Room. Doors are in the bottom wall.
+        @param drop_zones (x, y) of the bottom tile of each drop zone
+        '''
+        self._world_size = world_size
+        self._rooms = rooms
+        self._drop_zones = drop_zones
+
+    def getWorldSize(self)->Tuple[int,int]:
+        '''
+        @return (width, height) of the world
+        '''
+        return self._world_size
+
+    def getRooms(self)->List[Room]:
+        '''
+        @return the rooms, by room nr. See Room.
+        '''
+        return self._rooms
+
+    def getDropZoneLoc(self, nr_zone:int)->Tuple[int,int]:
+        '''
+        @return (x, y) of the bottom tile of the given drop zone
+        '''
+        return self._drop_zones[nr_zone]
+
+    def save(self, filename:str, key:str=''):
+        '''
+        Writes the layout to the given file. The file is replaced at once,
+        so processes that load it at the same time never see half of it.
+        @param key the key of the settings the layout was made for
+        '''
+        rooms = np.array([(x, y, width, height) for (x, y), (width, height), _ in self._rooms],
+                         dtype=np.int32).reshape(-1, 4)
+        doors = np.array([(room_nr, x, y) for room_nr, (_, _, door_locs) in enumerate(self._rooms)
+                          for x, y in door_locs], dtype=np.int32).reshape(-1, 3)
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, key=np.array(key), size=np.array(self._world_size, dtype=np.int32),
+                                rooms=rooms, doors=doors,
+                                zones=np.array(self._drop_zones, dtype=np.int32).reshape(-1, 2))
+        os.replace(tmp_name, filename)
+
+    @classmethod
+    def load(cls, filename:str, key:str=None)->'Layout':
+        '''
+        @param key if not None, the key the layout must have been saved with
+        @return the layout in the given file, or None if it was saved
+        with another key.
+        '''
+        with np.load(filename) as data:
+            if key is not None and str(data['key']) != key:
+                return None
+            doors:Dict[int,List[Tuple[int,int]]] = {}
+            for room_nr, x, y in data['doors'].tolist():
+                doors.setdefault(room_nr, []).append((x, y))
+            rooms = [((x, y), (width, height), doors.get(room_nr, []))
+                     for room_nr, (x, y, width, height) in enumerate(data['rooms'].tolist())]
+            return cls(tuple(data['size'].tolist()), rooms, [tuple(loc) for loc in data['zones'].tolist()])
+
+
+class LayoutGenerator:
+    '''
+    Makes the Layout for the worldsettings. The 'layout' setting picks
+    the topology:
+    * 'grid': the original BW4T layout, rows of 'rooms_per_row' rooms
+      of 'room_size' with a door in the center of their bottom wall,
+      and hallways of 'hallway_space' between the rows.
+    * 'generated': rows of rooms of random sizes within
+      'room_size_range', each with 1 to 'max_doors_per_room' doors in
+      its bottom wall. Rooms of a row are some tiles apart or right
+      next to each other, wall against wall, and the hallway below
+      each row has a random height of at least 'hallway_space'. The layout only depends on 'layout_seed',
+      not on the random_seed of the world.
+    The drop zones are in rows below the rooms in both, and the world
+    size follows from where the rooms and zones are.
+    Layouts are kept by their settings, and with 'layout_dir' also
+    saved to and loaded from files in that directory, so that runs in
+    other processes do not have to make them again.
+    '''
+    # The layouts made so far, by key. See getKey.
+    _layouts:Dict[str,Layout] = {}
+
+    # The worldsettings that determine the layout
+    SETTINGS:Tuple[str,...] = ('layout', 'layout_seed', 'room_size', 'room_size_range', 'max_doors_per_room',
+        'nr_rooms', 'rooms_per_row', 'hallway_space', 'nr_drop_zones', 'drop_zones_per_row', 'nr_blocks_needed')
+
+    # The defaults of the settings that older worldsettings may not have
+    DEFAULTS:Dict[str,object] = {'layout': 'grid', 'layout_seed': 1, 'room_size_range': ((5, 4), (8, 6)),
+        'max_doors_per_room': 2, 'drop_zones_per_row': 0}
+
+    def __init__(self, worldsettings:dict):
+        '''
+        @param worldsettings the settings of the world, see DEFAULT_WORLDSETTINGS
+        '''
+        self._worldsettings = worldsettings
+
+    def _getSetting(self, key:str):
+        return self._worldsettings.get(key, self.DEFAULTS.get(key))
+
+    @classmethod
+    def getKey(cls, worldsettings:dict)->str:
+        '''
+        @return the key of the layout of the given settings. Tuples and
+        lists give the same key, so settings read from json match.
+        '''
+        generator = cls(worldsettings)
+        return json.dumps([generator._getSetting(key) for key in cls.SETTINGS])
+
+    @classmethod
+    def get(cls, worldsettings:dict)->Layout:
+        '''
+        @return the layout for the given settings. It is made only if it
+        was not made before in this process or saved in 'layout_dir'.
+        '''
+        key = cls.getKey(worldsettings)
+        layout = cls._layouts.get(key)
+        if layout is not None:
+            return layout
+        directory = worldsettings.get('layout_dir')
+        filename = None
+        if directory is not None:
+            filename = os.path.join(directory, f"layout_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.npz")
+            if os.path.exists(filename):
+                layout = Layout.load(filename, key)
+        if layout is None:
+            layout = cls(worldsettings).generate()
+            if filename is not None:
+                os.makedirs(directory, exist_ok=True)
+                layout.save(filename, key)
+        cls._layouts[key] = layout
+        return layout
+
+    def generate(self)->Layout:
+        '''
+        @return a new layout for the settings
+        '''
+        topology = self._getSetting('layout')
+        if topology == 'grid':
+            return self._generateGrid()
+        if topology == 'generated':
+            return self._generateRooms()
+        raise ValueError(f"Unknown layout {topology}, use 'grid' or 'generated'")
+
+    def _generateGrid(self)->Layout:
+        '''
+        @return the original BW4T grid layout
+        '''
+        ws = self._worldsettings
+        width, height = ws['room_size']
+        hallway_space = ws['hallway_space']
+        nr_room_rows = int(np.ceil(ws['nr_rooms'] / ws['rooms_per_row']))
+        zones_per_row, nr_zone_rows = self._getDropZoneRows()
+
+        rooms = []
+        for room_nr in range(ws['nr_rooms']):
+            row = room_nr // ws['rooms_per_row']
+            column = room_nr % ws['rooms_per_row']
+            # x is: +1 for the edge, +edge hallway, +room width * column nr, +1 off by one
+            room_x = 1 + hallway_space + width * column
+            # y is: +1 for the edge, +hallway space * (nr row + 1 for the top hallway), +row * room height, +1 off by one
+            room_y = 1 + hallway_space * (row + 1) + row * height + 1
+            # door location is always center bottom
+            door = (room_x + int(np.ceil(width / 2)), room_y + height - 1)
+            rooms.append(((room_x, room_y), (width, height), [door]))
+
+        # calculate the total width
+        world_width = max(ws['rooms_per_row'] * width + 2 * hallway_space,
+                          (zones_per_row + 1) * hallway_space + zones_per_row) + 2
+        # calculate the total height, each extra row of drop zones has a hallway above it
+        world_height = nr_room_rows * height + (nr_room_rows + 1) * hallway_space + ws['nr_blocks_needed'] + 2 \
+            + (nr_zone_rows - 1) * (ws['nr_blocks_needed'] + hallway_space)
+        world_size = (world_width, world_height)
+        return Layout(world_size, rooms, self._getDropZoneLocs(world_size))
+
+    def _generateRooms(self)->Layout:
+        '''
+        @return a layout with rooms of random sizes and doors, see the
+        class doc.
+        '''
+        ws = self._worldsettings
+        (min_width, min_height), (max_width, max_height) = self._getSetting('room_size_range')
+        # agents search a room from its door: the tile left of it and the two above it must be inside
+        if min_width < 4 or min_height < 4:
+            raise ValueError(f"Rooms need a width and height of at least 4, room_size_range is "
+                             f"{self._getSetting('room_size_range')}")
+        hallway_space = ws['hallway_space']
+        max_doors = max(1, self._getSetting('max_doors_per_room'))
+        rng = np.random.default_rng(self._getSetting('layout_seed'))
+
+        rooms = []
+        right = 0
+        # the top hallway is as high as hallway_space, agents start there
+        y = 1 + hallway_space
+        for first in range(0, ws['nr_rooms'], ws['rooms_per_row']):
+            x = 1 + hallway_space + int(rng.integers(0, hallway_space + 1))
+            row_height = 0
+            for _ in range(first, min(first + ws['rooms_per_row'], ws['nr_rooms'])):
+                width = int(rng.integers(min_width, max_width + 1))
+                height = int(rng.integers(min_height, max_height + 1))
+                # doors are in the bottom wall, with an inner tile at their left
+                door_xs = np.arange(x + 2, x + width - 1)
+                nr_doors = int(rng.integers(1, min(max_doors, len(door_xs)) + 1))
+                door_xs = sorted(rng.choice(door_xs, size=nr_doors, replace=False).tolist())
+                rooms.append(((x, y), (width, height), [(door_x, y + height - 1) for door_x in door_xs]))
+                right = max(right, x + width)
+                row_height = max(row_height, height)
+                # 0 puts the wall of the next room against that of this one, otherwise there is a corridor between them
+                x += width + int(rng.integers(0, hallway_space + 1))
+            y += row_height + int(rng.integers(hallway_space, hallway_space + 2))
+
+        zones_per_row, nr_zone_rows = self._getDropZoneRows()
+        world_width = max(right + hallway_space, (zones_per_row + 1) * hallway_space + zones_per_row + 1) + 1
+        # y is below the hallway under the last row, where the drop zones start
+        world_height = y + nr_zone_rows * (ws['nr_blocks_needed'] + hallway_space) - hallway_space + 1
+        world_size = (world_width, world_height)
+        return Layout(world_size, rooms, self._getDropZoneLocs(world_size))
+
+    def _getDropZoneRows(self)->Tuple[int,int]:
+        '''
+        @return (zones per row, nr of rows) of the drop zones
+        '''
+        nr_zones = self._worldsettings['nr_drop_zones']
+        zones_per_row = self._getSetting('drop_zones_per_row')
+        zones_per_row = nr_zones if zones_per_row <= 0 else min(zones_per_row, nr_zones)
+        return zones_per_row, int(np.ceil(nr_zones / zones_per_row))
+
+    def _getDropZoneLocs(self, world_size:Tuple[int,int])->List[Tuple[int,int]]:
+        '''
+        @return (x, y) of the bottom tile of each drop zone. The zones
+        are centered in rows at the bottom of the world, the first row
+        is the top one.
+        '''
+        ws = self._worldsettings
+        zones_per_row, nr_zone_rows = self._getDropZoneRows()
+        locs = []
+        for nr_zone in range(ws['nr_drop_zones']):
+            row = nr_zone // zones_per_row
+            x = int(np.ceil(world_size[0] / 2)) - \
+                (int(np.floor(zones_per_row / 2)) * (ws['hallway_space'] + 1))
+            # Change the x to the next zone
+            x = x + (nr_zone % zones_per_row) * (ws['hallway_space'] + 1)
+            y = world_size[1] - 1 - 1  # once for off by one, another for world bound
+            # Change the y to the row of the zone
+            y = y - (nr_zone_rows - 1 - row) * (ws['nr_blocks_needed'] + ws['hallway_space'])
+            locs.append((x, y))
+        return locs
@@ -0,0 +1,93 @@
+from typing import Dict, List, Hashable
+from collections import deque
+from matrx.messages import Message
+
+
+class MessageInbox:
+    '''
+    The received messages of an agent, indexed by sender and by content.
+    It can be used as the list of received messages it replaces
+    (iterate, len, index, append), and adds constant time lookups:
+    * getFrom(sender): the messages of one sender
+    * hasContent(content): whether a message with that content was received
+    * getNew(reader): the messages received since that reader's previous call
+    With max_messages set only the most recent max_messages messages are
+    kept, so memory and lookup cost stay flat during long episodes.
+    '''
+    def __init__(self, max_messages:int=None):
+        '''
+        @param max_messages the number of messages to retain, or None
+        to keep all messages.
+        '''
+        self._max_messages = max_messages
+        self._messages:deque = deque()
+        self._by_sender:Dict[str,deque] = {}
+        self._content_counts:Dict[Hashable,int] = {}
+        # sequence number of the next message, and for each reader the
+        # sequence number of the first message it has not seen yet.
+        self._next_seq = 0
+        self._cursors:Dict[str,int] = {}
+
+    @staticmethod
+    def _key(content)->Hashable:
+        '''
+        @return a hashable key for message content (eg dict contents are not hashable)
+        '''
+        try:
+            hash(content)
+            return content
+        except TypeError:
+            return repr(content)
+
+    def append(self, message:Message):
+        '''
+        Adds a message, evicting the oldest one if max_messages is exceeded.
+        '''
+        self._messages.append(message)
+        self._by_sender.setdefault(message.from_id, deque()).append(message)
+        key = self._key(message.content)
+        self._content_counts[key] = self._content_counts.get(key, 0) + 1
+        self._next_seq += 1
+        if self._max_messages is not None and len(self._messages) > self._max_messages:
+            self._evict()
+
+    def _evict(self):
+        oldest = self._messages.popleft()
+        # the oldest message overall is also the oldest of its sender
+        self._by_sender[oldest.from_id].popleft()
+        key = self._key(oldest.content)
+        self._content_counts[key] -= 1
+        if self._content_counts[key] == 0:
+            del self._content_counts[key]
+
+    def getFrom(self, sender_id:str)->List[Message]:
+        '''
+        @return the retained messages from the given sender, oldest first
+        '''
+        return list(self._by_sender.get(sender_id, ()))
+
+    def hasContent(self, content)->bool:
+        '''
+        @return true if a retained message has the given content
+        '''
+        return self._key(content) in self._content_counts
+
+    def getNew(self, reader:str='default')->List[Message]:
+        '''
+        @param reader name of the reader, each reader has its own cursor.
+        @return the retained messages that were received since the previous
+        call of getNew with this reader, oldest first.
+        '''
+        first_seq = self._cursors.get(reader, 0)
+        self._cursors[reader] = self._next_seq
+        nr_new = min(self._next_seq - first_seq, len(self._messages))
+        return [self._messages[i] for i in range(len(self._messages) - nr_new, len(self._messages))]
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
@@ -0,0 +1,232 @@
+from typing import Dict, FrozenSet, List, Tuple
+import heapq
+from collections import OrderedDict
+import warnings
+import numpy as np
+from matrx.actions import MoveNorth, MoveEast, MoveSouth, MoveWest
+from matrx.actions.move_actions import MoveNorthEast, MoveSouthEast, MoveSouthWest, MoveNorthWest
+from bw4t.StateIndex import StateIndex
+
+# The move actions with their (dx, dy), in the order used to break ties
+MOVES:Dict[str,Tuple[int,int]] = {
+    MoveNorth.__name__: (0, -1),
+    MoveEast.__name__: (1, 0),
+    MoveSouth.__name__: (0, 1),
+    MoveWest.__name__: (-1, 0),
+    MoveNorthEast.__name__: (1, -1),
+    MoveSouthEast.__name__: (1, 1),
+    MoveSouthWest.__name__: (-1, 1),
+    MoveNorthWest.__name__: (-1, -1),
+}
+
+
+class PathCache:
+    '''
+    Shortest paths over the static BW4T layout, shared by all agents of
+    a world. Walls never change, so only door states can change paths.
+    For every target the cache keeps a distance field: the length of
+    the shortest path from every tile to the target, with euclidean
+    step costs like the matrx A* planner. With the field a path from
+    any tile is found by walking downhill, in O(1) per step.
+    Fields are kept by the set of closed doors they were computed for,
+    which every caller passes with its own view of the doors, so agents
+    that see the doors differently never overwrite each other's fields.
+    The fields of the MAX_DOOR_STATES door states used last are kept.
+    Fields for the key points (doors, the tiles in front of them, drop
+    zones and spawn tiles) are computed when the cache is made, for the
+    door state it is made with, others on first use.
+    '''
+    # The number of door states whose fields are kept
+    MAX_DOOR_STATES:int = 8
+
+    def __init__(self, shape:Tuple[int,int], walls:List[Tuple[int,int]],
+                 doors:Dict[str,Tuple[int,int]], closed_doors:List[str],
+                 key_points:List[Tuple[int,int]]):
+        '''
+        @param shape (width, height) of the world
+        @param walls locations that are never traversable
+        @param doors dict with as key the door id and as value its location
+        @param closed_doors the ids of the doors that are closed at the
+        start, the door state the key points are precomputed for
+        @param key_points locations to precompute the fields for
+        '''
+        self._walls = np.zeros(shape, dtype=bool)
+        for loc in walls:
+            self._walls[loc] = True
+        self._doors = doors
+        self._closed = frozenset(closed_doors)
+        self._key_points = list(key_points)
+        # by door state: (the blocked tiles, the fields by target), the last used last
+        self._door_states:Dict[FrozenSet[str],Tuple[np.ndarray,Dict[Tuple[int,int],np.ndarray]]] = OrderedDict()
+        for loc in self._key_points:
+            self._getField(loc, self._closed)
+
+    def _getDoorState(self, closed_doors:FrozenSet[str]):
+        '''
+        @return (blocked tiles, fields by target) for the given closed doors
+        '''
+        state = self._door_states.get(closed_doors)
+        if state is None:
+            blocked = self._walls.copy()
+            for door_id in closed_doors:
+                blocked[self._doors[door_id]] = True
+            state = (blocked, {})
+            self._door_states[closed_doors] = state
+            if len(self._door_states) > self.MAX_DOOR_STATES:
+                self._door_states.popitem(last=False)
+        else:
+            self._door_states.move_to_end(closed_doors)
+        return state
+
+    def copy(self)->'PathCache':
+        '''
+        @return a new cache for the same layout, that starts with the
+        fields computed so far. Fields are never changed in place, so
+        they are shared and not copied.
+        '''
+        other = PathCache.__new__(PathCache)
+        other._walls = self._walls
+        other._doors = self._doors
+        other._closed = self._closed
+        other._key_points = list(self._key_points)
+        other._door_states = OrderedDict((closed, (blocked, dict(fields)))
+                                         for closed, (blocked, fields) in self._door_states.items())
+        return other
+
+    def addKeyPoints(self, key_points:List[Tuple[int,int]]):
+        '''
+        Precomputes the fields for more locations, for the door state the
+        cache was made with.
+        '''
+        for loc in key_points:
+            loc = tuple(loc)
+            if loc not in self._key_points:
+                self._key_points.append(loc)
+            self._getField(loc, self._closed)
+
+    def getKeyPoints(self)->List[Tuple[int,int]]:
+        '''
+        @return the locations the fields were precomputed for
+        '''
+        return self._key_points
+
+    def _getField(self, target:Tuple[int,int], closed_doors:FrozenSet[str])->np.ndarray:
+        '''
+        @return the distance field to the target with the given doors
+        closed, computed with Dijkstra from the target if it is not cached.
+        '''
+        blocked, fields = self._getDoorState(closed_doors)
+        if target in fields:
+            return fields[target]
+        width, height = blocked.shape
+        dist = np.full(blocked.shape, np.inf)
+        dist[target] = 0.
+        heap = [(0., target)]
+        while heap:
+            d, (x, y) = heapq.heappop(heap)
+            if d > dist[x, y]:
+                continue
+            for dx, dy in MOVES.values():
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height and not blocked[nx, ny]:
+                    nd = d + (1. if dx == 0 or dy == 0 else np.sqrt(2))
+                    if nd < dist[nx, ny]:
+                        dist[nx, ny] = nd
+                        heapq.heappush(heap, (nd, (nx, ny)))
+        fields[target] = dist
+        return dist
+
+    def _getClosed(self, closed_doors)->FrozenSet[str]:
+        return self._closed if closed_doors is None else frozenset(closed_doors)
+
+    def getDistance(self, start:Tuple[int,int], target:Tuple[int,int], closed_doors:FrozenSet[str]=None)->float:
+        '''
+        @param closed_doors the ids of the closed doors, None for the
+        door state the cache was made with
+        @return length of the shortest path, np.inf if there is none
+        '''
+        return float(self._getField(tuple(target), self._getClosed(closed_doors))[tuple(start)])
+
+    def getNextMove(self, start:Tuple[int,int], target:Tuple[int,int], closed_doors:FrozenSet[str]=None)->str:
+        '''
+        @param closed_doors the ids of the closed doors, None for the
+        door state the cache was made with
+        @return name of the move action on a shortest path from start to
+        target, or None if start is the target or no path exists.
+        '''
+        start, target = tuple(start), tuple(target)
+        dist = self._getField(target, self._getClosed(closed_doors))
+        if start == target or dist[start] == np.inf:
+            return None
+        width, height = dist.shape
+        best_move, best_d = None, np.inf
+        for move, (dx, dy) in MOVES.items():
+            nx, ny = start[0] + dx, start[1] + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                d = dist[nx, ny] + (1. if dx == 0 or dy == 0 else np.sqrt(2))
+                # strictly smaller, so ties go to the first move in MOVES
+                if d < best_d - 1e-9:
+                    best_move, best_d = move, d
+        return best_move
+
+    def getPath(self, start:Tuple[int,int], target:Tuple[int,int],
+                closed_doors:FrozenSet[str]=None)->List[Tuple[int,int]]:
+        '''
+        @param closed_doors the ids of the closed doors, None for the
+        door state the cache was made with
+        @return the locations on a shortest path after start up to and
+        including target, empty if start is the target or no path exists.
+        '''
+        path:List[Tuple[int,int]] = []
+        loc = tuple(start)
+        move = self.getNextMove(loc, target, closed_doors)
+        while move is not None:
+            loc = (loc[0] + MOVES[move][0], loc[1] + MOVES[move][1])
+            path.append(loc)
+            move = self.getNextMove(loc, target, closed_doors)
+        return path
+
+
+class CachedNavigator:
+    '''
+    Drop-in for the matrx Navigator as used by the BW4T agents, that
+    follows waypoints using the shared PathCache instead of running A*
+    on the agent's state every tick.
+    '''
+    def __init__(self, agent_id:str, path_cache:PathCache):
+        self._agent_id = agent_id
+        self._path_cache = path_cache
+        self.reset_full()
+
+    def reset_full(self):
+        '''
+        Clears all waypoints.
+        '''
+        self._waypoints:List[Tuple[int,int]] = []
+        self._current = 0
+
+    def add_waypoint(self, waypoint:Tuple[int,int]):
+        self._waypoints.append(tuple(waypoint))
+
+    def add_waypoints(self, waypoints:List[Tuple[int,int]]):
+        for waypoint in waypoints:
+            self.add_waypoint(waypoint)
+
+    def get_move_action(self, index:StateIndex)->str:
+        '''
+        @param index the StateIndex of the agent's current state
+        @return the next move action towards the current waypoint,
+        or None when all waypoints are visited or the current
+        waypoint can not be reached.
+        '''
+        closed_doors = frozenset(door['obj_id'] for door in index.getClosedDoors())
+        loc = tuple(index.getAgent(self._agent_id)['location'])
+        while self._current < len(self._waypoints) and self._waypoints[self._current] == loc:
+            self._current += 1
+        if self._current >= len(self._waypoints):
+            return None
+        move = self._path_cache.getNextMove(loc, self._waypoints[self._current], closed_doors)
+        if move is None:
+            warnings.warn(f"The agent {self._agent_id} at {loc} cannot find a path to the waypoint at "
+                          f"{self._waypoints[self._current]}, likely because it is blocked.", RuntimeWarning)
+        return move
@@ -0,0 +1,250 @@
+from typing import Dict, Final, List, Tuple
+import numpy as np
+from matrx.grid_world import GridWorld
+from matrx.objects import Door
+from bw4t.BW4TBlocks import CollectableBlock, GhostBlock
+
+# The planes of the buffer, all (width, height) int8:
+# * wall: 1 for a wall, else 0
+# * door: 1 for a closed door, 2 for an open door, else 0
+# * block_shape, block_colour: shape and colour code of the first
+#   collectable block at a tile, -1 for none
+# * goal_shape, goal_colour: the same for the goal blocks
+# * agent: the number of the first agent at a tile, -1 for none
+PLANES:Final[List[str]]=['wall', 'door', 'block_shape', 'block_colour', 'goal_shape', 'goal_colour', 'agent']
+
+# The sense range that applies to each plane, by the key of the range in the worldsettings
+PLANE_RANGES:Final[Dict[str,str]]={'wall': 'other_sense_range', 'door': 'other_sense_range',
+    'block_shape': 'block_sense_range', 'block_colour': 'block_sense_range',
+    'goal_shape': 'other_sense_range', 'goal_colour': 'other_sense_range', 'agent': 'agent_sense_range'}
+
+
+class ObservationBuffer:
+    '''
+    The world encoded in fixed-layout numpy arrays, for agents that do
+    not need a State. The buffer is updated in place once per tick,
+    before the agents decide, and shared by all agents: an Observation
+    gives an agent views on it, masked by its sense ranges, so nothing
+    is copied per agent. Views are only valid during the tick.
+    Colours are given as codes, the index in getColours.
+    '''
+    def __init__(self, gridworld:GridWorld, colours:List[str], sense_ranges:Dict[str,float]):
+        '''
+        @param gridworld the world, with all its objects added
+        @param colours the block colours, giving the colour codes. Other
+        colours get the next codes.
+        @param sense_ranges the sense range of the agents by worldsettings
+        key, see PLANE_RANGES.
+        '''
+        self._shape:Tuple[int,int] = tuple(gridworld.shape)
+        self._colours = list(colours)
+        self._ranges = {plane: sense_ranges[key] for plane, key in PLANE_RANGES.items()}
+        self._planes = np.zeros((len(PLANES),) + self._shape, dtype=np.int8)
+        self._agent_ids:List[str] = list(gridworld.registered_agents.keys())
+        self._agent_locs = np.zeros((len(self._agent_ids), 2), dtype=int)
+        # shape and colour code of the block each agent carries, -1 for none
+        self._carried = np.full((len(self._agent_ids), 2), -1, dtype=np.int8)
+        # the masks of the tiles out of range, by range
+        self._masks:Dict[float,np.ndarray] = {}
+
+        objects = gridworld.environment_objects.values()
+        doors = [obj for obj in objects if isinstance(obj, Door)]
+        self._door_ids:List[str] = [door.obj_id for door in doors]
+        self._door_rooms:List[str] = [door.custom_properties.get('room_name') for door in doors]
+        self._door_locs = np.array([door.location for door in doors], dtype=int).reshape(-1, 2)
+        self._static = self._planes.copy()
+        self._static[self.getPlaneNr('block_shape'):] = -1
+        for obj in objects:
+            if not isinstance(obj, Door) and not obj.is_traversable and not obj.is_movable:
+                self._static[(self.getPlaneNr('wall'),) + tuple(obj.location)] = 1
+            elif isinstance(obj, GhostBlock):
+                self._setBlock(self._static, 'goal', obj, obj.location)
+
+    @staticmethod
+    def getPlaneNr(name:str)->int:
+        '''
+        @return the index of a plane in getPlanes
+        '''
+        return PLANES.index(name)
+
+    def getPlanes(self)->np.ndarray:
+        '''
+        @return (planes, width, height) the whole buffer, see PLANES
+        '''
+        return self._planes
+
+    def getColours(self)->List[str]:
+        '''
+        @return the colours, by colour code
+        '''
+        return self._colours
+
+    def getAgentIds(self)->List[str]:
+        '''
+        @return the agent ids, by agent number
+        '''
+        return self._agent_ids
+
+    def getAgentLocations(self)->np.ndarray:
+        '''
+        @return (agents, 2) the location of each agent
+        '''
+        return self._agent_locs
+
+    def getCarried(self)->np.ndarray:
+        '''
+        @return (agents, 2) the shape and colour code of the block each agent carries, -1 for none
+        '''
+        return self._carried
+
+    def getDoorIds(self)->List[str]:
+        return self._door_ids
+
+    def getDoorRoomNames(self)->List[str]:
+        '''
+        @return the room name of each door, in the order of getDoorIds
+        '''
+        return self._door_rooms
+
+    def getDoorLocations(self)->np.ndarray:
+        '''
+        @return (doors, 2) the location of each door, in the order of getDoorIds
+        '''
+        return self._door_locs
+
+    def getRange(self, plane:str)->float:
+        '''
+        @return the sense range of the agents for a plane
+        '''
+        return self._ranges[plane]
+
+    def getObservation(self, agent_id:str)->'Observation':
+        '''
+        @return the observation of an agent in the current tick
+        '''
+        return Observation(self, self._agent_ids.index(agent_id))
+
+    def update(self, gridworld:GridWorld):
+        '''
+        Encodes the current state of the world. Called once per tick by
+        the FastForwardRunner, before the agents decide.
+        '''
+        planes = self._planes
+        planes[...] = self._static
+        objects = gridworld.environment_objects
+        door = self.getPlaneNr('door')
+        for door_id, (x, y) in zip(self._door_ids, self._door_locs):
+            planes[door, x, y] = 2 if objects[door_id].is_open else 1
+        for obj in objects.values():
+            if isinstance(obj, CollectableBlock):
+                self._setBlock(planes, 'block', obj, obj.location)
+        agent = self.getPlaneNr('agent')
+        self._carried[...] = -1
+        for nr, body in enumerate(gridworld.registered_agents.values()):
+            x, y = body.location
+            self._agent_locs[nr] = (x, y)
+            if planes[agent, x, y] < 0:
+                planes[agent, x, y] = nr
+            if len(body.is_carrying) > 0:
+                self._carried[nr] = (body.is_carrying[0].visualize_shape,
+                                     self._getColourCode(body.is_carrying[0].visualize_colour))
+
+    def _setBlock(self, planes:np.ndarray, kind:str, block, location):
+        '''
+        Sets the shape and colour of a block in the planes of its kind,
+        unless an earlier block is at the same location.
+        '''
+        shape, colour = self.getPlaneNr(kind + '_shape'), self.getPlaneNr(kind + '_colour')
+        x, y = location
+        if planes[shape, x, y] < 0:
+            planes[shape, x, y] = block.visualize_shape
+            planes[colour, x, y] = self._getColourCode(block.visualize_colour)
+
+    def _getColourCode(self, colour:str)->int:
+        if colour not in self._colours:
+            self._colours.append(colour)
+        return self._colours.index(colour)
+
+    def getMask(self, sense_range:float)->np.ndarray:
+        '''
+        @return (2r+1, 2r+1) bool array, true for the tiles further than
+        sense_range from the center.
+        '''
+        if sense_range not in self._masks:
+            radius = int(np.floor(sense_range))
+            dx, dy = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1), indexing='ij')
+            self._masks[sense_range] = dx * dx + dy * dy > sense_range * sense_range
+        return self._masks[sense_range]
+
+
+class Observation:
+    '''
+    What an agent perceives of the ObservationBuffer in a tick. Planes
+    with an infinite sense range are given whole, others as the window
+    around the agent with the tiles out of range masked. Both are views
+    on the buffer, so they must not be changed and are only valid
+    during the tick.
+    '''
+    def __init__(self, buffer:ObservationBuffer, agent_nr:int):
+        self._buffer = buffer
+        self._agent_nr = agent_nr
+
+    def getBuffer(self)->ObservationBuffer:
+        '''
+        @return the buffer, for the agent and door ids and the colours
+        '''
+        return self._buffer
+
+    def getLocation(self)->Tuple[int,int]:
+        '''
+        @return the location of the agent
+        '''
+        x, y = self._buffer.getAgentLocations()[self._agent_nr]
+        return int(x), int(y)
+
+    def getCarried(self)->Tuple[int,int]:
+        '''
+        @return (shape, colour code) of the block the agent carries, (-1, -1) for none
+        '''
+        shape, colour = self._buffer.getCarried()[self._agent_nr]
+        return int(shape), int(colour)
+
+    def getPlane(self, name:str)->Tuple[np.ma.MaskedArray,Tuple[int,int]]:
+        '''
+        @param name the name of a plane, see PLANES
+        @return (plane, origin): the view of the plane the agent
+        perceives, and the world location of its element [0, 0].
+        '''
+        plane = self._buffer.getPlanes()[self._buffer.getPlaneNr(name)]
+        sense_range = self._buffer.getRange(name)
+        if sense_range == np.inf:
+            return np.ma.MaskedArray(plane, copy=False), (0, 0)
+        mask = self._buffer.getMask(sense_range)
+        radius = mask.shape[0] // 2
+        x, y = self.getLocation()
+        x0, y0 = max(0, x - radius), max(0, y - radius)
+        x1, y1 = min(plane.shape[0], x + radius + 1), min(plane.shape[1], y + radius + 1)
+        window_mask = mask[x0 - x + radius:x1 - x + radius, y0 - y + radius:y1 - y + radius]
+        return np.ma.MaskedArray(plane[x0:x1, y0:y1], mask=window_mask, copy=False), (x0, y0)
+
+    def getClosedDoors(self)->List[int]:
+        '''
+        @return the door numbers (see ObservationBuffer.getDoorIds) of the
+        closed doors the agent perceives
+        '''
+        plane, (x0, y0) = self.getPlane('door')
+        locs = self._buffer.getDoorLocations() - (x0, y0)
+        inside = np.all((locs >= 0) & (locs < plane.shape), axis=1)
+        closed = np.zeros(len(locs), dtype=bool)
+        closed[inside] = plane[locs[inside, 0], locs[inside, 1]].filled(0) == 1
+        return [int(nr) for nr in np.flatnonzero(closed)]
+
+    def getAgents(self)->Dict[int,Tuple[int,int]]:
+        '''
+        @return the location of each agent the agent perceives, by agent
+        number, including the agent itself
+        '''
+        locs = self._buffer.getAgentLocations()
+        sense_range = self._buffer.getRange('agent')
+        distances = ((locs - locs[self._agent_nr]) ** 2).sum(axis=1)
+        return {nr: (int(x), int(y)) for nr, (x, y) in enumerate(locs) if distances[nr] <= sense_range ** 2}
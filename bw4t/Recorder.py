@@ -0,0 +1,175 @@
+from typing import List
+import copy
+import functools
+import pickle
+import zlib
+from matrx.logger.logger import GridWorldLogger
+from matrx.grid_world import GridWorld
+from matrx.objects import AreaTile, Wall
+
+
+class Recorder(GridWorldLogger):
+    '''
+    Records a run so that it can be replayed without the agent brains,
+    see Replay. The recording holds the python random state, the
+    worldsettings and the agent list the world was built with, the
+    action each agent decided on and the messages it sent in each tick,
+    and every snapshot_interval ticks a snapshot of the world state.
+    The file is a sequence of pickles: first the settings, then every
+    tick what was recorded in it, appended as the run goes. So a run
+    that crashes or is killed still leaves a recording up to its last
+    tick. See load.
+    '''
+    def __init__(self, save_path="", file_name_prefix="recording", file_extension=".pkl",
+                 worldsettings:dict=None, agents:List[dict]=None, random_state:tuple=None,
+                 snapshot_interval:int=100):
+        '''
+        @param worldsettings the worldsettings the world was built with
+        @param agents the agent list the world was built with
+        @param random_state the python random state before the world was built
+        @param snapshot_interval the number of ticks between snapshots
+        '''
+        super().__init__(save_path=save_path, file_name=file_name_prefix, file_extension=file_extension,
+                         log_strategy=1)
+        self._snapshot_interval = snapshot_interval
+        self._header = {'worldsettings': worldsettings, 'agents': agents, 'random_state': random_state,
+                        'snapshot_interval': snapshot_interval}
+        # what was recorded since the last write, see _newChunk
+        self._chunk = self._newChunk()
+        self._started = False
+
+    @staticmethod
+    def _newChunk()->dict:
+        # actions by agent id and tick: (action name, kwargs, changed agent properties),
+        # messages by tick and agent id: list of (to_id, content), snapshots by tick and
+        # the tick that was logged last, None until a tick is logged
+        return {'actions': {}, 'messages': {}, 'snapshots': {}, 'nr_ticks': None}
+
+    def _grid_world_log(self, grid_world, agent_data, last_tick=False, goal_status=None):
+        tick = grid_world.current_nr_ticks
+        if not self._started:
+            self._started = True
+            with open(self.getFileName(), 'wb') as f:
+                pickle.dump(self._header, f)
+            for agent_id, body in grid_world.registered_agents.items():
+                body.get_action_func = functools.partial(self._recordAction, grid_world, agent_id,
+                                                         body.get_action_func)
+                body.get_messages_func = functools.partial(self._recordMessages, grid_world, agent_id,
+                                                           body.get_messages_func)
+        if tick % self._snapshot_interval == 0:
+            self._chunk['snapshots'][tick] = Recorder.takeSnapshot(grid_world)
+        self._chunk['nr_ticks'] = tick
+        self.flush()
+
+    def _recordAction(self, grid_world:GridWorld, recorded_id:str, get_action, *args, **kwargs):
+        '''
+        Replaces the get_action_func of the agent bodies (bound to the
+        first three arguments), to also record the decided action and
+        the agent properties the brain changed. The world passes agent_id
+        as keyword, hence recorded_id.
+        '''
+        properties = dict(kwargs['agent_properties'])
+        result = get_action(*args, **kwargs)
+        _, agent_properties, action_name, action_kwargs = result
+        changed = {key: value for key, value in agent_properties.items()
+                   if key not in properties or properties[key] != value}
+        self._chunk['actions'].setdefault(recorded_id, {})[grid_world.current_nr_ticks] = \
+            (action_name, copy.deepcopy(action_kwargs), copy.deepcopy(changed))
+        return result
+
+    def _recordMessages(self, grid_world:GridWorld, agent_id:str, get_messages, *args, **kwargs):
+        '''
+        Replaces the get_messages_func of the agent bodies (bound to the
+        first three arguments), to also record the sent messages.
+        '''
+        messages = get_messages(*args, **kwargs)
+        if len(messages) > 0:
+            self._chunk['messages'].setdefault(grid_world.current_nr_ticks, {})[agent_id] = \
+                [(mssg.to_id, copy.deepcopy(mssg.content)) for mssg in messages]
+        return messages
+
+    def flush(self):
+        '''
+        Appends what was recorded since the last write to the file, if a
+        tick was logged since. The actions of a tick that did not end are
+        left out.
+        '''
+        if self._started and self._chunk['nr_ticks'] is not None:
+            with open(self.getFileName(), 'ab') as f:
+                pickle.dump(self._chunk, f)
+            self._chunk = self._newChunk()
+
+    @staticmethod
+    def load(filename:str)->dict:
+        '''
+        @param filename a file written by a Recorder
+        @return the recording: the 'worldsettings', 'agents', 'random_state'
+        and 'snapshot_interval' of the world, the recorded 'actions' by
+        agent id and tick, 'messages' by tick and agent id, 'snapshots'
+        by tick, and 'nr_ticks', the last recorded tick. A last tick that
+        was cut off while it was written is left out.
+        '''
+        with open(filename, 'rb') as f:
+            recording = pickle.load(f)
+            recording.update({'actions': {}, 'messages': {}, 'snapshots': {}, 'nr_ticks': 0})
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                for agent_id, actions in chunk['actions'].items():
+                    recording['actions'].setdefault(agent_id, {}).update(actions)
+                recording['messages'].update(chunk['messages'])
+                recording['snapshots'].update(chunk['snapshots'])
+                recording['nr_ticks'] = chunk['nr_ticks']
+        return recording
+
+    # workaround for issue matrx267
+    def getFileName(self):
+        '''
+        @return the filename written by this recorder
+        '''
+        return self._GridWorldLogger__file_name
+
+    @staticmethod
+    def takeSnapshot(grid_world:GridWorld)->bytes:
+        '''
+        @return the state of the world at the start of the current tick:
+        the agent bodies, the objects that can change (walls and area
+        tiles never do), the goal and the messages of the coming ticks.
+        Callbacks to agent brains and instrumented methods are left out.
+        '''
+        tick = grid_world.current_nr_ticks
+        objects = grid_world.environment_objects
+        state = {
+            'tick': tick,
+            'order': list(objects.keys()),
+            'objects': {obj_id: obj for obj_id, obj in objects.items() if not isinstance(obj, (Wall, AreaTile))},
+            'bodies': {agent_id: {key: value for key, value in body.__dict__.items() if not callable(value)}
+                       for agent_id, body in grid_world.registered_agents.items()},
+            'goal': {key: value for key, value in grid_world.simulation_goal.__dict__.items() if not callable(value)},
+            'messages': {t: messages for t, messages in grid_world.message_manager.preprocessed_messages.items()
+                         if t >= tick},
+        }
+        return zlib.compress(pickle.dumps(state))
+
+    @staticmethod
+    def restoreSnapshot(grid_world:GridWorld, snapshot:bytes):
+        '''
+        Puts a world back in the state of a snapshot. The world must have
+        been built with the same settings as the snapshotted world.
+        @param grid_world the world
+        @param snapshot a snapshot from takeSnapshot
+        '''
+        state = pickle.loads(zlib.decompress(snapshot))
+        objects = grid_world._GridWorld__environment_objects
+        restored = {obj_id: state['objects'][obj_id] if obj_id in state['objects'] else objects[obj_id]
+                    for obj_id in state['order']}
+        objects.clear()
+        objects.update(restored)
+        for agent_id, body_state in state['bodies'].items():
+            grid_world.registered_agents[agent_id].__dict__.update(body_state)
+        grid_world.simulation_goal.__dict__.update(state['goal'])
+        grid_world.message_manager.preprocessed_messages = state['messages']
+        grid_world._GridWorld__current_nr_ticks = state['tick']
+        grid_world._GridWorld__update_grid()
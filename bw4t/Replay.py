@@ -0,0 +1,131 @@
+import random
+import tempfile
+from matrx.agents import HumanAgentBrain
+from matrx.grid_world import GridWorld
+from matrx.messages import Message
+from bw4t.BW4TWorld import BW4TWorld
+from bw4t.FastForward import FastForwardRunner
+from bw4t.Recorder import Recorder
+
+
+class ReplayBrain(HumanAgentBrain):
+    '''
+    Plays back the recorded actions and messages of an agent, instead
+    of deciding. It is a HumanAgentBrain so that it can stand in for
+    both agents and humans.
+    '''
+    def __init__(self, recording:dict):
+        '''
+        @param recording the recording, see Recorder
+        '''
+        super().__init__()
+        self._recording = recording
+        self._tick = None
+
+    def _fetch_state(self, state):
+        # nothing to filter, the recorded brain already did
+        return state
+
+    def _get_action(self, state, agent_properties, agent_id, user_input=None):
+        self._tick = state['World']['nr_ticks']
+        action_name, action_kwargs, changed = \
+            self._recording['actions'].get(agent_id, {}).get(self._tick, (None, {}, {}))
+        agent_properties.update(changed)
+        return state, agent_properties, action_name, action_kwargs
+
+    def _get_messages(self, all_agent_ids):
+        # called right after _get_action, in the same tick
+        return [Message(content, from_id=self.agent_id, to_id=to_id) for to_id, content
+                in self._recording['messages'].get(self._tick, {}).get(self.agent_id, [])]
+
+
+class ReplayWorld(BW4TWorld):
+    '''
+    The world of a recording, with ReplayBrains instead of the recorded brains.
+    '''
+    def __init__(self, recording:dict, log_dir:str):
+        self._recording = recording
+        random.setstate(recording['random_state'])
+        worldsettings = dict(recording['worldsettings'], fast_forward=True, record=False, profile=False,
+                             log_events=False, log_trust=False, parallel_agents=0)
+        super().__init__(recording['agents'], worldsettings, log_dir=log_dir)
+
+    def _createBrain(self, agent:dict):
+        return ReplayBrain(self._recording)
+
+
+class Replayer:
+    '''
+    Replays a recording made with the 'record' worldsettings, without
+    the agent brains: it rebuilds the world and plays back the recorded
+    actions and messages. seek jumps to a tick by restoring the last
+    snapshot before it and replaying from there, so reproducing tick
+    2400 takes at most snapshot_interval ticks of replay. The world
+    does not log.
+    '''
+    def __init__(self, filename:str):
+        '''
+        @param filename a recording written by Recorder
+        '''
+        self._recording = Recorder.load(filename)
+        with tempfile.TemporaryDirectory() as log_dir:
+            self._world = ReplayWorld(self._recording, log_dir)
+        gridworld = self.getGridWorld()
+        gridworld._GridWorld__loggers.clear()
+        gridworld.initialize(self._world._builder.api_info)
+        self._runner = FastForwardRunner(gridworld)
+
+    def getGridWorld(self)->GridWorld:
+        '''
+        @return the replayed world, in its state at the current tick
+        '''
+        return self._world._gridworld
+
+    def getTick(self)->int:
+        '''
+        @return the current tick
+        '''
+        return self.getGridWorld().current_nr_ticks
+
+    def getRecording(self)->dict:
+        '''
+        @return the recording, see Recorder
+        '''
+        return self._recording
+
+    def getNrTicks(self)->int:
+        '''
+        @return the tick at which the recorded world ended
+        '''
+        return self._recording['nr_ticks']
+
+    def step(self)->bool:
+        '''
+        Replays one tick.
+        @return true if the world is done
+        '''
+        return self._runner.step()
+
+    def seek(self, tick:int):
+        '''
+        Brings the world in its state at the start of the given tick.
+        @param tick the tick, at most getNrTicks()
+        '''
+        if tick > self.getNrTicks():
+            raise ValueError(f"The recording ends at tick {self.getNrTicks()}, can not seek to {tick}")
+        snapshot_tick = max(t for t in self._recording['snapshots'].keys() if t <= tick)
+        if not snapshot_tick <= self.getTick() <= tick:
+            Recorder.restoreSnapshot(self.getGridWorld(), self._recording['snapshots'][snapshot_tick])
+        while self.getTick() < tick:
+            self.step()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        raise ValueError("usage: python -m bw4t.Replay <recording> <tick>")
+    replayer = Replayer(sys.argv[1])
+    replayer.seek(int(sys.argv[2]))
+    for agent_id, body in replayer.getGridWorld().registered_agents.items():
+        print(f"{agent_id}: at {body.location}, carrying {[obj.obj_id for obj in body.is_carrying]}, "
+              f"action {replayer.getRecording()['actions'][agent_id].get(replayer.getTick())}")
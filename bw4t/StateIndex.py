@@ -0,0 +1,131 @@
+from typing import Dict, List, Tuple
+from matrx.agents.agent_utils.state import State
+
+
+class StateIndex:
+    '''
+    A typed index over the objects in an agent's State, built with a
+    single pass over the state. It gives constant time lookups for the
+    objects BW4T agents search for: doors by open/closed, collectable
+    blocks by location and by (shape, colour), goal blocks by rank,
+    agents by id and the area tiles of rooms by room name.
+    All lists keep the order in which the objects occur in the state,
+    so picking the first element gives the same object as a linear
+    scan over state.values() would.
+    The values are the object property dicts from the state, they
+    must not be modified.
+    '''
+    def __init__(self, state:State):
+        '''
+        @param state the (filtered) state of an agent
+        '''
+        self._open_doors:Dict[str,dict] = {}
+        self._closed_doors:Dict[str,dict] = {}
+        self._collectables:List[dict] = []
+        self._collectables_at:Dict[Tuple[int,int],List[dict]] = {}
+        self._collectables_of:Dict[Tuple[object,str],List[dict]] = {}
+        self._goal_blocks:List[dict] = []
+        self._agents:Dict[str,dict] = {}
+        self._room_tiles:Dict[str,List[dict]] = {}
+
+        # as_dict avoids the property search State does for every key
+        for obj_id, obj in state.as_dict().items():
+            if obj_id == 'World':
+                continue
+            if 'class_inheritance' in obj and 'Door' in obj['class_inheritance']:
+                doors = self._open_doors if obj['is_open'] else self._closed_doors
+                doors[obj_id] = obj
+            elif obj.get('is_collectable', False):
+                self._collectables.append(obj)
+                self._collectables_at.setdefault(tuple(obj['location']), []).append(obj)
+                self._collectables_of.setdefault(self.kind(obj), []).append(obj)
+            elif obj.get('is_goal_block', False):
+                self._goal_blocks.append(obj)
+            elif obj.get('isAgent', False):
+                self._agents[obj_id] = obj
+            elif 'room_name' in obj and 'AreaTile' in obj.get('class_inheritance', []):
+                self._room_tiles.setdefault(obj['room_name'], []).append(obj)
+
+        # Rank 0 is the bottom goal block of a zone, like in CollectionGoal
+        self._goal_ranks:Dict[int,List[dict]] = {}
+        for block in sorted(self._goal_blocks, key=lambda b: -b['location'][1]):
+            self._goal_ranks.setdefault(block['drop_zone_nr'], []).append(block)
+
+    @staticmethod
+    def kind(obj:dict)->Tuple[object,str]:
+        '''
+        @return the (shape, colour) of a block
+        '''
+        return obj['visualization']['shape'], obj['visualization']['colour']
+
+    def getOpenDoors(self)->List[dict]:
+        '''
+        @return all open doors
+        '''
+        return list(self._open_doors.values())
+
+    def getClosedDoors(self)->List[dict]:
+        '''
+        @return all closed doors
+        '''
+        return list(self._closed_doors.values())
+
+    def getCollectables(self, shape=None, colour:str=None)->List[dict]:
+        '''
+        @param shape the shape, or None for all collectable blocks
+        @param colour the colour, used only if shape is not None
+        @return the collectable blocks with the given shape and colour
+        '''
+        if shape is None:
+            return self._collectables
+        return self._collectables_of.get((shape, colour), [])
+
+    def getCollectablesLike(self, obj:dict)->List[dict]:
+        '''
+        @return the collectable blocks with the same shape and colour as obj
+        '''
+        return self._collectables_of.get(self.kind(obj), [])
+
+    def getCollectablesAt(self, location)->List[dict]:
+        '''
+        @return the collectable blocks at the given location
+        '''
+        return self._collectables_at.get(tuple(location), [])
+
+    def getGoalBlocks(self)->List[dict]:
+        '''
+        @return all goal blocks, in state order
+        '''
+        return self._goal_blocks
+
+    def getGoalBlocksInOrder(self)->List[dict]:
+        '''
+        @return all goal blocks, zone by zone, each zone in the order in
+        which its blocks have to be delivered
+        '''
+        return [block for _, blocks in sorted(self._goal_ranks.items()) for block in blocks]
+
+    def getGoalBlock(self, rank:int, zone_nr:int=0)->dict:
+        '''
+        @return the goal block with the given rank in the given drop zone,
+        rank 0 is the block that has to be delivered first.
+        '''
+        return self._goal_ranks[zone_nr][rank]
+
+    def getAgent(self, agent_id:str)->dict:
+        '''
+        @return the agent with the given id, or None if it is not seen
+        '''
+        return self._agents.get(agent_id)
+
+    def getRoomTiles(self, room_name:str)->List[dict]:
+        '''
+        @return the area tiles inside the given room
+        '''
+        return self._room_tiles.get(room_name, [])
+
+    def getAgents(self)->Dict[str,dict]:
+        '''
+        @return dict with all seen agents by their id
+        '''
+        return self._agents
@@ -0,0 +1,84 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List
+from matrx.messages import Message
+
+
+class TrustRule(ABC):
+    '''
+    A rule that updates the trust in a team member for one received
+    message. Implement update to create a new rule.
+    '''
+    @abstractmethod
+    def update(self, trust:float, content, memory:dict)->float:
+        '''
+        @param trust the current trust in the sender of the message
+        @param content the content of the new message
+        @param memory dict that is kept for the sender between calls.
+        The rule can store whatever it needs to remember here.
+        @return the new trust in the sender
+        '''
+        pass
+
+
+class FoundWithoutColourRule(TrustRule):
+    '''
+    The baseline rule: a member loses trust once, on its first message
+    that claims to have found something without mentioning its colour.
+    '''
+    def __init__(self, penalty:float=0.1):
+        self._penalty = penalty
+
+    def update(self, trust:float, content, memory:dict)->float:
+        if not memory.get('penalized', False) and 'Found' in content and 'colour' not in content:
+            memory['penalized'] = True
+            return trust - self._penalty
+        return trust
+
+
+class TrustModel:
+    '''
+    Keeps trust beliefs in team members across ticks. The beliefs are
+    only updated with newly arrived messages, through a pluggable
+    TrustRule, so the cost per tick does not grow with the history.
+    '''
+    def __init__(self, rule:TrustRule=None, default:float=0.5):
+        '''
+        @param rule the rule for updating trust, default FoundWithoutColourRule
+        @param default the initial trust in a member
+        '''
+        self._rule = rule if rule is not None else FoundWithoutColourRule()
+        self._default = default
+        self._trust:Dict[str,float] = {}
+        self._memory:Dict[str,dict] = {}
+
+    def addMember(self, member:str):
+        '''
+        Starts tracking trust in the given member, if not done yet.
+        '''
+        if member not in self._trust:
+            self._trust[member] = self._default
+            self._memory[member] = {}
+
+    def update(self, messages:List[Message])->Dict[str,float]:
+        '''
+        @param messages the newly received messages. Messages from
+        senders that are not a member are ignored.
+        @return the current trust table
+        '''
+        for mssg in messages:
+            if mssg.from_id in self._trust:
+                self._trust[mssg.from_id] = self._rule.update(self._trust[mssg.from_id],
+                    mssg.content, self._memory[mssg.from_id])
+        return self._trust
+
+    def getTrust(self, member:str)->float:
+        '''
+        @return the trust in the member, the default if it is unknown
+        '''
+        return self._trust.get(member, self._default)
+
+    def getTrustTable(self)->Dict[str,float]:
+        '''
+        @return a copy of the trust in all members
+        '''
+        return dict(self._trust)
@@ -0,0 +1,622 @@
+from typing import Dict, Final, Iterable, Iterator, List, Tuple
+import argparse
+import functools
+import random
+import tempfile
+import time
+import numpy as np
+from matrx.actions import OpenDoorAction, CloseDoorAction
+from matrx.grid_world import GridWorld, GrabObject, DropObject
+from matrx.objects import Door
+from bw4t.BW4TBlocks import CollectableBlock, GhostBlock
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.FastForward import FastForwardRunner
+from bw4t.Navigation import MOVES, PathCache
+
+# The action codes of a VectorWorld. The moves are 1 to 8, in the order of MOVES.
+IDLE:Final[int]=0
+OPEN_DOOR:Final[int]=9
+CLOSE_DOOR:Final[int]=10
+GRAB:Final[int]=11
+DROP:Final[int]=12
+
+# The action code of each matrx action name, None (no action) is IDLE
+ACTION_CODES:Final[Dict[str,int]]={None: IDLE, **{move: nr + 1 for nr, move in enumerate(MOVES)},
+    OpenDoorAction.__name__: OPEN_DOOR, CloseDoorAction.__name__: CLOSE_DOOR,
+    GrabObject.__name__: GRAB, DropObject.__name__: DROP}
+
+# (dx, dy) of each action code up to the moves
+_DELTAS:Final[np.ndarray]=np.array([(0, 0)] + list(MOVES.values()), dtype=int)
+
+# The settings BW4TBrain gives every action
+GRAB_RANGE:Final[int]=1
+MAX_OBJECTS:Final[int]=1
+
+
+class VectorWorld:
+    '''
+    N independent BW4T worlds of the same layout, kept in numpy arrays
+    and stepped in lockstep, for running many episodes with light
+    scripted agents (see VectorBaseLinePolicy). The layout (walls and
+    doors) is shared; each world has its own door states, its blocks (location, shape, colour, carrier), agent locations,
+    goal blocks and tick. The initial state is read from matrx worlds,
+    so a VectorWorld built with fromSeeds starts like the BW4TWorlds of
+    those seeds.
+    A step follows the rules of a GridWorld with BW4TBrain agents:
+    * an agent decides when it is not busy, and the action is done
+      action_duration (slowdown) ticks later, or right away for no action
+    * the actions are done in the order of the agents, each on the state
+      the previous ones left
+    * moves fail out of bounds and on walls and closed doors; agents and
+      blocks do not block
+    * doors can be opened and closed from any distance, but not closed
+      when an agent or block is in the door opening
+    * an agent can grab a block within GRAB_RANGE when it carries less
+      than MAX_OBJECTS, and drops it at its location
+    * the goal is checked at the start of each tick like CollectionGoal,
+      and the world is done when the goal blocks are delivered in order
+      or the deadline is reached.
+    validate checks this against matrx worlds on shared seeds.
+    '''
+    def __init__(self, gridworlds:Iterable[GridWorld], durations:List[int]=None):
+        '''
+        @param gridworlds the matrx worlds to start from, all with the
+        same layout and agents. They are only read, and may be dropped
+        afterwards.
+        @param durations the action duration (slowdown) of each agent,
+        default 1 for all agents.
+        '''
+        worlds = [self._readWorld(gridworld, nr) for nr, gridworld in enumerate(gridworlds)]
+        nr_worlds = len(worlds)
+        nr_agents = len(self._agent_ids)
+        self._durations = np.array(durations if durations is not None else [1] * nr_agents, dtype=int)
+
+        nr_blocks = max(len(world['block_ids']) for world in worlds)
+        self._block_ids:List[List[str]] = [world['block_ids'] for world in worlds]
+        self._block_present = np.zeros((nr_worlds, nr_blocks), dtype=bool)
+        self._block_locs = np.zeros((nr_worlds, nr_blocks, 2), dtype=int)
+        self._block_shapes = np.zeros((nr_worlds, nr_blocks), dtype=np.int8)
+        self._block_colours = np.zeros((nr_worlds, nr_blocks), dtype=np.int8)
+        for nr, world in enumerate(worlds):
+            size = len(world['block_ids'])
+            self._block_present[nr, :size] = True
+            self._block_locs[nr, :size] = world['block_locs']
+            self._block_shapes[nr, :size] = world['block_shapes']
+            self._block_colours[nr, :size] = world['block_colours']
+        self._block_carrier = np.full((nr_worlds, nr_blocks), -1, dtype=int)
+        # the order of the blocks in the objects of the world; matrx adds a dropped block at the end
+        self._block_order = np.tile(np.arange(nr_blocks), (nr_worlds, 1))
+        self._next_order = np.full(nr_worlds, nr_blocks, dtype=int)
+
+        self._doors_open = np.array([world['doors_open'] for world in worlds], dtype=bool).reshape(nr_worlds, -1)
+        self._agent_locs = np.array([world['agent_locs'] for world in worlds], dtype=int).reshape(nr_worlds, nr_agents, 2)
+        self._carrying = np.full((nr_worlds, nr_agents), -1, dtype=int)
+        self._goal_shapes = np.array([world['goal_shapes'] for world in worlds], dtype=np.int8)
+        self._goal_colours = np.array([world['goal_colours'] for world in worlds], dtype=np.int8)
+        # the tick the right block was delivered at each rank, -1 for none
+        self._goal_ticks = np.full(self._goal_shapes.shape, -1, dtype=int)
+
+        self._action = np.zeros((nr_worlds, nr_agents), dtype=int)
+        self._target = np.full((nr_worlds, nr_agents), -1, dtype=int)
+        self._busy_until = np.full((nr_worlds, nr_agents), -1000000, dtype=int)
+        self._tick = np.zeros(nr_worlds, dtype=int)
+        self._done = np.zeros(nr_worlds, dtype=bool)
+        self._checkGoal()
+
+    def _readWorld(self, gridworld:GridWorld, nr:int)->dict:
+        '''
+        Reads the layout from the first world, and checks that the
+        others have the same.
+        @return the state of a single world as lists
+        '''
+        objects = list(gridworld.environment_objects.values())
+        doors = [obj for obj in objects if isinstance(obj, Door)]
+        ghosts = [obj for obj in objects if isinstance(obj, GhostBlock)]
+        if nr == 0:
+            self._shape:Tuple[int,int] = tuple(gridworld.shape)
+            self._walls = np.zeros(self._shape, dtype=bool)
+            for obj in objects:
+                if not isinstance(obj, Door) and not obj.is_traversable and not obj.is_movable:
+                    self._walls[tuple(obj.location)] = True
+            self._door_ids:List[str] = [door.obj_id for door in doors]
+            self._door_locs = np.array([door.location for door in doors], dtype=int).reshape(-1, 2)
+            self._door_at = np.full(self._shape, -1, dtype=int)
+            self._door_at[self._door_locs[:, 0], self._door_locs[:, 1]] = np.arange(len(doors))
+            self._agent_ids:List[str] = list(gridworld.registered_agents.keys())
+            self._colours:List[str] = []
+            # the goal blocks by drop zone and rank, ranks go up from the bottom like in CollectionGoal
+            zones:Dict[int,list] = {}
+            for ghost in ghosts:
+                zones.setdefault(ghost.properties['drop_zone_nr'], []).append(ghost)
+            self._goal_locs = np.array([[ghost.location for ghost in sorted(zone, key=lambda g: -g.location[1])]
+                                        for _, zone in sorted(zones.items())], dtype=int)
+            self._deadline = gridworld.simulation_goal.max_nr_ticks
+        elif tuple(gridworld.shape) != self._shape or [door.obj_id for door in doors] != self._door_ids \
+                or list(gridworld.registered_agents.keys()) != self._agent_ids:
+            raise ValueError(f"World {nr} has another layout or other agents than the first world")
+
+        goal = {tuple(ghost.location): ghost for ghost in ghosts}
+        goal_blocks = [[goal[tuple(loc)] for loc in zone] for zone in self._goal_locs]
+        blocks = [obj for obj in objects if isinstance(obj, CollectableBlock)]
+        return {
+            'doors_open': [door.is_open for door in doors],
+            'agent_locs': [body.location for body in gridworld.registered_agents.values()],
+            'block_ids': [block.obj_id for block in blocks],
+            'block_locs': np.array([block.location for block in blocks], dtype=int).reshape(-1, 2),
+            'block_shapes': [block.visualize_shape for block in blocks],
+            'block_colours': [self._getColourCode(block.visualize_colour) for block in blocks],
+            'goal_shapes': [[ghost.visualize_shape for ghost in zone] for zone in goal_blocks],
+            'goal_colours': [[self._getColourCode(ghost.visualize_colour) for ghost in zone] for zone in goal_blocks],
+        }
+
+    def _getColourCode(self, colour:str)->int:
+        if colour not in self._colours:
+            self._colours.append(colour)
+        return self._colours.index(colour)
+
+    @classmethod
+    def fromSeeds(cls, agents:List[dict], worldsettings:dict, seeds:List[int])->'VectorWorld':
+        '''
+        @param agents the agents as given to BW4TWorld. Only their names
+        and slowdown are used, the brains are not.
+        @param worldsettings the worldsettings as given to BW4TWorld
+        @param seeds the random_seed of each world
+        @return a VectorWorld with the start state of the BW4TWorlds of
+        the given seeds.
+        '''
+        with tempfile.TemporaryDirectory() as log_dir:
+            return cls((world._gridworld for world in _buildWorlds(agents, worldsettings, seeds, log_dir)),
+                       [agent['settings'].get('slowdown', 1) for agent in agents])
+
+    def getNrWorlds(self)->int:
+        return len(self._tick)
+
+    def getShape(self)->Tuple[int,int]:
+        '''
+        @return (width, height) of the worlds
+        '''
+        return self._shape
+
+    def getWalls(self)->np.ndarray:
+        '''
+        @return (width, height) bool array, true where there is a wall
+        '''
+        return self._walls
+
+    def getAgentIds(self)->List[str]:
+        return self._agent_ids
+
+    def getDoorIds(self)->List[str]:
+        return self._door_ids
+
+    def getDoorLocations(self)->np.ndarray:
+        '''
+        @return (doors, 2) array with the location of each door
+        '''
+        return self._door_locs
+
+    def getBlockIds(self, world_nr:int)->List[str]:
+        '''
+        @return the ids of the blocks of a world in the matrx world it
+        was read from, by block index
+        '''
+        return self._block_ids[world_nr]
+
+    def getColours(self)->List[str]:
+        '''
+        @return the colours, by colour code
+        '''
+        return self._colours
+
+    def getTick(self)->np.ndarray:
+        '''
+        @return (N,) the current tick of each world
+        '''
+        return self._tick
+
+    def isDone(self)->np.ndarray:
+        '''
+        @return (N,) true for the worlds that are done
+        '''
+        return self._done
+
+    def getDeciding(self)->np.ndarray:
+        '''
+        @return (N, agents) true for the agents that decide on an action in the coming step
+        '''
+        return ~self._done[:, None] & (self._tick[:, None] > self._busy_until)
+
+    def getAgentLocations(self)->np.ndarray:
+        '''
+        @return (N, agents, 2) the location of each agent
+        '''
+        return self._agent_locs
+
+    def getCarrying(self)->np.ndarray:
+        '''
+        @return (N, agents) the index of the block each agent carries, -1 for none
+        '''
+        return self._carrying
+
+    def getOpenDoors(self)->np.ndarray:
+        '''
+        @return (N, doors) true for the doors that are open
+        '''
+        return self._doors_open
+
+    def getBlocks(self)->Dict[str,np.ndarray]:
+        '''
+        @return dict with (N, blocks) arrays 'present' (false for the
+        padding of worlds with less blocks), 'location' (N, blocks, 2),
+        which is that of the carrier for carried blocks, 'shape',
+        'colour' (colour codes, see getColours) and 'carrier' (the agent
+        index, -1 if not carried).
+        '''
+        carried = self._block_carrier >= 0
+        locs = self._block_locs.copy()
+        worlds, blocks = np.nonzero(carried)
+        locs[worlds, blocks] = self._agent_locs[worlds, self._block_carrier[worlds, blocks]]
+        return {'present': self._block_present, 'location': locs, 'shape': self._block_shapes,
+                'colour': self._block_colours, 'carrier': self._block_carrier}
+
+    def getGoal(self)->Dict[str,np.ndarray]:
+        '''
+        @return dict with 'location' (zones, ranks, 2), and the (N,
+        zones, ranks) arrays 'shape', 'colour' and 'tick' (the tick the
+        right block was delivered, -1 for none) of the goal blocks.
+        Rank 0 is the bottom one, that must be delivered first.
+        '''
+        return {'location': self._goal_locs, 'shape': self._goal_shapes, 'colour': self._goal_colours,
+                'tick': self._goal_ticks}
+
+    def getProgress(self)->np.ndarray:
+        '''
+        @return (N,) the fraction of the goal blocks that was delivered in order, as in CollectionGoal
+        '''
+        ticks = self._goal_ticks
+        delivered = ticks >= 0
+        nr_ranks = ticks.shape[-1]
+        progress = np.where(delivered[..., -1], nr_ranks, 0)
+        if nr_ranks > 1:
+            in_order = delivered[..., :-1] & delivered[..., 1:] & (ticks[..., :-1] < ticks[..., 1:])
+            first_wrong = np.argmin(in_order, axis=-1)
+            wrong_progress = first_wrong + np.take_along_axis(delivered, first_wrong[..., None], axis=-1)[..., 0]
+            progress = np.where(in_order.all(axis=-1), progress, wrong_progress)
+        return progress.sum(axis=-1) / ticks[0].size
+
+    def step(self, actions:np.ndarray, targets:np.ndarray=None):
+        '''
+        Runs one tick in all worlds that are not done.
+        @param actions (N, agents) action codes. Only those of the agents
+        that decide (see getDeciding) are used.
+        @param targets (N, agents) the door index for OPEN_DOOR and
+        CLOSE_DOOR, the block index for GRAB and for DROP, where -1
+        drops the carried block. Default all -1.
+        '''
+        actions = np.asarray(actions, dtype=int)
+        targets = np.full(actions.shape, -1, dtype=int) if targets is None else np.asarray(targets, dtype=int)
+        active = ~self._done
+        tick = self._tick[:, None]
+        deciding = self.getDeciding()
+        self._action = np.where(deciding, actions, self._action)
+        self._target = np.where(deciding, targets, self._target)
+        durations = np.where(actions == IDLE, 0, self._durations[None, :])
+        self._busy_until = np.where(deciding, tick + durations, self._busy_until)
+
+        performing = active[:, None] & (self._busy_until == tick)
+        for agent in range(len(self._agent_ids)):
+            worlds = np.flatnonzero(performing[:, agent])
+            if len(worlds) > 0:
+                self._perform(agent, worlds)
+        self._tick = np.where(active, self._tick + 1, self._tick)
+        self._checkGoal()
+
+    def run(self, policy:'VectorBaseLinePolicy')->np.ndarray:
+        '''
+        Steps all worlds until they are done.
+        @param policy the policy that decides for all agents
+        @return (N,) the tick at which each world was done
+        '''
+        while not self._done.all():
+            self.step(*policy.decide(self))
+        return self._tick
+
+    def _perform(self, agent:int, worlds:np.ndarray):
+        '''
+        Does the current action of an agent in the given worlds.
+        '''
+        actions = self._action[worlds, agent]
+        targets = self._target[worlds, agent]
+        moving = (actions >= 1) & (actions <= len(MOVES))
+        if moving.any():
+            self._move(agent, worlds[moving], actions[moving])
+        for code, perform in ((OPEN_DOOR, self._openDoors), (CLOSE_DOOR, self._closeDoors),
+                              (GRAB, self._grab), (DROP, self._drop)):
+            selected = actions == code
+            if selected.any():
+                perform(agent, worlds[selected], targets[selected])
+
+    def _isFree(self, worlds:np.ndarray, locs:np.ndarray)->np.ndarray:
+        '''
+        @param locs (len(worlds), 2) a location in each of the worlds
+        @return true where the location is in the world and has no wall or closed door
+        '''
+        x, y = locs[:, 0], locs[:, 1]
+        inside = (x >= 0) & (x < self._shape[0]) & (y >= 0) & (y < self._shape[1])
+        x, y = np.where(inside, x, 0), np.where(inside, y, 0)
+        doors = self._door_at[x, y]
+        is_open = self._doors_open[worlds, np.maximum(doors, 0)] if len(self._door_ids) > 0 else True
+        return inside & ~self._walls[x, y] & ((doors < 0) | is_open)
+
+    def _move(self, agent:int, worlds:np.ndarray, moves:np.ndarray):
+        locs = self._agent_locs[worlds, agent] + _DELTAS[moves]
+        possible = self._isFree(worlds, locs)
+        self._agent_locs[worlds[possible], agent] = locs[possible]
+
+    def _openDoors(self, agent:int, worlds:np.ndarray, doors:np.ndarray):
+        valid = (doors >= 0) & (doors < len(self._door_ids))
+        self._doors_open[worlds[valid], doors[valid]] = True
+
+    def _closeDoors(self, agent:int, worlds:np.ndarray, doors:np.ndarray):
+        valid = (doors >= 0) & (doors < len(self._door_ids))
+        worlds, doors = worlds[valid], doors[valid]
+        locs = self._door_locs[doors]
+        # an agent or block in the door opening blocks it
+        agents_in = (self._agent_locs[worlds] == locs[:, None, :]).all(axis=-1).any(axis=-1)
+        blocks_in = (self._block_present[worlds] & (self._block_carrier[worlds] < 0)
+                     & (self._block_locs[worlds] == locs[:, None, :]).all(axis=-1)).any(axis=-1)
+        free = ~agents_in & ~blocks_in
+        self._doors_open[worlds[free], doors[free]] = False
+
+    def _grab(self, agent:int, worlds:np.ndarray, blocks:np.ndarray):
+        valid = (blocks >= 0) & (blocks < self._block_present.shape[1])
+        worlds, blocks = worlds[valid], blocks[valid]
+        deltas = self._block_locs[worlds, blocks] - self._agent_locs[worlds, agent]
+        # an agent carries at most MAX_OBJECTS, which is 1
+        possible = self._block_present[worlds, blocks] & (self._block_carrier[worlds, blocks] < 0) \
+            & (self._carrying[worlds, agent] < 0) & ((deltas ** 2).sum(axis=1) <= GRAB_RANGE ** 2)
+        worlds, blocks = worlds[possible], blocks[possible]
+        self._block_carrier[worlds, blocks] = agent
+        self._carrying[worlds, agent] = blocks
+
+    def _drop(self, agent:int, worlds:np.ndarray, blocks:np.ndarray):
+        carried = self._carrying[worlds, agent]
+        possible = (carried >= 0) & ((blocks < 0) | (blocks == carried))
+        worlds, carried = worlds[possible], carried[possible]
+        # agents can not be in a closed door, so the block can always be dropped at the agent's location
+        self._block_locs[worlds, carried] = self._agent_locs[worlds, agent]
+        self._block_carrier[worlds, carried] = -1
+        self._block_order[worlds, carried] = self._next_order[worlds]
+        self._next_order[worlds] += 1
+        self._carrying[worlds, agent] = -1
+
+    def _checkGoal(self):
+        '''
+        Updates the goal ticks and done flags for the current tick, like
+        CollectionGoal: a rank gets the tick at which the first block
+        at its location is the right one, and loses it when there is no
+        block. A world is done when the ticks of each drop zone are
+        increasing, or at the deadline.
+        '''
+        nr_worlds = len(self._tick)
+        goal_locs = self._goal_locs.reshape(-1, 2)
+        lying = self._block_present & (self._block_carrier < 0)
+        # (N, goal blocks, blocks) the blocks at each goal location
+        at_goal = lying[:, None, :] & (self._block_locs[:, None, :, :] == goal_locs[None, :, None, :]).all(axis=-1)
+        has_block = at_goal.any(axis=-1)
+        first = np.argmin(np.where(at_goal, self._block_order[:, None, :], np.iinfo(int).max), axis=-1)
+        worlds = np.arange(nr_worlds)[:, None]
+        ticks = self._goal_ticks.reshape(nr_worlds, -1)
+        is_right = has_block & (self._block_shapes[worlds, first] == self._goal_shapes.reshape(nr_worlds, -1)) \
+            & (self._block_colours[worlds, first] == self._goal_colours.reshape(nr_worlds, -1))
+        ticks = np.where(is_right & (ticks < 0), self._tick[:, None], np.where(has_block, ticks, -1))
+        self._goal_ticks = ticks.reshape(self._goal_ticks.shape)
+
+        # like CollectionGoal, a zone is complete when each rank has a later tick than the one below
+        delivered = self._goal_ticks >= 0
+        in_order = delivered[..., :-1] & delivered[..., 1:] & (self._goal_ticks[..., :-1] < self._goal_ticks[..., 1:])
+        is_satisfied = in_order.all(axis=-1).all(axis=-1)
+        self._done = is_satisfied | (self._tick >= self._deadline)
+
+
+class VectorBaseLinePolicy:
+    '''
+    BaseLineAgent for all agents of a VectorWorld: pick a random closed
+    door, walk to the tile south of it, open it, and repeat until all
+    doors are open. Doors are picked with a numpy generator instead of
+    python random, so the runs are not those of BaseLineAgent, but the
+    agents act by the same rules.
+    '''
+    _PLAN:Final[int]=0
+    _FOLLOW:Final[int]=1
+
+    def __init__(self, world:VectorWorld, seed:int=None):
+        '''
+        @param world the world to decide for
+        @param seed the seed of the door choices
+        '''
+        self._rng = np.random.default_rng(seed)
+        self._phase = np.full(world.getCarrying().shape, self._PLAN, dtype=int)
+        self._door = np.full(world.getCarrying().shape, -1, dtype=int)
+        # The move from every tile to the tile south of each door, around all doors, so that the moves do not
+        # depend on which doors are open. With one door per room, as in the grid layout, a path through a room
+        # is never shorter, so these are the moves of BaseLineAgent. In generated layouts a room can have more
+        # doors, and BaseLineAgent may then take a shorter path through a room with open doors.
+        door_locs = world.getDoorLocations()
+        fronts = [(int(x), int(y) + 1) for x, y in door_locs]
+        walls = [tuple(loc) for loc in np.argwhere(world.getWalls())]
+        doors = {door_id: tuple(loc) for door_id, loc in zip(world.getDoorIds(), door_locs)}
+        path_cache = PathCache(world.getShape(), walls, doors, world.getDoorIds(), fronts)
+        width, height = world.getShape()
+        self._moves = np.zeros((len(fronts), width, height), dtype=np.int8)
+        for door, front in enumerate(fronts):
+            for x in range(width):
+                for y in range(height):
+                    self._moves[door, x, y] = ACTION_CODES[path_cache.getNextMove((x, y), front)]
+
+    def decide(self, world:VectorWorld)->Tuple[np.ndarray,np.ndarray]:
+        '''
+        @return (actions, targets) for VectorWorld.step
+        '''
+        deciding = world.getDeciding()
+        actions = np.full(deciding.shape, IDLE, dtype=int)
+        targets = np.full(deciding.shape, -1, dtype=int)
+        closed = ~world.getOpenDoors()
+        nr_closed = closed.sum(axis=1)
+
+        worlds, agents = np.nonzero(deciding & (self._phase == self._PLAN) & (nr_closed[:, None] > 0))
+        if len(worlds) > 0:
+            pick = (self._rng.random(len(worlds)) * nr_closed[worlds]).astype(int)
+            self._door[worlds, agents] = np.argmax(np.cumsum(closed[worlds], axis=1) > pick[:, None], axis=1)
+            self._phase[worlds, agents] = self._FOLLOW
+
+        worlds, agents = np.nonzero(deciding & (self._phase == self._FOLLOW))
+        locs = world.getAgentLocations()[worlds, agents]
+        doors = self._door[worlds, agents]
+        moves = self._moves[doors, locs[:, 0], locs[:, 1]]
+        arrived = moves == IDLE
+        actions[worlds, agents] = np.where(arrived, OPEN_DOOR, moves)
+        targets[worlds[arrived], agents[arrived]] = doors[arrived]
+        self._phase[worlds[arrived], agents[arrived]] = self._PLAN
+        return actions, targets
+
+
+def _buildWorlds(agents:List[dict], worldsettings:dict, seeds:List[int], log_dir:str)->Iterator[BW4TWorld]:
+    '''
+    @return the headless BW4TWorlds of the given seeds, one at a time
+    '''
+    settings = dict(worldsettings, fast_forward=True, record=False, profile=False, log_events=False,
+                    log_trust=False, checkpoint_interval=0)
+    for seed in seeds:
+        random.seed(seed)
+        yield BW4TWorld(agents, dict(settings, random_seed=seed), log_dir=log_dir)
+
+
+def _captureAction(decisions:dict, captured_id:str, get_action, *args, **kwargs):
+    '''
+    Replaces the get_action_func of the agent bodies in validate (bound
+    to the first three arguments), to also keep the decided action.
+    '''
+    result = get_action(*args, **kwargs)
+    decisions[captured_id] = (result[2], result[3])
+    return result
+
+
+def validate(agents:List[dict], worldsettings:dict, seeds:List[int])->List[str]:
+    '''
+    Runs BW4TWorlds and a VectorWorld side by side on the given seeds.
+    Every tick the actions the agents decide on in the matrx worlds are
+    also done in the VectorWorld, and the agent locations, door states,
+    blocks, goal ticks and done flags are compared.
+    @return a description of each difference, empty if there were none
+    '''
+    with tempfile.TemporaryDirectory() as log_dir:
+        worlds = list(_buildWorlds(agents, worldsettings, seeds, log_dir))
+    vector = VectorWorld([world._gridworld for world in worlds],
+                         [agent['settings'].get('slowdown', 1) for agent in agents])
+    runners = []
+    decisions = [{} for _ in worlds]
+    for world, world_decisions in zip(worlds, decisions):
+        gridworld = world._gridworld
+        gridworld._GridWorld__loggers.clear()
+        gridworld.initialize(world._builder.api_info)
+        for agent_id, body in gridworld.registered_agents.items():
+            body.get_action_func = functools.partial(_captureAction, world_decisions, agent_id, body.get_action_func)
+        runners.append(FastForwardRunner(gridworld))
+
+    differences:List[str] = []
+    agent_ids = vector.getAgentIds()
+    while not vector.isDone().all():
+        actions = np.zeros((len(worlds), len(agent_ids)), dtype=int)
+        targets = np.full(actions.shape, -1, dtype=int)
+        for nr, runner in enumerate(runners):
+            if vector.isDone()[nr]:
+                continue
+            decisions[nr].clear()
+            if runner.step():
+                differences.append(f"world {nr}: the matrx world is done at tick {vector.getTick()[nr]}")
+            # the goal of the matrx world was checked at the start of the tick it just ran
+            drop_off = worlds[nr]._gridworld.simulation_goal._CollectionGoal__drop_off
+            goal_ticks = [[-1 if rank[3] is None else rank[3] for _, rank in sorted(zone.items())]
+                          for _, zone in sorted(drop_off.items())]
+            if goal_ticks != vector.getGoal()['tick'][nr].tolist():
+                differences.append(f"world {nr} tick {vector.getTick()[nr]}: goal ticks {goal_ticks}, "
+                                   f"in the vector world {vector.getGoal()['tick'][nr].tolist()}")
+            for agent_id, (action_name, action_kwargs) in decisions[nr].items():
+                agent = agent_ids.index(agent_id)
+                actions[nr, agent] = ACTION_CODES[action_name]
+                object_id = action_kwargs.get('object_id')
+                if object_id in vector.getDoorIds():
+                    targets[nr, agent] = vector.getDoorIds().index(object_id)
+                elif object_id in vector.getBlockIds(nr):
+                    targets[nr, agent] = vector.getBlockIds(nr).index(object_id)
+        vector.step(actions, targets)
+        for nr, world in enumerate(worlds):
+            differences += _compare(vector, nr, world._gridworld)
+    for nr, world in enumerate(worlds):
+        if not world._gridworld.simulation_goal.goal_reached(world._gridworld):
+            differences.append(f"world {nr}: the vector world is done at tick {vector.getTick()[nr]}")
+    return differences
+
+
+def _compare(vector:VectorWorld, nr:int, gridworld:GridWorld)->List[str]:
+    '''
+    @return the differences between world nr of the vector world and the matrx world
+    '''
+    differences:List[str] = []
+    prefix = f"world {nr} tick {gridworld.current_nr_ticks}:"
+    if gridworld.current_nr_ticks != vector.getTick()[nr]:
+        differences.append(f"{prefix} the vector world is at tick {vector.getTick()[nr]}")
+    block_ids = vector.getBlockIds(nr)
+    blocks = vector.getBlocks()
+    for agent, (agent_id, body) in enumerate(gridworld.registered_agents.items()):
+        loc = tuple(vector.getAgentLocations()[nr, agent])
+        if tuple(body.location) != loc:
+            differences.append(f"{prefix} {agent_id} is at {body.location}, in the vector world at {loc}")
+        carrying = [obj.obj_id for obj in body.is_carrying]
+        block = vector.getCarrying()[nr, agent]
+        if carrying != ([] if block < 0 else [block_ids[block]]):
+            differences.append(f"{prefix} {agent_id} carries {carrying}, in the vector world block {block}")
+    for door, door_id in enumerate(vector.getDoorIds()):
+        if gridworld.environment_objects[door_id].is_open != vector.getOpenDoors()[nr, door]:
+            differences.append(f"{prefix} {door_id} is_open is {gridworld.environment_objects[door_id].is_open}")
+    for block, block_id in enumerate(block_ids):
+        if block_id in gridworld.environment_objects:
+            loc = tuple(blocks['location'][nr, block])
+            if tuple(gridworld.environment_objects[block_id].location) != loc or blocks['carrier'][nr, block] >= 0:
+                differences.append(f"{prefix} {block_id} is at {gridworld.environment_objects[block_id].location}, "
+                                   f"in the vector world at {loc}")
+    return differences
+
+
+if __name__ == "__main__":
+    from agents1.BW4TBaselineAgent import BaseLineAgent
+    from agents1.Team40Agent import Team40Agent
+    parser = argparse.ArgumentParser(description="Runs the baseline policy in many vector worlds, or "
+        "validates the vector world against matrx worlds.")
+    parser.add_argument('--worlds', type=int, default=1000, help="number of worlds, with seeds 1 to worlds")
+    parser.add_argument('--agents', type=int, default=3, help="number of baseline agents")
+    parser.add_argument('--validate', nargs='+', type=int, metavar='SEED',
+        help="instead, run baseline and Team40 agents in matrx worlds with these seeds and "
+             "compare with the vector world")
+    args = parser.parse_args()
+
+    settings = dict(DEFAULT_WORLDSETTINGS)
+    if args.validate is not None:
+        team = [{'name': 'agent1', 'botclass': BaseLineAgent, 'settings': {}},
+                {'name': 'agent2', 'botclass': Team40Agent, 'settings': {}},
+                {'name': 'agent3', 'botclass': Team40Agent, 'settings': {'slowdown': 2}}]
+        differences = validate(team, settings, args.validate)
+        for difference in differences[:20]:
+            print(difference)
+        print(f"{len(differences)} differences")
+    else:
+        team = [{'name': f"agent{nr}", 'botclass': BaseLineAgent, 'settings': {}} for nr in range(args.agents)]
+        start = time.perf_counter()
+        world = VectorWorld.fromSeeds(team, settings, list(range(1, args.worlds + 1)))
+        policy = VectorBaseLinePolicy(world, seed=1)
+        built = time.perf_counter()
+        ticks = world.run(policy)
+        seconds = time.perf_counter() - built
+        print(f"Built {args.worlds} worlds in {built - start:.1f}s, ran {ticks.sum()} world ticks "
+              f"in {seconds:.1f}s: {ticks.sum() / seconds:.0f} world ticks/s")
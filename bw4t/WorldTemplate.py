@@ -0,0 +1,150 @@
+from typing import Dict, List, Tuple
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from matrx.grid_world import GridWorld
+from matrx.objects import AreaTile
+from bw4t.BW4TBlocks import GhostBlock
+from bw4t.Navigation import PathCache
+from bw4t.LayoutGenerator import LayoutGenerator
+
+
+class WorldTemplate:
+    '''
+    The static part of a BW4T world: the world bounds, the rooms with
+    their walls, doors and area tiles, and the drop zone areas, plus the
+    PathCache for that layout. It is built once for each layout and
+    installed in every new world with that layout, so that only the
+    random parts (blocks, goal blocks, colours) are created per world.
+    The objects are kept pickled, so every world gets fresh copies.
+    With 'layout_dir' templates are also saved in that directory, next
+    to the layouts, so that other processes load them instead of
+    building them again.
+    '''
+    # The templates made so far, by layout key. See getKey.
+    _templates:Dict[tuple,'WorldTemplate'] = {}
+
+    # The worldsettings that determine the static layout, next to those of the LayoutGenerator
+    LAYOUT_SETTINGS:Tuple[str,...] = ('wall_color', 'drop_off_color')
+
+    def __init__(self, gridworld:GridWorld, nr_room_objects:int,
+                 room_locations:Dict[str,List[Tuple[int,int]]], path_cache:PathCache):
+        '''
+        @param gridworld a world with only the static objects, added in
+        the order of a normal world: bounds and rooms first, then for each
+        drop zone its area tiles.
+        @param nr_room_objects the number of objects of bounds and rooms.
+        @param room_locations the free locations in each room, by room name
+        @param path_cache the PathCache of the layout, with all doors closed.
+        '''
+        objects = list(gridworld.environment_objects.values())
+        self._rooms = pickle.dumps(objects[:nr_room_objects])
+        zones:Dict[int,list] = {}
+        for obj in objects[nr_room_objects:]:
+            zones.setdefault(obj.custom_properties['drop_zone_nr'], []).append(obj)
+        self._zones = pickle.dumps(zones)
+        self._obj_indices = dict(gridworld._GridWorld__obj_indices)
+        self._room_locations = room_locations
+        self._path_cache = path_cache
+
+    @classmethod
+    def getKey(cls, worldsettings:dict)->tuple:
+        '''
+        @return the key of the layout of the given settings
+        '''
+        return (LayoutGenerator.getKey(worldsettings),) + \
+            tuple(repr(worldsettings.get(key)) for key in cls.LAYOUT_SETTINGS)
+
+    @classmethod
+    def getFileName(cls, worldsettings:dict)->str:
+        '''
+        @return the file of the template for the layout of the given
+        settings in 'layout_dir', or None if there is no 'layout_dir'
+        '''
+        directory = worldsettings.get('layout_dir')
+        if directory is None:
+            return None
+        digest = hashlib.sha1(repr(cls.getKey(worldsettings)).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(directory, f"template_{digest}.pkl")
+
+    @classmethod
+    def get(cls, worldsettings:dict)->'WorldTemplate':
+        '''
+        @return the template for the layout of the given settings, or
+        None if there is none yet.
+        '''
+        key = cls.getKey(worldsettings)
+        template = cls._templates.get(key)
+        filename = cls.getFileName(worldsettings)
+        if template is None and filename is not None and os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                saved_key, template = pickle.loads(zlib.decompress(f.read()))
+            if saved_key != key:
+                return None
+            cls._templates[key] = template
+        return template
+
+    @classmethod
+    def put(cls, worldsettings:dict, template:'WorldTemplate'):
+        '''
+        Stores the template for the layout of the given settings, and
+        saves it if there is a 'layout_dir'. The file is replaced at once.
+        '''
+        key = cls.getKey(worldsettings)
+        cls._templates[key] = template
+        filename = cls.getFileName(worldsettings)
+        if filename is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(pickle.dumps((key, template))))
+            os.replace(tmp_name, filename)
+
+    def getRoomLocations(self)->Dict[str,List[Tuple[int,int]]]:
+        '''
+        @return the free locations in each room, by room name
+        '''
+        return self._room_locations
+
+    def addKeyPoints(self, key_points:List[Tuple[int,int]]):
+        '''
+        Precomputes the paths to more locations, like the spawn tiles of
+        a team, in the PathCache of the template, so that every next
+        world with this layout gets them with getPathCache.
+        '''
+        self._path_cache.addKeyPoints(key_points)
+
+    def getPathCache(self)->PathCache:
+        '''
+        @return a new PathCache for a world with this layout
+        '''
+        return self._path_cache.copy()
+
+    def install(self, gridworld:GridWorld, room_colours:Dict[str,str]):
+        '''
+        Adds fresh copies of the static objects to a world that was built
+        with only the random objects (blocks and goal blocks). The objects
+        are put in the order in which a world built from scratch has them,
+        so agents see the same states.
+        @param gridworld the world, not yet initialized
+        @param room_colours the area colour of each room, by room name
+        '''
+        rooms = pickle.loads(self._rooms)
+        for obj in rooms:
+            if isinstance(obj, AreaTile) and obj.custom_properties.get('room_name') in room_colours:
+                obj.visualize_colour = room_colours[obj.custom_properties['room_name']]
+        zones = pickle.loads(self._zones)
+
+        env_objects = gridworld._GridWorld__environment_objects
+        random_objects = list(env_objects.values())
+        ordered = rooms + [obj for obj in random_objects if not isinstance(obj, GhostBlock)]
+        for zone_nr, zone_objects in sorted(zones.items()):
+            ordered += zone_objects
+            ordered += [obj for obj in random_objects
+                        if isinstance(obj, GhostBlock) and obj.custom_properties['drop_zone_nr'] == zone_nr]
+        env_objects.clear()
+        for obj in ordered:
+            env_objects[obj.obj_id] = obj
+        gridworld._GridWorld__obj_indices.update(self._obj_indices)
@@ -0,0 +1,143 @@
+from typing import List, Dict, Final
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import importlib
+import itertools
+import json
+import os
+import random
+import pandas as pd # type: ignore
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.statistics import Statistics
+
+# Settings that are forced for every batch run: no web api or visualizer,
+# not paused waiting for a start button and no sleeping between ticks.
+HEADLESS_SETTINGS:Final[dict]={
+    'run_matrx_api': False,
+    'run_matrx_visualizer': False,
+    'matrx_paused': False,
+    'tick_duration': 0,
+    'fast_forward': True,
+}
+
+
+class BatchRunner:
+    '''
+    Runs a grid of headless BW4T episodes in parallel worker processes.
+    The grid is all combinations of agent lists x worldsettings
+    overrides x random seeds. Each run writes its log in its own
+    directory <out_dir>/run_<nr> so that parallel runs never collide.
+    '''
+    def __init__(self, agent_lists:List[List[dict]], overrides:List[dict]=[{}],
+                 seeds:List[int]=[1], out_dir:str='batch', workers:int=None):
+        '''
+        @param agent_lists list of agent lists. Each agent list is as
+        used by BW4TWorld. The botclass must be importable by the workers.
+        @param overrides list of dicts with settings that override
+        DEFAULT_WORLDSETTINGS. HEADLESS_SETTINGS are always applied on top.
+        @param seeds list of random seeds to run for each combination.
+        @param out_dir the directory in which the run directories are made.
+        @param workers the number of worker processes. None uses the
+        number of processors.
+        '''
+        self._agent_lists=agent_lists
+        self._overrides=overrides
+        self._seeds=seeds
+        self._out_dir=out_dir
+        self._workers=workers
+
+    def getJobs(self)->List[dict]:
+        '''
+        @return list of jobs, one for each run in the grid.
+        '''
+        jobs=[]
+        grid = itertools.product(enumerate(self._agent_lists),
+                                 enumerate(self._overrides), self._seeds)
+        for run_nr, ((agents_nr, agents), (override_nr, override), seed) in enumerate(grid):
+            settings = DEFAULT_WORLDSETTINGS.copy()
+            settings.update(override)
+            settings.update(HEADLESS_SETTINGS)
+            settings['random_seed'] = seed
+            jobs.append({'run':run_nr, 'agents_nr':agents_nr, 'override_nr':override_nr,
+                'seed':seed, 'agents':agents, 'worldsettings':settings,
+                'log_dir':os.path.join(self._out_dir, f"run_{run_nr}")})
+        return jobs
+
+    def run(self)->pd.DataFrame:
+        '''
+        Runs all jobs and collects their statistics.
+        @return table with one row for each run, in job order.
+        '''
+        jobs = self.getJobs()
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            rows = list(pool.map(run_episode, jobs))
+        results = pd.DataFrame(rows)
+        os.makedirs(self._out_dir, exist_ok=True)
+        results.to_csv(os.path.join(self._out_dir, 'results.csv'), sep=';', index=False)
+        return results
+
+
+def run_episode(job:dict)->Dict[str,object]:
+    '''
+    Runs a single headless episode. Called in the worker processes.
+    If the run directory has a checkpoint of an earlier attempt (see
+    'checkpoint_interval'), the run resumes from there.
+    @param job a job as made by BatchRunner.getJobs
+    @return dict with the job info and the Statistics of the run.
+    '''
+    os.makedirs(job['log_dir'], exist_ok=True)
+    checkpoints = glob.glob(os.path.join(job['log_dir'], 'world_1', '*_checkpoint.pkl'))
+    if len(checkpoints) > 0:
+        # an earlier attempt of this run died, continue where it was
+        world = BW4TWorld.resume(max(checkpoints, key=os.path.getmtime)).run()
+    else:
+        # BW4TWorld and the agents also use the python random module
+        random.seed(job['seed'])
+        world = BW4TWorld(job['agents'], job['worldsettings'], log_dir=job['log_dir']).run()
+    logfile = world.getLogger().getFileName()
+    stats = Statistics(logfile)
+
+    row = {'run':job['run'], 'agents_nr':job['agents_nr'],
+           'override_nr':job['override_nr'], 'seed':job['seed'],
+           'logfile':logfile, 'success':stats.isSucces(),
+           'last_tick':int(stats.getLastTick()),
+           'total_moves':sum(stats.getMoves().values())}
+    for agent in stats.getAgents():
+        row[agent+'_moves'] = stats.getMoves()[agent]
+        row[agent+'_drops'] = stats.getDrops()[agent]
+        row[agent+'_mssg'] = int(stats.getMessages()[agent])
+    return row
+
+
+def _load_agents(agents:List[dict])->List[dict]:
+    '''
+    @param agents list of agent specifications where botclass is
+    a string like 'agents1.Team40Agent.Team40Agent'
+    @return the list with botclass replaced by the actual class
+    '''
+    loaded=[]
+    for agent in agents:
+        module, classname = agent['botclass'].rsplit('.', 1)
+        botclass = getattr(importlib.import_module(module), classname)
+        loaded.append({'name':agent['name'], 'botclass':botclass,
+                       'settings':agent.get('settings', {})})
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a grid of headless BW4T episodes. "
+        "The config is a json file like {\"agents\": [[{\"name\":\"agent1\", "
+        "\"botclass\":\"agents1.Team40Agent.Team40Agent\", \"settings\":{}}]], "
+        "\"worldsettings\": [{}], \"seeds\": [1, 2, 3]}")
+    parser.add_argument('config', help="json file with the experiment grid")
+    parser.add_argument('--out', default='batch', help="directory for the logs and results.csv")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    runner = BatchRunner([_load_agents(agents) for agents in config['agents']],
+        overrides=config.get('worldsettings', [{}]), seeds=config.get('seeds', [1]),
+        out_dir=args.out, workers=args.workers)
+    print(runner.run().to_string())
@@ -0,0 +1,316 @@
+from typing import List, Dict, Final
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.CollectionGoal import CollectionGoal
+from bw4t.batchrunner import HEADLESS_SETTINGS
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from agents1.Team40Agent import Team40Agent
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+# The scenarios, from small to large. 'worldsettings' override
+# DEFAULT_WORLDSETTINGS, 'team' gives the number of agents per class.
+SCENARIOS:Final[Dict[str,dict]]={
+    'small': {'worldsettings': {'nr_rooms': 4, 'rooms_per_row': 2,
+        'average_blocks_per_room': 2, 'nr_blocks_needed': 3},
+        'team': {'BaseLineAgent': 1, 'Team40Agent': 1}},
+    'default': {'worldsettings': {'nr_rooms': 9, 'rooms_per_row': 3,
+        'average_blocks_per_room': 2, 'nr_blocks_needed': 3},
+        'team': {'BaseLineAgent': 1, 'Team40Agent': 2}},
+    'large': {'worldsettings': {'nr_rooms': 16, 'rooms_per_row': 4,
+        'average_blocks_per_room': 3, 'nr_blocks_needed': 4},
+        'team': {'BaseLineAgent': 2, 'Team40Agent': 4}},
+    'xlarge': {'worldsettings': {'nr_rooms': 25, 'rooms_per_row': 5,
+        'average_blocks_per_room': 4, 'nr_blocks_needed': 5},
+        'team': {'BaseLineAgent': 4, 'Team40Agent': 8}},
+    'generated': {'worldsettings': {'layout': 'generated', 'nr_rooms': 16, 'rooms_per_row': 4,
+        'average_blocks_per_room': 3, 'nr_blocks_needed': 4},
+        'team': {'BaseLineAgent': 1, 'Team40Agent': 2}},
+}
+
+# The steps of the scaling benchmark: step k has k drop zones, 4k rooms and 2k agents
+SCALING_STEPS:Final[List[int]]=[1, 2, 4, 8, 16]
+
+BOTCLASSES:Final[Dict[str,type]]={'BaseLineAgent': BaseLineAgent, 'Team40Agent': Team40Agent}
+
+
+class Benchmark:
+    '''
+    Measures the tick throughput of headless BW4T worlds for a number
+    of scenarios of growing world and team size. Every run uses a fixed
+    seed and a fixed number of ticks (the deadline), so results of two
+    commits can be compared. Each run is done in a fresh process, one
+    run at a time, so that the peak memory is that of the run alone
+    and runs do not compete for the CPU.
+    '''
+    def __init__(self, scenarios:List[str]=list(SCENARIOS.keys()), seeds:List[int]=[1, 2, 3],
+                 ticks:int=500, layout_dir:str=None):
+        '''
+        @param scenarios names of the SCENARIOS to run
+        @param seeds the random seeds to run each scenario with
+        @param ticks the number of ticks of each run. Runs where the
+        agents reach the goal earlier are shorter.
+        @param layout_dir the 'layout_dir' of the worlds, None for none
+        '''
+        self._scenarios=scenarios
+        self._seeds=seeds
+        self._ticks=ticks
+        self._layout_dir=layout_dir
+
+    def getJobs(self)->List[dict]:
+        '''
+        @return list of jobs, one for each scenario and seed.
+        '''
+        jobs=[]
+        for name in self._scenarios:
+            scenario = SCENARIOS[name]
+            settings = DEFAULT_WORLDSETTINGS.copy()
+            settings.update(scenario['worldsettings'])
+            settings.update(HEADLESS_SETTINGS)
+            settings['deadline'] = self._ticks
+            settings['profile'] = True
+            settings['layout_dir'] = self._layout_dir
+            agents = [{'name': f"{classname}{nr}", 'botclass': BOTCLASSES[classname], 'settings': {}}
+                for classname, count in scenario['team'].items() for nr in range(count)]
+            for seed in self._seeds:
+                jobs.append({'scenario': name, 'seed': seed, 'agents': agents,
+                             'worldsettings': dict(settings, random_seed=seed)})
+        return jobs
+
+    def run(self)->dict:
+        '''
+        Runs all jobs.
+        @return dict with info about the machine and code, and for
+        each scenario the means over the seeds and the separate runs.
+        '''
+        with Pool(processes=1, maxtasksperchild=1) as pool:
+            runs = pool.map(run_benchmark, self.getJobs(), chunksize=1)
+
+        results:Dict[str,dict] = {}
+        for name in self._scenarios:
+            scenario_runs = [run for run in runs if run['scenario'] == name]
+            summary:Dict[str,object] = {key: round(float(np.mean([run[key] for run in scenario_runs])), 4)
+                for key in ['ticks_per_sec', 'tick_p50_ms', 'tick_p95_ms', 'tick_p99_ms']}
+            rss = [run['peak_rss_mb'] for run in scenario_runs if run['peak_rss_mb'] is not None]
+            summary['peak_rss_mb'] = max(rss) if len(rss) > 0 else None
+            summary['runs'] = scenario_runs
+            results[name] = summary
+        return {'commit': _getCommit(), 'python': platform.python_version(),
+                'machine': platform.platform(), 'ticks': self._ticks, 'seeds': self._seeds,
+                'results': results}
+
+    def write(self, filename:str)->dict:
+        '''
+        Runs all jobs and writes the results as json to the given file.
+        @return the results
+        '''
+        results = self.run()
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=1)
+        return results
+
+
+class ScalingBenchmark:
+    '''
+    Measures how building a world and checking its goal grow with the
+    size of the world: step k has k drop zones, 4k rooms (8 per row)
+    and 2k Team40 agents. Like Benchmark, each step runs in a fresh
+    process, so the world is built without a cached template, unless
+    it was saved in the layout_dir by an earlier run.
+    '''
+    def __init__(self, steps:List[int]=SCALING_STEPS, seed:int=1, ticks:int=100, layout_dir:str=None):
+        '''
+        @param steps the sizes k to run
+        @param seed the random seed of each step
+        @param ticks the number of ticks each world is run for the per tick goal check
+        @param layout_dir the 'layout_dir' of the worlds, None for none
+        '''
+        self._steps=steps
+        self._seed=seed
+        self._ticks=ticks
+        self._layout_dir=layout_dir
+
+    def getJobs(self)->List[dict]:
+        '''
+        @return list of jobs, one for each step
+        '''
+        jobs=[]
+        for k in self._steps:
+            settings = DEFAULT_WORLDSETTINGS.copy()
+            settings.update(HEADLESS_SETTINGS)
+            settings.update({'nr_drop_zones': k, 'drop_zones_per_row': 8, 'nr_rooms': 4 * k,
+                'rooms_per_row': min(4 * k, 8), 'deadline': self._ticks, 'profile': True,
+                'random_seed': self._seed, 'layout_dir': self._layout_dir})
+            agents = [{'name': f"Team40Agent{nr}", 'botclass': Team40Agent, 'settings': {}} for nr in range(2 * k)]
+            jobs.append({'step': k, 'seed': self._seed, 'agents': agents, 'worldsettings': settings})
+        return jobs
+
+    def run(self)->dict:
+        '''
+        Runs all steps.
+        @return dict with info about the machine and code, and the
+        results of each step, see run_scaling.
+        '''
+        with Pool(processes=1, maxtasksperchild=1) as pool:
+            steps = pool.map(run_scaling, self.getJobs(), chunksize=1)
+        return {'commit': _getCommit(), 'python': platform.python_version(),
+                'machine': platform.platform(), 'ticks': self._ticks, 'seed': self._seed,
+                'steps': steps}
+
+    def write(self, filename:str)->dict:
+        '''
+        Runs all steps and writes the results as json to the given file.
+        @return the results
+        '''
+        results = self.run()
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=1)
+        return results
+
+
+def run_scaling(job:dict)->Dict[str,object]:
+    '''
+    Runs a single step of the scaling benchmark. Called in a fresh worker process.
+    @param job a job as made by ScalingBenchmark.getJobs
+    @return dict with the size of the world, the time to build it (the
+    first world of a layout also builds its WorldTemplate, which includes
+    the placement checks of matrx, that grow with the square of the
+    number of objects) and to build another world with the same layout,
+    the time of a full goal check (the first one, that indexes all drop
+    zones) and the median time of the goal check per tick of a run.
+    '''
+    random.seed(job['seed'])
+    settings = job['worldsettings']
+    with tempfile.TemporaryDirectory() as log_dir:
+        start = time.perf_counter()
+        BW4TWorld(job['agents'], settings, log_dir=log_dir)
+        build_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        world = BW4TWorld(job['agents'], settings, log_dir=log_dir)
+        build_cached_ms = (time.perf_counter() - start) * 1000
+        gridworld = world.getGridWorld()
+        start = time.perf_counter()
+        CollectionGoal(settings['deadline']).isBlocksPlaced(gridworld)
+        goal_full_ms = (time.perf_counter() - start) * 1000
+        world.run()
+        goal = world.getProfiler().getProfile()['isBlocksPlaced']['world']
+        nr_objects = len(gridworld.environment_objects)
+    return {'step': job['step'], 'nr_drop_zones': settings['nr_drop_zones'], 'nr_rooms': settings['nr_rooms'],
+            'nr_agents': len(job['agents']), 'nr_objects': nr_objects, 'build_ms': round(build_ms, 1),
+            'build_cached_ms': round(build_cached_ms, 1),
+            'goal_full_ms': round(goal_full_ms, 3), 'goal_tick_ms': goal['p50_ms']}
+
+
+def run_benchmark(job:dict)->Dict[str,object]:
+    '''
+    Runs a single benchmark job. Called in a fresh worker process.
+    @param job a job as made by Benchmark.getJobs
+    @return dict with the throughput, tick latency percentiles and
+    peak memory of the run.
+    '''
+    random.seed(job['seed'])
+    with tempfile.TemporaryDirectory() as log_dir:
+        world = BW4TWorld(job['agents'], job['worldsettings'], log_dir=log_dir)
+        start = time.perf_counter()
+        world.run()
+        seconds = time.perf_counter() - start
+        tick = world.getProfiler().getProfile()['tick']['world']
+    peak_rss_mb = None
+    if resource is not None:
+        # linux gives kilobytes, macos bytes
+        scale = 1 if sys.platform == 'darwin' else 1024
+        peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+    return {'scenario': job['scenario'], 'seed': job['seed'], 'ticks': tick['calls'],
+            'seconds': round(seconds, 3), 'ticks_per_sec': round(tick['calls'] / seconds, 2),
+            'tick_p50_ms': tick['p50_ms'], 'tick_p95_ms': tick['p95_ms'], 'tick_p99_ms': tick['p99_ms'],
+            'peak_rss_mb': peak_rss_mb}
+
+
+def compare(old:dict, new:dict, tolerance:float=0.1)->List[dict]:
+    '''
+    Compares the results of two benchmarks, eg of two commits.
+    @param old the results of the baseline, as returned by Benchmark.run
+    @param new the results to compare with the baseline
+    @param tolerance the fraction the throughput may drop before it is a regression
+    @return list with for each scenario in both results the old and new
+    ticks per second, their ratio (new/old) and whether it regressed.
+    '''
+    rows=[]
+    for name, new_result in new['results'].items():
+        if name not in old['results']:
+            continue
+        old_tps = old['results'][name]['ticks_per_sec']
+        new_tps = new_result['ticks_per_sec']
+        ratio = new_tps / old_tps if old_tps > 0 else float('inf')
+        rows.append({'scenario': name, 'old_ticks_per_sec': old_tps, 'new_ticks_per_sec': new_tps,
+                     'ratio': round(ratio, 3), 'regression': ratio < 1 - tolerance})
+    return rows
+
+
+def _getCommit()->str:
+    '''
+    @return the current git commit, or None if that is not known
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the BW4T tick throughput for growing "
+        "world and team sizes, or compares two benchmark results.")
+    parser.add_argument('--out', default='benchmark.json', help="json file to write the results to")
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS.keys()), choices=list(SCENARIOS.keys()))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--ticks', type=int, default=500, help="number of ticks of each run")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help="compare two result files instead of running; exits with 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+        help="fraction the ticks per second may drop before it counts as a regression")
+    parser.add_argument('--scaling', nargs='*', type=int, metavar='K',
+        help="run the scaling benchmark instead, for the given steps (default all): k drop zones, 4k rooms, 2k agents")
+    parser.add_argument('--layout-dir', default=None,
+        help="directory in which the layouts and world templates are saved, so that later runs load them")
+    args = parser.parse_args()
+
+    if args.scaling is not None:
+        results = ScalingBenchmark(args.scaling or SCALING_STEPS, args.seeds[0], args.ticks,
+                                   args.layout_dir).write(args.out)
+        for step in results['steps']:
+            print(f"k={step['step']:>3}: {step['nr_drop_zones']:>3} zones, {step['nr_rooms']:>3} rooms, "
+                  f"{step['nr_agents']:>3} agents, {step['nr_objects']:>5} objects: build {step['build_ms']:8.1f} ms "
+                  f"({step['build_cached_ms']:7.1f} ms with the template), "
+                  f"full goal check {step['goal_full_ms']:7.2f} ms, goal check per tick {step['goal_tick_ms']:.4f} ms")
+        sys.exit(0)
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.tolerance)
+        for row in rows:
+            print(f"{row['scenario']:>10}: {row['old_ticks_per_sec']:8.1f} -> {row['new_ticks_per_sec']:8.1f} "
+                  f"ticks/s (x{row['ratio']}){'  REGRESSION' if row['regression'] else ''}")
+        sys.exit(1 if any(row['regression'] for row in rows) else 0)
+
+    results = Benchmark(args.scenarios, args.seeds, args.ticks, args.layout_dir).write(args.out)
+    for name, result in results['results'].items():
+        print(f"{name:>10}: {result['ticks_per_sec']:8.1f} ticks/s, tick p50/p95/p99 "
+              f"{result['tick_p50_ms']}/{result['tick_p95_ms']}/{result['tick_p99_ms']} ms, "
+              f"peak rss {result['peak_rss_mb']} MB")
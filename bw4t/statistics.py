@@ -2,14 +2,21 @@ from typing import final, List, Dict, Final
 import sys
 import csv
 import os
+import numpy as np
+import pandas as pd # type: ignore
+from bw4t.BinaryLog import BinaryLogReader
 
 MOVES=['MoveNorth','MoveNorthEast','MoveEast','MoveSouthEast',
        'MoveSouth','MoveSouthWest','MoveWest','MoveNorthWest']
 
+# z value used for the 95% confidence intervals in summarize
+CI_Z:Final[float]=1.96
+
 class Statistics:
-    def __init__(self, filename:str):
+    def __init__(self, filename:str, chunksize:int=None):
         '''
-        @param filename the path to the csv file to read.
+        @param filename the path to the csv file to read, or to a binary
+        .bw4t log as written by BW4TBinaryLogger.
         It  is assumed that first row of the file contains the element headers
         and these are used as dict keys.
         header is assumed to have keys like 
@@ -19,10 +26,25 @@ class Statistics:
 
         done is True only in the last row.
         drops contains number of drops IN DROP ZONE.
+        @param chunksize if not None, the file is not read into memory
+        but streamed in chunks of this many rows into typed columns.
+        This gives the same results, with memory use bounded by the
+        chunksize instead of the length of the log.
         '''
         self._filename=filename
-        self._contents=self._read()
-        self._analyse()
+        # agents found in the header, for the analyses that keep no _contents
+        self._agents:List[str]=[]
+        # None if the log has no rows
+        self._last_row:Dict[str,str]=None
+        if filename.endswith('.bw4t'):
+            self._contents=[]
+            self._analyseBinary()
+        elif chunksize is None:
+            self._contents=self._read()
+            self._analyse()
+        else:
+            self._contents=[]
+            self._analyseColumns(chunksize)
         
     def _read(self)->List[Dict[str,str]]:
         '''
@@ -45,6 +67,7 @@ class Statistics:
                     continue
                 res = {header[i]: row[i] for i in range(len(header))} 
                 contents.append(res)
+        self._agents=[h[:len(h)-5] for h in header if h.endswith("_acts")]
         return contents
 
     def _analyse(self):
@@ -67,25 +90,104 @@ class Statistics:
                 if 'DropObject'==row[agent+'_acts']:
                     self._drops[agent]+=1
                 self._messages[agent] = row[agent+'_mssg']
-                
+        if len(self._contents)>0:
+            self._last_row=self._contents[-1]
+
+    def _analyseColumns(self, chunksize:int):
+        '''
+        analyse the csv file by streaming it in chunks of typed columns.
+        Only the counters and the last row are kept between chunks.
+        @param chunksize the number of rows per chunk
+        '''
+        with open(self._filename) as csvfile:
+            header=next(csv.reader(csvfile, delimiter=';', quotechar="'"), [])
+        self._agents=[h[:len(h)-5] for h in header if h.endswith("_acts")]
+        dtypes={h:'category' for h in header if h.endswith("_acts")}
+        dtypes.update({h:np.int64 for h in header if h.endswith("_mssg")})
+        dtypes.update({'done':str, 'world_nr':np.int64, 'tick_nr':np.int64})
+
+        self._moves={agent:0 for agent in self._agents}
+        self._messages={agent:0 for agent in self._agents}
+        self._drops={agent:0 for agent in self._agents}
+        for chunk in pd.read_csv(self._filename, sep=';', quotechar="'", dtype=dtypes,
+                                 keep_default_na=False, chunksize=chunksize):
+            for agent in self._agents:
+                acts=chunk[agent+'_acts']
+                self._moves[agent] += int(acts.isin(MOVES).sum())
+                self._drops[agent] += int((acts=='DropObject').sum())
+            # keep the last row as strings, as in the row based analysis
+            if len(chunk)>0:
+                self._last_row={h:str(v) for h,v in chunk.iloc[-1].items()}
+        if self._last_row is not None:
+            for agent in self._agents:
+                self._messages[agent] = self._last_row[agent+'_mssg']
+
+    def _analyseBinary(self):
+        '''
+        analyse a binary log block by block. Actions are compared as
+        dictionary codes, so no strings are made except for the last row.
+        '''
+        reader=BinaryLogReader(self._filename)
+        header=[name for name,_ in reader.getColumns()]
+        self._agents=[h[:len(h)-5] for h in header if h.endswith("_acts")]
+        self._moves={agent:0 for agent in self._agents}
+        self._messages={agent:0 for agent in self._agents}
+        self._drops={agent:0 for agent in self._agents}
+        for block, strings in reader.getBlocks():
+            moves=[code for code,act in enumerate(strings) if act in MOVES]
+            drop=strings.index('DropObject') if 'DropObject' in strings else -1
+            for agent in self._agents:
+                acts=block[agent+'_acts']
+                self._moves[agent] += int(np.isin(acts, moves).sum())
+                self._drops[agent] += int((acts==drop).sum())
+            self._last_row=reader.getRow(block, strings, -1)
+        if self._last_row is not None:
+            for agent in self._agents:
+                self._messages[agent] = self._last_row[agent+'_mssg']
+
+    def hasRows(self)->bool:
+        '''
+        @return False if the log only has its header, eg of a run that
+        stopped before its first tick
+        '''
+        return self._last_row is not None
+
     def getLastTick(self):
         '''
-        @return tick nr of last line
+        @return tick nr of last line, None if there are no rows
         '''
-        return self._contents[-1]['tick_nr']        
+        return None if self._last_row is None else self._last_row['tick_nr']
     
     def isSucces(self):
         '''
-        return 'done' field of last row 
+        return 'done' field of last row, 'False' if there are no rows
         '''
-        return self._contents[len(self._contents)-1]['done']
+        return 'False' if self._last_row is None else self._last_row['done']
     
+    def getMoves(self)->Dict[str,int]:
+        '''
+        @return dict with for each agent the number of moves it made
+        '''
+        return self._moves
+
+    def getDrops(self)->Dict[str,int]:
+        '''
+        @return dict with for each agent the number of drops it made
+        '''
+        return self._drops
+
+    def getMessages(self)->Dict[str,str]:
+        '''
+        @return dict with for each agent the number of messages in the last row
+        '''
+        return self._messages
+
     def getAgents(self):
         '''
         @return list of agents in the contents
         '''
         if len(self._contents)==0:
-            return []
+            return self._agents
         agents =[]
         for header in self._contents[0].keys():
             if header.endswith("_acts"):
@@ -103,10 +205,55 @@ class Statistics:
             +"\ntotal moves:"+str(sum(self._moves.values()))\
             +"\nlast tick:"+str(self.getLastTick())
         
+
+def summarize(directory:str, chunksize:int=100000)->pd.DataFrame:
+    '''
+    Analyse all csv and binary log files in world_<nr> folders below a directory,
+    eg a directory holding the run folders of a batch. Files are
+    streamed, so memory use only grows with the number of runs, not
+    with the length of the logs.
+    @param directory the directory to search for csv files
+    @param chunksize the number of rows per chunk, see Statistics
+    @return table with for each agent the number of runs and the mean
+    and the half width of the 95% confidence interval (normal
+    approximation) of its moves, drops and messages, plus the
+    success rate and the mean last tick of the runs it took part in.
+    Logs without rows are skipped, see Statistics.hasRows.
+    '''
+    rows=[]
+    for dirpath, dirnames, filenames in sorted(os.walk(directory)):
+        if not os.path.basename(dirpath).startswith('world_'):
+            continue
+        for filename in sorted(filenames):
+            if not filename.endswith('.csv') and not filename.endswith('.bw4t'):
+                continue
+            stats=Statistics(os.path.join(dirpath, filename), chunksize=chunksize)
+            if not stats.hasRows():
+                continue
+            for agent in stats.getAgents():
+                rows.append({'agent':agent, 'moves':stats.getMoves()[agent],
+                    'drops':stats.getDrops()[agent],
+                    'messages':int(stats.getMessages()[agent]),
+                    'success':stats.isSucces()=='True',
+                    'last_tick':int(stats.getLastTick())})
+    runs=pd.DataFrame(rows, columns=['agent','moves','drops','messages','success','last_tick'])
+
+    grouped=runs.groupby('agent')
+    summary=pd.DataFrame({'runs':grouped.size()})
+    for column in ['moves','drops','messages','success','last_tick']:
+        summary[column+'_mean']=grouped[column].mean()
+    for column in ['moves','drops','messages']:
+        summary[column+'_ci']=CI_Z*grouped[column].std(ddof=1)/np.sqrt(summary['runs'])
+    return summary
+
+
 if __name__ == "__main__":
     if len(sys.argv)!=2:
-        raise ValueError("usage: "+sys.argv[0]+" <filename>")
+        raise ValueError("usage: "+sys.argv[0]+" <filename or directory>")
     print (os.getcwd())
-    print(Statistics(sys.argv[1]))
+    if os.path.isdir(sys.argv[1]):
+        print(summarize(sys.argv[1]).to_string())
+    else:
+        print(Statistics(sys.argv[1]))
     
     
\ No newline at end of file
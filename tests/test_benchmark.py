@@ -0,0 +1,39 @@
+from bw4t.benchmark import Benchmark, SCENARIOS, compare, run_benchmark
+
+
+def results(**ticks_per_sec)->dict:
+    return {'results': {name: {'ticks_per_sec': tps} for name, tps in ticks_per_sec.items()}}
+
+
+def test_jobs():
+    jobs = Benchmark(['small', 'large'], seeds=[1, 2], ticks=50).getJobs()
+    assert [(job['scenario'], job['seed']) for job in jobs] == [('small', 1), ('small', 2), ('large', 1), ('large', 2)]
+    for job in jobs:
+        scenario = SCENARIOS[job['scenario']]
+        settings = job['worldsettings']
+        for key, value in scenario['worldsettings'].items():
+            assert settings[key] == value
+        assert settings['deadline'] == 50
+        assert settings['random_seed'] == job['seed']
+        assert settings['fast_forward'] and settings['profile']
+        assert len(job['agents']) == sum(scenario['team'].values())
+        assert len({agent['name'] for agent in job['agents']}) == len(job['agents'])
+
+
+def test_compare():
+    rows = compare(results(small=100.0, default=50.0, large=20.0),
+                   results(small=95.0, default=40.0, xlarge=10.0), tolerance=0.1)
+    # only the scenarios of both results
+    assert [row['scenario'] for row in rows] == ['small', 'default']
+    assert rows[0]['ratio'] == 0.95 and not rows[0]['regression']
+    assert rows[1]['ratio'] == 0.8 and rows[1]['regression']
+    assert not compare(results(small=100.0), results(small=85.0), tolerance=0.2)[0]['regression']
+
+
+def test_run(tmp_path):
+    job = Benchmark(['small'], seeds=[1], ticks=30, layout_dir=str(tmp_path)).getJobs()[0]
+    run = run_benchmark(job)
+    assert run['scenario'] == 'small' and run['seed'] == 1
+    assert 0 < run['ticks'] <= 31
+    assert run['ticks_per_sec'] > 0
+    assert run['tick_p50_ms'] <= run['tick_p95_ms'] <= run['tick_p99_ms']
@@ -0,0 +1,74 @@
+import random
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t import BinaryLog
+from bw4t.BinaryLog import BinaryLogReader, BinaryLogWriter
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {}}]
+
+
+def runWorld(log_dir, log_format:str)->str:
+    '''
+    @return the file name of the action log
+    '''
+    random.seed(1)
+    # a world that takes more than one block of 1000 ticks
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=1500, random_seed=1, log_format=log_format,
+                    nr_drop_zones=3, nr_rooms=12, rooms_per_row=4)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    return world.getGridWorld()._GridWorld__loggers[0].file_name
+
+
+def test_to_csv_gives_the_csv_log(tmp_path):
+    csv_log = runWorld(tmp_path / 'csv', 'csv')
+    binary_log = runWorld(tmp_path / 'binary', 'binary')
+    assert binary_log.endswith('.bw4t')
+    converted = str(tmp_path / 'converted.csv')
+    BinaryLogReader(binary_log).toCsv(converted)
+    with open(csv_log) as f:
+        expected = f.read()
+    with open(converted) as f:
+        assert len(expected.splitlines()) > 1001
+        assert f.read() == expected
+
+
+def test_blocks(tmp_path):
+    filename = str(tmp_path / 'log.bw4t')
+    writer = BinaryLogWriter(filename, block_size=2)
+    rows = [{'done': False, 'acts': None, 'nr': 0}, {'done': False, 'acts': 'MoveNorth', 'nr': -3},
+            {'done': True, 'acts': 'MoveNorth', 'nr': 2 ** 40}]
+    for row in rows:
+        writer.append(row)
+    writer.flush()
+    writer.flush()
+    reader = BinaryLogReader(filename)
+    assert reader.getColumns() == [('done', 'bool'), ('acts', 'str'), ('nr', 'int')]
+    expected = [{'done': 'False', 'acts': '', 'nr': '0'}, {'done': 'False', 'acts': 'MoveNorth', 'nr': '-3'},
+                {'done': 'True', 'acts': 'MoveNorth', 'nr': str(2 ** 40)}]
+    assert list(reader.getRows()) == expected
+    blocks = list(reader.getBlocks())
+    assert [len(block['nr']) for block, _ in blocks] == [2, 1]
+    assert reader.getRow(*blocks[-1], -1) == expected[-1]
+    with pytest.raises(ValueError):
+        writer.append({'done': True})
+
+
+def test_too_many_strings(tmp_path, monkeypatch):
+    # a dictionary of 256 strings instead of 65536
+    monkeypatch.setitem(BinaryLog.DTYPES, 'str', '<u1')
+    filename = str(tmp_path / 'log.bw4t')
+    writer = BinaryLogWriter(filename, block_size=100)
+    for nr in range(256):
+        writer.append({'nr': nr, 'acts': str(nr)})
+    writer.append({'nr': 256, 'acts': '255'})
+    with pytest.raises(ValueError):
+        writer.append({'nr': 257, 'acts': '256'})
+    writer.flush()
+    # the log stays readable, without the row that was refused
+    rows = list(BinaryLogReader(filename).getRows())
+    assert len(rows) == 257
+    assert rows[-1] == {'nr': '256', 'acts': '255'}
+    assert [row['acts'] for row in rows[:256]] == [str(nr) for nr in range(256)]
@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+import pytest
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.BW4TBlocks import CollectableBlock, GhostBlock
+
+AGENTS = [{'name': 'agent1', 'botclass': BaseLineAgent, 'settings': {}}]
+
+SETTINGS = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=1, nr_drop_zones=3, nr_rooms=12,
+                rooms_per_row=4, log_async=False)
+
+
+def getBlocks(log_dir, **settings)->tuple:
+    '''
+    @return (the location and kind of each block, by location), (the kind of each goal block, by location)
+    '''
+    world = BW4TWorld(AGENTS, dict(SETTINGS, **settings), log_dir=str(log_dir))
+    kind = lambda obj: (obj.visualize_shape, obj.visualize_colour)
+    objects = list(world.getGridWorld().environment_objects.values())
+    blocks = [(tuple(obj.location), kind(obj)) for obj in objects if isinstance(obj, CollectableBlock)]
+    goal_blocks = [(tuple(obj.location), kind(obj)) for obj in objects if isinstance(obj, GhostBlock)]
+    assert len({location for location, _ in blocks}) == len(blocks)
+    return sorted(blocks), sorted(goal_blocks)
+
+
+def isSolvable(blocks, goal_blocks)->bool:
+    have = Counter(kind for _, kind in blocks)
+    return all(have[kind] >= nr for kind, nr in Counter(kind for _, kind in goal_blocks).items())
+
+
+@pytest.mark.parametrize('average_blocks_per_room', [0.5, 2])
+def test_guarantee_goal_blocks(tmp_path, average_blocks_per_room):
+    nr_unsolvable = 0
+    for seed in range(1, 16):
+        blocks, goal_blocks = getBlocks(tmp_path, random_seed=seed, average_blocks_per_room=average_blocks_per_room)
+        guaranteed, guaranteed_goal_blocks = getBlocks(tmp_path, random_seed=seed, guarantee_goal_blocks=True,
+                                                       average_blocks_per_room=average_blocks_per_room)
+        assert guaranteed_goal_blocks == goal_blocks
+        assert isSolvable(guaranteed, goal_blocks)
+        if isSolvable(blocks, goal_blocks):
+            # nothing is missing, nothing changes
+            assert guaranteed == blocks
+        else:
+            nr_unsolvable += 1
+    # without the guarantee some of these worlds can not be solved
+    assert nr_unsolvable > 0
+
+
+def test_blocks_depend_on_random_seed_only(tmp_path):
+    random.seed(1)
+    blocks = getBlocks(tmp_path, random_seed=3, guarantee_goal_blocks=True)
+    random.seed(2)
+    assert getBlocks(tmp_path, random_seed=3, guarantee_goal_blocks=True) == blocks
+    assert getBlocks(tmp_path, random_seed=4, guarantee_goal_blocks=True) != blocks
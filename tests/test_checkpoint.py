@@ -0,0 +1,81 @@
+import contextlib
+import os
+import random
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+
+# The tick at which CrashingAgent raises, None to not crash. Not part
+# of the agent, so that a resumed agent does not crash again.
+crash_at_tick = None
+
+
+class CrashingAgent(Team40Agent):
+    '''
+    Team40Agent that stands in for a worker that dies at crash_at_tick.
+    '''
+    def decide_on_bw4t_action(self, state):
+        if crash_at_tick is not None and state['World']['nr_ticks'] >= crash_at_tick:
+            raise RuntimeError("crash")
+        return super().decide_on_bw4t_action(state)
+
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': CrashingAgent, 'settings': {}},
+          {'name': 'agent3', 'botclass': BaseLineAgent, 'settings': {'slowdown': 2}}]
+
+SETTINGS = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=300, checkpoint_interval=50, log_trust=True)
+
+
+def readLogs(world:BW4TWorld)->list:
+    '''
+    @return the contents of the log files of the world, in the order of its loggers
+    '''
+    logs = []
+    for logger in world.getGridWorld()._GridWorld__loggers:
+        with open(logger.file_name) as f:
+            logs.append(f.read())
+    return logs
+
+
+def runWorld(directory, crash_tick:int=None)->dict:
+    '''
+    Runs a world in the given directory, resuming from its checkpoint
+    when it crashes at crash_tick.
+    @return the logs of the run, see readLogs
+    '''
+    global crash_at_tick
+    directory.mkdir()
+    os.chdir(directory)
+    random.seed(1)
+    world = BW4TWorld(AGENTS, SETTINGS, log_dir='.')
+    crash_at_tick = crash_tick
+    try:
+        with pytest.raises(RuntimeError) if crash_tick is not None else contextlib.nullcontext():
+            world.run()
+    finally:
+        crash_at_tick = None
+    if crash_tick is not None:
+        assert os.path.exists(world.getCheckpointFileName())
+        # another process would start with another random state
+        random.seed(12345)
+        world = BW4TWorld.resume(world.getCheckpointFileName())
+        world.run()
+    assert not os.path.exists(world.getCheckpointFileName())
+    return readLogs(world)
+
+
+def test_resume_gives_same_logs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    uninterrupted = runWorld(tmp_path / 'uninterrupted')
+    resumed = runWorld(tmp_path / 'resumed', crash_tick=130)
+    assert len(resumed) == len(uninterrupted) == 2
+    for log, resumed_log in zip(uninterrupted, resumed):
+        assert len(log.splitlines()) > 100
+        assert resumed_log == log
+
+
+def test_needs_fast_forward():
+    with pytest.raises(ValueError):
+        BW4TWorld(AGENTS, dict(SETTINGS, fast_forward=False))
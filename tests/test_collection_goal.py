@@ -0,0 +1,83 @@
+import random
+import pytest
+from matrx.actions.object_actions import GrabObject, DropObject
+from agents1.Team40Agent import Team40Agent
+from bw4t.BW4TBrain import BW4TBrain
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.CollectionGoal import CollectionGoal
+from bw4t.Navigation import CachedNavigator
+
+
+class RebuildingGoal(CollectionGoal):
+    '''
+    CollectionGoal that forgets what the agents carried, so every check
+    rebuilds the index of the blocks at the drop zones and checks all zones.
+    '''
+    def isBlocksPlaced(self, grid_world):
+        self._CollectionGoal__carried = None
+        return super().isBlocksPlaced(grid_world)
+
+
+class ShufflingAgent(BW4TBrain):
+    '''
+    Walks along the goal locations of all zones, grabs the block it
+    finds on one and drops it on the next, so that blocks are also taken
+    from and dropped onto the drop zones out of order.
+    '''
+    def initialize(self):
+        super().initialize()
+        self._navigator = CachedNavigator(self.agent_id, self.getPathCache())
+        self._targets = None
+        self._nr = 0
+
+    def filter_bw4t_observations(self, state):
+        return state
+
+    def decide_on_bw4t_action(self, state):
+        index = self.getStateIndex()
+        if self._targets is None:
+            self._targets = [tuple(block['location']) for block in index.getGoalBlocks()]
+            self._navigator.add_waypoint(self._targets[0])
+        action = self._navigator.get_move_action(index)
+        if action is not None:
+            return action, {}
+        location = self._targets[self._nr]
+        self._nr = (self._nr + 1) % len(self._targets)
+        self._navigator.reset_full()
+        self._navigator.add_waypoint(self._targets[self._nr])
+        carrying = state[self.agent_id]['is_carrying']
+        if len(carrying) > 0:
+            return DropObject.__name__, {'object_id': carrying[0]['obj_id']}
+        blocks = index.getCollectablesAt(location)
+        if len(blocks) > 0:
+            return GrabObject.__name__, {'object_id': blocks[0]['obj_id']}
+        return None, {}
+
+
+@pytest.mark.parametrize('nr_drop_zones', [1, 3])
+def test_incremental_matches_full_check(tmp_path, nr_drop_zones):
+    random.seed(1)
+    agents = [{'name': f'agent{nr}', 'botclass': Team40Agent, 'settings': {}} for nr in range(4)]
+    agents.append({'name': 'shuffler', 'botclass': ShufflingAgent, 'settings': {'slowdown': 3}})
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=600, nr_drop_zones=nr_drop_zones,
+                    drop_zones_per_row=2, nr_rooms=12, rooms_per_row=4, average_blocks_per_room=4, log_async=False)
+    world = BW4TWorld(agents, settings, log_dir=str(tmp_path))
+    grid_world = world.getGridWorld()
+    goal, full = CollectionGoal(settings['deadline']), RebuildingGoal(settings['deadline'])
+    progress = []
+    done = False
+    while not done:
+        done = world.step()
+        assert goal.isBlocksPlaced(grid_world) == full.isBlocksPlaced(grid_world)
+        assert goal.getZoneProgress() == full.getZoneProgress()
+        assert goal.getCompletedZones() == full.getCompletedZones()
+        assert goal.getProgress() == full.getProgress()
+        progress.append(goal.getProgress())
+    world.flushLoggers()
+
+    zone_progress = goal.getZoneProgress()
+    assert sorted(zone_progress.keys()) == list(range(nr_drop_zones))
+    assert goal.getProgress() == sum(zone_progress.values()) / (nr_drop_zones * settings['nr_blocks_needed'])
+    # the agents deliver blocks, and the world's own goal agrees
+    assert max(progress) > 0
+    assert grid_world.simulation_goal.getZoneProgress() == zone_progress
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TEnv import BW4TEnv, EnvBrain, VectorBW4TEnv
+from bw4t.BW4TWorld import DEFAULT_WORLDSETTINGS
+from bw4t.Navigation import MOVES
+from bw4t.VectorWorld import IDLE
+
+AGENTS = [{'name': 'agent1', 'botclass': EnvBrain, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {}}]
+
+SETTINGS = dict(DEFAULT_WORLDSETTINGS, deadline=20)
+
+MOVE_SOUTH = list(MOVES.keys()).index('MoveSouth') + 1
+
+
+def getAgentLocation(env:BW4TEnv, observations:np.ndarray)->tuple:
+    '''
+    @return the location of the controlled agent in its observation
+    '''
+    agent = observations[0, env.getChannels().index('agent')]
+    locations = np.argwhere(agent == 1)
+    assert len(locations) == 1
+    return tuple(int(value) for value in locations[0])
+
+
+def runToEnd(env:BW4TEnv)->tuple:
+    '''
+    Lets the controlled agent idle until the episode is done.
+    @return (the last observations, the sum of the rewards, the info of the last step)
+    '''
+    total = 0.
+    done = False
+    while not done:
+        observations, reward, done, info = env.step([IDLE])
+        total += reward
+    return observations, total, info
+
+
+def test_reset_and_step(tmp_path):
+    env = BW4TEnv(AGENTS, SETTINGS, log_dir=str(tmp_path))
+    observations = env.reset(seed=1)
+    width, height = env.getWorld().getGridWorld().shape
+    assert env.getControlled() == ['agent1']
+    assert observations.shape == (1, len(env.getChannels()), width, height)
+    assert np.array_equal(env.reset(seed=1), observations)
+    x, y = getAgentLocation(env, observations)
+    assert (x, y) == env.getWorld().getGridWorld().registered_agents['agent1'].location
+
+    observations, reward, done, info = env.step([MOVE_SOUTH])
+    assert getAgentLocation(env, observations) == (x, y + 1)
+    assert not done and reward == 0.
+    assert info['deciding'].tolist() == [True]
+    tick = info['tick']
+    # no action, the agent stays
+    observations, _, _, info = env.step([IDLE])
+    assert getAgentLocation(env, observations) == (x, y + 1)
+    assert info['tick'] > tick
+    env.close()
+    assert sorted(os.listdir(tmp_path)) == ['episode_1', 'episode_2']
+
+
+def test_done_at_deadline():
+    env = BW4TEnv(AGENTS, SETTINGS)
+    env.reset(seed=2)
+    _, total, info = runToEnd(env)
+    assert info['tick'] >= SETTINGS['deadline']
+    assert total == info['progress'] < 1.
+    assert info['deciding'].tolist() == [False]
+    with pytest.raises(ValueError):
+        env.step([IDLE])
+    # the next episode starts over
+    env.reset(seed=2)
+    _, _, done, info = env.step([IDLE])
+    assert not done and info['tick'] < SETTINGS['deadline']
+    env.close()
+
+
+def test_vector_env_resets_done_envs():
+    env = BW4TEnv(AGENTS, SETTINGS)
+    # seeds 5 and 6 first, then 7 and 8
+    expected = [env.reset(seed=seed) for seed in [5, 6, 7, 8]]
+    env.reset(seed=5)
+    final_observation, _, _ = runToEnd(env)
+    env.close()
+
+    vector_env = VectorBW4TEnv(2, AGENTS, SETTINGS)
+    try:
+        observations = vector_env.reset(seed=5)
+        assert observations.shape == (2,) + expected[0].shape
+        assert all(np.array_equal(observations[nr], expected[nr]) for nr in range(2))
+        dones = np.zeros(2, dtype=bool)
+        while not dones.any():
+            observations, rewards, dones, infos = vector_env.step(np.full((2, 1), IDLE))
+        # both envs have the same deadline
+        assert dones.tolist() == [True, True]
+        assert np.array_equal(infos[0]['final_observation'], final_observation)
+        for nr in range(2):
+            assert np.array_equal(observations[nr], expected[2 + nr])
+            assert not np.array_equal(infos[nr]['final_observation'], observations[nr])
+        _, _, dones, infos = vector_env.step(np.full((2, 1), IDLE))
+        assert dones.tolist() == [False, False]
+        assert all('final_observation' not in info for info in infos)
+    finally:
+        vector_env.close()
@@ -0,0 +1,75 @@
+import gzip
+import random
+from collections import Counter
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.IdleCondition import IdleCondition
+
+# the number of decisions of each agent in the current run
+decisions = Counter()
+
+
+class CountingBaseLineAgent(BaseLineAgent):
+    def decide_on_bw4t_action(self, state):
+        decisions[self.agent_id] += 1
+        return super().decide_on_bw4t_action(state)
+
+
+class CountingTeam40Agent(Team40Agent):
+    def decide_on_bw4t_action(self, state):
+        decisions[self.agent_id] += 1
+        return super().decide_on_bw4t_action(state)
+
+
+AGENTS = [{'name': 'agent1', 'botclass': CountingBaseLineAgent, 'settings': {}},
+          {'name': 'agent2', 'botclass': CountingBaseLineAgent, 'settings': {'slowdown': 3}},
+          {'name': 'agent3', 'botclass': CountingTeam40Agent, 'settings': {'slowdown': 2}}]
+
+
+def runWorld(log_dir, idle_scheduling:bool):
+    '''
+    @return (the contents of the log files in the order of the loggers,
+    the number of decisions of each agent)
+    '''
+    decisions.clear()
+    random.seed(2)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=600, random_seed=2, log_async=False,
+                    log_events=True, log_trust=True, idle_scheduling=idle_scheduling)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    logs = []
+    for logger in world.getGridWorld()._GridWorld__loggers:
+        with (gzip.open if logger.file_name.endswith('.gz') else open)(logger.file_name, 'rb') as f:
+            logs.append(f.read())
+    return logs, dict(decisions)
+
+
+def test_same_logs_with_fewer_decisions(tmp_path):
+    logs, polled = runWorld(tmp_path / 'polled', False)
+    idle_logs, scheduled = runWorld(tmp_path / 'idle', True)
+    assert len(logs) == 3
+    assert idle_logs == logs
+    assert sum(scheduled.values()) < sum(polled.values())
+    for agent_id, nr_decisions in scheduled.items():
+        assert nr_decisions <= polled[agent_id]
+
+
+def test_condition():
+    doors = (True, False)
+    condition = IdleCondition(timeout=10)
+    condition.arm(5, doors, frozenset({'block1'}))
+    assert not condition.isWoken(14, doors, frozenset({'block1'}))
+    # a block that goes out of view does not wake, one that comes into view does
+    assert not condition.isWoken(6, doors, frozenset())
+    assert condition.isWoken(6, doors, frozenset({'block1', 'block2'}))
+    assert condition.isWoken(6, (True, True), frozenset({'block1'}))
+    assert condition.isWoken(15, doors, frozenset({'block1'}))
+    condition.messageArrived()
+    assert condition.isWoken(6, doors, frozenset({'block1'}))
+
+
+def test_condition_without_wake_reasons():
+    condition = IdleCondition(timeout=None, messages=False, doors=False, blocks=False)
+    condition.arm(0, None, None)
+    condition.messageArrived()
+    assert not condition.isWoken(1000, None, None)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from bw4t.BW4TWorld import DEFAULT_WORLDSETTINGS
+from bw4t.LayoutGenerator import Layout, LayoutGenerator
+
+GENERATED = dict(DEFAULT_WORLDSETTINGS, layout='generated', nr_rooms=12, rooms_per_row=4, nr_drop_zones=3,
+                 drop_zones_per_row=2)
+
+
+def describe(layout:Layout, nr_zones:int)->tuple:
+    return layout.getWorldSize(), layout.getRooms(), [layout.getDropZoneLoc(nr) for nr in range(nr_zones)]
+
+
+def oldGrid(ws:dict)->tuple:
+    '''
+    @return (world size, rooms) as BW4TWorld computed them before the LayoutGenerator
+    '''
+    nr_zones = ws['nr_drop_zones']
+    zones_per_row = nr_zones if ws['drop_zones_per_row'] <= 0 else min(ws['drop_zones_per_row'], nr_zones)
+    nr_zone_rows = int(np.ceil(nr_zones / zones_per_row))
+    nr_room_rows = np.ceil(ws['nr_rooms'] / ws['rooms_per_row'])
+    world_width = max(ws['rooms_per_row'] * ws['room_size'][0] + 2 * ws['hallway_space'],
+                      (zones_per_row + 1) * ws['hallway_space'] + zones_per_row) + 2
+    world_height = nr_room_rows * ws['room_size'][1] + (nr_room_rows + 1) * ws['hallway_space'] \
+        + ws['nr_blocks_needed'] + 2 + (nr_zone_rows - 1) * (ws['nr_blocks_needed'] + ws['hallway_space'])
+    rooms = []
+    for room_nr in range(ws['nr_rooms']):
+        row = np.floor(room_nr / ws['rooms_per_row'])
+        column = room_nr % ws['rooms_per_row']
+        room_x = int(1 + ws['hallway_space'] + (ws['room_size'][0] * column))
+        room_y = int(1 + ws['hallway_space'] * (row + 1) + row * ws['room_size'][1] + 1)
+        door_x = room_x + int(np.ceil(ws['room_size'][0] / 2))
+        door_y = room_y + ws['room_size'][1] - 1
+        rooms.append(((room_x, room_y), tuple(ws['room_size']), [(door_x, door_y)]))
+    return (int(world_width), int(world_height)), rooms
+
+
+@pytest.mark.parametrize('changes', [{}, {'nr_rooms': 7, 'rooms_per_row': 4}, {'room_size': (5, 5), 'hallway_space': 3},
+                                     {'nr_drop_zones': 5, 'drop_zones_per_row': 2}])
+def test_grid_is_the_old_layout(changes):
+    ws = dict(DEFAULT_WORLDSETTINGS, **changes)
+    world_size, rooms, _ = describe(LayoutGenerator(ws).generate(), ws['nr_drop_zones'])
+    assert (world_size, rooms) == oldGrid(ws)
+
+
+@pytest.mark.parametrize('layout_seed', range(1, 11))
+def test_generated_rooms(layout_seed):
+    ws = dict(GENERATED, layout_seed=layout_seed)
+    layout = LayoutGenerator(ws).generate()
+    (width, height), rooms, zones = describe(layout, ws['nr_drop_zones'])
+    (min_width, min_height), (max_width, max_height) = ws['room_size_range']
+    tiles = np.zeros((width, height), dtype=int)
+    for (x, y), (room_width, room_height), doors in rooms:
+        assert min_width <= room_width <= max_width and min_height <= room_height <= max_height
+        # inside the bounds and below the top hallway
+        assert x >= 1 + ws['hallway_space'] and y >= 1 + ws['hallway_space']
+        assert x + room_width <= width - 1 and y + room_height <= height - 1
+        tiles[x:x + room_width, y:y + room_height] += 1
+        assert 1 <= len(doors) <= ws['max_doors_per_room']
+        for door_x, door_y in doors:
+            # in the bottom wall, with an inner tile at its left
+            assert door_y == y + room_height - 1 and x + 2 <= door_x <= x + room_width - 2
+    # rooms do not overlap, walls of neighbouring rooms stand side by side
+    assert tiles.max() == 1
+    bottom = max(y + room_height for (_, y), (_, room_height), _ in rooms)
+    for x, y in zones:
+        assert 0 < x < width - 1 and bottom + ws['hallway_space'] <= y - ws['nr_blocks_needed'] + 1
+        assert y < height - 1
+
+
+def test_generated_depends_on_layout_seed_only():
+    layout = describe(LayoutGenerator(GENERATED).generate(), 3)
+    assert describe(LayoutGenerator(dict(GENERATED, random_seed=7)).generate(), 3) == layout
+    assert describe(LayoutGenerator(dict(GENERATED, layout_seed=2)).generate(), 3) != layout
+    assert LayoutGenerator.getKey(GENERATED) == LayoutGenerator.getKey(dict(GENERATED, random_seed=7))
+    # settings read from json have lists instead of tuples
+    assert LayoutGenerator.getKey(GENERATED) == \
+        LayoutGenerator.getKey(dict(GENERATED, room_size_range=[[5, 4], [8, 6]]))
+
+
+def test_save_and_load(tmp_path):
+    layout = LayoutGenerator(GENERATED).generate()
+    filename = str(tmp_path / 'layout.npz')
+    layout.save(filename, 'key')
+    assert describe(Layout.load(filename), 3) == describe(layout, 3)
+    assert describe(Layout.load(filename, 'key'), 3) == describe(layout, 3)
+    assert Layout.load(filename, 'other key') is None
+
+
+def test_layout_dir(tmp_path, monkeypatch):
+    ws = dict(GENERATED, layout_dir=str(tmp_path))
+    monkeypatch.setattr(LayoutGenerator, '_layouts', {})
+    layout = LayoutGenerator.get(ws)
+    assert LayoutGenerator.get(ws) is layout
+    assert len(list(tmp_path.glob('layout_*.npz'))) == 1
+
+    # another process loads the layout instead of making it
+    def generate(self):
+        raise AssertionError("the layout should have been loaded")
+    monkeypatch.setattr(LayoutGenerator, '_layouts', {})
+    monkeypatch.setattr(LayoutGenerator, 'generate', generate)
+    assert describe(LayoutGenerator.get(ws), 3) == describe(layout, 3)
+
+
+def test_bad_settings():
+    with pytest.raises(ValueError):
+        LayoutGenerator(dict(GENERATED, layout='maze')).generate()
+    with pytest.raises(ValueError):
+        LayoutGenerator(dict(GENERATED, room_size_range=((3, 4), (8, 6)))).generate()
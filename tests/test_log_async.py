@@ -0,0 +1,62 @@
+import gzip
+import random
+import time
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.BackgroundLogWriter import BackgroundLogWriter
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {'slowdown': 2}}]
+
+
+def runWorld(log_dir, **settings)->list:
+    '''
+    @return the contents of the log files in the order of the loggers
+    '''
+    random.seed(3)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=500, random_seed=3, log_events=True,
+                    **settings)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    logs = []
+    for logger in world.getGridWorld()._GridWorld__loggers:
+        with (gzip.open if logger.file_name.endswith('.gz') else open)(logger.file_name, 'rb') as f:
+            logs.append(f.read())
+    return logs
+
+
+@pytest.mark.parametrize('log_format', ['csv', 'binary'])
+def test_same_logs_as_sync(tmp_path, log_format):
+    logs = runWorld(tmp_path / 'sync', log_format=log_format, log_async=False)
+    async_logs = runWorld(tmp_path / 'async', log_format=log_format, log_async=True)
+    assert len(logs) == 2
+    assert all(len(log) > 0 for log in logs)
+    assert async_logs == logs
+
+
+def test_writer_keeps_order():
+    written = []
+    writer = BackgroundLogWriter(written.extend, queue_size=2, batch_size=3)
+    for nr in range(10):
+        writer.put({'nr': nr})
+    writer.drain()
+    # the last row waits for its batch to fill up
+    assert [row['nr'] for row in written] == list(range(9))
+    writer.close()
+    writer.close()
+    assert [row['nr'] for row in written] == list(range(10))
+    with pytest.raises(ValueError):
+        writer.put({'nr': 10})
+
+
+def test_writer_error():
+    def writeRows(rows):
+        time.sleep(0.01)
+        raise IOError("disk full")
+    writer = BackgroundLogWriter(writeRows, queue_size=1, batch_size=1)
+    with pytest.raises(IOError):
+        # the error of the thread comes out of a later call
+        for nr in range(10):
+            writer.put({'nr': nr})
+        writer.close()
@@ -0,0 +1,74 @@
+import random
+from types import SimpleNamespace
+from matrx.messages import Message
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.BW4TLogger import BW4TLogger
+
+
+def fullScan(grid_world)->dict:
+    '''
+    @return the message counts the way BW4TLogger.log counted them
+    before the counts were kept: by scanning all ticks on every call.
+    '''
+    gwmm = grid_world.message_manager
+    t = grid_world.current_nr_ticks-1
+    data = {}
+    for agent_id in grid_world.registered_agents.keys():
+        data[agent_id+'_mssg'] = 0
+        for i in range(0, t):
+            if i in gwmm.preprocessed_messages.keys():
+                for mssg in gwmm.preprocessed_messages[i]:
+                    if mssg.from_id == agent_id:
+                        data[agent_id+'_mssg'] += 1
+                        break
+    return data
+
+
+def atTick(messages:dict, agent_ids, tick:int):
+    '''
+    @return a stand-in for the GridWorld at the given tick, with the given
+    messages by tick as its message trace.
+    '''
+    return SimpleNamespace(current_nr_ticks=tick, registered_agents={agent_id: None for agent_id in agent_ids},
+                           message_manager=SimpleNamespace(preprocessed_messages=messages))
+
+
+def assertCountsMatch(messages:dict, agent_ids, ticks):
+    logger = BW4TLogger()
+    for tick in ticks:
+        grid_world = atTick(messages, agent_ids, tick)
+        assert logger._count_messages(grid_world) == fullScan(grid_world), f"tick {tick}"
+
+
+def test_recorded_trace(tmp_path):
+    random.seed(1)
+    agents = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+              {'name': 'agent2', 'botclass': Team40Agent, 'settings': {}},
+              {'name': 'agent3', 'botclass': BaseLineAgent, 'settings': {}}]
+    world = BW4TWorld(agents, dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=300), log_dir=str(tmp_path))
+    world.run()
+    grid_world = world._gridworld
+    messages = grid_world.message_manager.preprocessed_messages
+    assert sum(len(tick_messages) for tick_messages in messages.values()) > 0
+    agent_ids = list(grid_world.registered_agents.keys())
+    assertCountsMatch(messages, agent_ids, range(grid_world.current_nr_ticks + 1))
+
+
+def test_synthetic_trace():
+    # several messages of one agent in a tick, a sender that is not an agent,
+    # and ticks without messages
+    messages = {
+        0: [Message('a', 'agent1')],
+        1: [Message('b', 'agent1'), Message('c', 'agent1'), Message('d', 'agent2')],
+        3: [Message('e', 'god'), Message('f', 'agent2')],
+        4: [],
+        6: [Message('g', 'agent2'), Message('h', 'agent1')],
+    }
+    assertCountsMatch(messages, ['agent1', 'agent2'], range(10))
+
+
+def test_skipped_and_repeated_ticks():
+    messages = {tick: [Message(str(tick), f'agent{tick % 3}')] for tick in range(0, 40, 2)}
+    assertCountsMatch(messages, ['agent0', 'agent1', 'agent2'], [0, 1, 1, 5, 6, 6, 20, 21, 39, 45])
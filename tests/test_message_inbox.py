@@ -0,0 +1,51 @@
+from matrx.messages import Message
+from bw4t.MessageInbox import MessageInbox
+
+
+def fill(inbox:MessageInbox, contents):
+    for nr, content in enumerate(contents):
+        inbox.append(Message(content, f'agent{nr % 2}'))
+
+
+def test_list_like():
+    inbox = MessageInbox()
+    fill(inbox, ['a', 'b', 'c'])
+    assert len(inbox) == 3
+    assert [mssg.content for mssg in inbox] == ['a', 'b', 'c']
+    assert inbox[-1].content == 'c'
+    assert [mssg.content for mssg in inbox.getFrom('agent0')] == ['a', 'c']
+    assert inbox.getFrom('agent2') == []
+
+
+def test_new_messages_per_reader():
+    inbox = MessageInbox()
+    fill(inbox, ['a', 'b'])
+    assert [mssg.content for mssg in inbox.getNew('x')] == ['a', 'b']
+    fill(inbox, ['c'])
+    assert [mssg.content for mssg in inbox.getNew('x')] == ['c']
+    assert inbox.getNew('x') == []
+    assert [mssg.content for mssg in inbox.getNew('y')] == ['a', 'b', 'c']
+
+
+def test_eviction():
+    inbox = MessageInbox(max_messages=2)
+    fill(inbox, ['a', 'b', 'c', 'd', 'e'])
+    assert [mssg.content for mssg in inbox] == ['d', 'e']
+    assert [mssg.content for mssg in inbox.getFrom('agent0')] == ['e']
+    # only the retained messages are new
+    assert [mssg.content for mssg in inbox.getNew()] == ['d', 'e']
+    # the content of evicted messages is forgotten
+    assert inbox.hasContent('d') and inbox.hasContent('e')
+    assert not inbox.hasContent('a')
+    fill(inbox, ['d'])
+    assert inbox.hasContent('d')
+    fill(inbox, ['f', 'g'])
+    # 'd' was received twice, its last copy is gone now
+    assert not inbox.hasContent('d')
+
+
+def test_unhashable_content():
+    inbox = MessageInbox()
+    inbox.append(Message({'block': [1, 2]}, 'agent0'))
+    assert inbox.hasContent({'block': [1, 2]})
+    assert not inbox.hasContent({'block': [1, 3]})
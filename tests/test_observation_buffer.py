@@ -0,0 +1,87 @@
+import random
+import numpy as np
+import pytest
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.ObservationBuffer import ObservationBuffer, PLANES, PLANE_RANGES
+
+SETTINGS = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=10, block_sense_range=1, other_sense_range=7,
+                agent_sense_range=3, average_blocks_per_room=4)
+
+
+@pytest.fixture
+def world(tmp_path):
+    random.seed(1)
+    agents = [{'name': f'agent{nr}', 'botclass': BaseLineAgent, 'settings': {}} for nr in range(3)]
+    return BW4TWorld(agents, SETTINGS, log_dir=str(tmp_path)).getGridWorld()
+
+
+def makeBuffer(grid_world)->ObservationBuffer:
+    buffer = ObservationBuffer(grid_world, SETTINGS['block_colors'],
+                               {key: SETTINGS[key] for key in PLANE_RANGES.values()})
+    buffer.update(grid_world)
+    return buffer
+
+
+def inRange(location, other, sense_range)->bool:
+    return (location[0] - other[0]) ** 2 + (location[1] - other[1]) ** 2 <= sense_range ** 2
+
+
+def test_planes_at_the_border(world):
+    width, height = world.shape
+    bodies = list(world.registered_agents.values())
+    # in the top left and the bottom right corner, and in the middle
+    for body, location in zip(bodies, [(0, 0), (width - 1, height - 1), (width // 2, height // 2)]):
+        body.location = location
+    buffer = makeBuffer(world)
+    assert buffer.getPlanes()[buffer.getPlaneNr('block_shape')].max() >= 0
+    for nr, body in enumerate(bodies):
+        observation = buffer.getObservation(body.obj_id)
+        assert observation.getLocation() == body.location
+        for name in PLANES:
+            full = buffer.getPlanes()[buffer.getPlaneNr(name)]
+            plane, (x0, y0) = observation.getPlane(name)
+            sense_range = buffer.getRange(name)
+            for x in range(width):
+                for y in range(height):
+                    seen = inRange((x, y), body.location, sense_range)
+                    inside = 0 <= x - x0 < plane.shape[0] and 0 <= y - y0 < plane.shape[1]
+                    # the window holds all tiles in range, clipped to the world, and masks the others
+                    assert seen <= inside, (name, body.location, (x, y))
+                    if inside:
+                        assert bool(plane.mask[x - x0, y - y0]) != seen, (name, body.location, (x, y))
+                        assert plane.data[x - x0, y - y0] == full[x, y]
+
+
+def test_closed_doors(world):
+    doors = [obj for obj in world.environment_objects.values() if obj.obj_id in makeBuffer(world).getDoorIds()]
+    body = list(world.registered_agents.values())[0]
+    # in front of the first door, which is open
+    body.location = (doors[0].location[0], doors[0].location[1] + 1)
+    doors[0].open_door()
+    buffer = makeBuffer(world)
+    expected = [nr for nr, door_id in enumerate(buffer.getDoorIds())
+                if not world.environment_objects[door_id].is_open
+                and inRange(world.environment_objects[door_id].location, body.location, SETTINGS['other_sense_range'])]
+    assert len(expected) > 0
+    assert 0 not in expected
+    assert buffer.getObservation(body.obj_id).getClosedDoors() == expected
+    # near a corner, only the doors in range are seen
+    body.location = (0, 0)
+    buffer.update(world)
+    assert buffer.getObservation(body.obj_id).getClosedDoors() == []
+
+
+def test_agents(world):
+    bodies = list(world.registered_agents.values())
+    # at the border, one agent at the edge of the sense range and one just out of it
+    for body, location in zip(bodies, [(0, 1), (3, 1), (2, 5)]):
+        body.location = location
+    buffer = makeBuffer(world)
+    observation = buffer.getObservation(bodies[0].obj_id)
+    assert observation.getAgents() == {0: (0, 1), 1: (3, 1)}
+    assert buffer.getObservation(bodies[2].obj_id).getAgents() == {2: (2, 5)}
+    plane, origin = observation.getPlane('agent')
+    assert origin == (0, 0)
+    assert sorted(int(nr) for nr in plane.compressed() if nr >= 0) == [0, 1]
+    assert np.count_nonzero(buffer.getPlanes()[buffer.getPlaneNr('agent')] >= 0) == 3
@@ -0,0 +1,41 @@
+import gzip
+import random
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {}},
+          {'name': 'agent3', 'botclass': Team40Agent, 'settings': {'slowdown': 2}},
+          {'name': 'agent4', 'botclass': BaseLineAgent, 'settings': {'slowdown': 3}}]
+
+
+def runWorld(log_dir, parallel_agents:int):
+    '''
+    @return (the contents of the log files in the order of the loggers,
+    the python random state after the run)
+    '''
+    random.seed(2)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=600, random_seed=2, log_async=False,
+                    log_events=True, log_trust=True, parallel_agents=parallel_agents)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    logs = []
+    for logger in world.getGridWorld()._GridWorld__loggers:
+        with (gzip.open if logger.file_name.endswith('.gz') else open)(logger.file_name, 'rb') as f:
+            logs.append(f.read())
+    return logs, random.getstate()
+
+
+@pytest.mark.parametrize('parallel_agents', [1, 2])
+def test_same_logs_as_sequential(tmp_path, parallel_agents):
+    logs, random_state = runWorld(tmp_path / 'sequential', 0)
+    parallel_logs, parallel_random_state = runWorld(tmp_path / 'parallel', parallel_agents)
+    assert len(logs) == 3
+    assert parallel_logs == logs
+    assert parallel_random_state == random_state
+
+
+def test_needs_fast_forward():
+    with pytest.raises(ValueError):
+        BW4TWorld(AGENTS, dict(DEFAULT_WORLDSETTINGS, parallel_agents=2))
@@ -0,0 +1,58 @@
+import random
+import pytest
+from agents1.Team40Agent import Team40Agent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.Recorder import Recorder
+from bw4t.Replay import Replayer
+
+AGENTS = [{'name': f'agent{nr}', 'botclass': Team40Agent, 'settings': {}} for nr in range(4)]
+
+
+def describe(grid_world)->dict:
+    '''
+    @return the location and the ids of the carried objects of each agent
+    '''
+    return {agent_id: (tuple(body.location), [obj.obj_id for obj in body.is_carrying])
+            for agent_id, body in grid_world.registered_agents.items()}
+
+
+def record(log_dir)->tuple:
+    '''
+    Runs a recorded world.
+    @return (the file of the recording, the describe of the world at the start of each tick)
+    '''
+    random.seed(1)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=400, random_seed=1, record=True,
+                    snapshot_interval=50)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir))
+    grid_world = world.getGridWorld()
+    states = {}
+    done = False
+    while not done:
+        states[grid_world.current_nr_ticks] = describe(grid_world)
+        done = world.step()
+    states[grid_world.current_nr_ticks] = describe(grid_world)
+    world.flushLoggers()
+    recorder = [logger for logger in grid_world._GridWorld__loggers if isinstance(logger, Recorder)][0]
+    return recorder.getFileName(), states
+
+
+def test_seek(tmp_path):
+    filename, states = record(tmp_path)
+    # the agents carry blocks at the ticks that are sought
+    for tick in [100, 200, 240]:
+        assert any(carried for _, carried in states[tick].values())
+    replayer = Replayer(filename)
+    assert replayer.getNrTicks() == max(states.keys())
+    # forward past some snapshots, back, forward again, within an interval and before the first snapshot
+    for tick in [240, 100, 200, 20, 30, replayer.getNrTicks(), 0]:
+        replayer.seek(tick)
+        assert replayer.getTick() == tick
+        assert describe(replayer.getGridWorld()) == states[tick], f"tick {tick}"
+    # stepping on from a seek follows the recording too
+    replayer.seek(100)
+    for tick in range(101, 200):
+        replayer.step()
+        assert describe(replayer.getGridWorld()) == states[tick], f"tick {tick}"
+    with pytest.raises(ValueError):
+        replayer.seek(replayer.getNrTicks() + 1)
@@ -0,0 +1,71 @@
+import random
+import pandas as pd
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BinaryLog import BinaryLogWriter
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.statistics import Statistics, summarize
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {}},
+          {'name': 'agent3', 'botclass': BaseLineAgent, 'settings': {'slowdown': 2}}]
+
+
+def runWorld(log_dir, seed:int, log_format:str='csv', deadline:int=600)->str:
+    '''
+    @return the file name of the action log
+    '''
+    random.seed(seed)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=deadline, random_seed=seed,
+                    log_format=log_format)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    return world.getGridWorld()._GridWorld__loggers[0].file_name
+
+
+def describe(stats:Statistics)->tuple:
+    return (stats.getAgents(), stats.getMoves(), stats.getDrops(), stats.getMessages(), stats.isSucces(),
+            stats.getLastTick())
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_columns_and_binary_match_rows(tmp_path, seed):
+    csv_log = runWorld(tmp_path / 'csv', seed)
+    binary_log = runWorld(tmp_path / 'binary', seed, log_format='binary')
+    expected = describe(Statistics(csv_log))
+    assert len(expected[0]) == 3
+    assert sum(expected[1].values()) > 0 and sum(expected[2].values()) > 0
+    # chunks that end inside the log and one that holds all of it
+    for chunksize in [7, 100, 100000]:
+        assert describe(Statistics(csv_log, chunksize=chunksize)) == expected
+    assert describe(Statistics(binary_log)) == expected
+
+
+def writeEmptyLogs(directory):
+    '''
+    Writes a csv and a binary log with only their header, as a run that
+    stopped before its first tick leaves them.
+    '''
+    directory.mkdir()
+    (directory / 'actions.csv').write_text('done;agent1_acts;agent1_mssg;world_nr;tick_nr\n')
+    # the row stays in the buffer, only the header is written
+    BinaryLogWriter(str(directory / 'actions.bw4t')).append(
+        {'done': False, 'agent1_acts': None, 'agent1_mssg': 0, 'world_nr': 1, 'tick_nr': 0})
+
+
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_summarize_skips_empty_logs(tmp_path, chunksize):
+    runs = tmp_path / 'runs'
+    runWorld(runs / 'world_1', 1, deadline=300)
+    runWorld(runs / 'world_2', 2, deadline=300, log_format='binary')
+    expected = summarize(str(runs), chunksize=chunksize)
+    assert list(expected['runs']) == [2, 2, 2]
+
+    writeEmptyLogs(runs / 'world_3')
+    for filename in ['actions.csv', 'actions.bw4t']:
+        for size in [None, 7]:
+            stats = Statistics(str(runs / 'world_3' / filename), chunksize=size)
+            assert not stats.hasRows()
+            assert stats.getAgents() == ['agent1']
+            assert stats.getLastTick() is None and stats.isSucces() == 'False'
+    pd.testing.assert_frame_equal(summarize(str(runs), chunksize=chunksize), expected)
@@ -0,0 +1,55 @@
+import random
+from matrx.messages import Message
+from agents1.Team40Agent import Team40Agent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.Navigation import CachedNavigator
+
+
+class WalledOffNavigator(CachedNavigator):
+    '''
+    CachedNavigator that finds no path to the drop zones, as if they were walled off.
+    '''
+    def get_move_action(self, index):
+        zone = {tuple(block['location']) for block in index.getGoalBlocks()}
+        if self._current < len(self._waypoints) and self._waypoints[self._current] in zone:
+            return None
+        return super().get_move_action(index)
+
+
+class WalledOffAgent(Team40Agent):
+    def initialize(self):
+        super().initialize()
+        self._navigator = WalledOffNavigator(self.agent_id, self.getPathCache())
+
+
+def test_unreachable_drop_zone(tmp_path):
+    random.seed(1)
+    agents = [{'name': 'agent1', 'botclass': WalledOffAgent, 'settings': {}}]
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=600, random_seed=1, log_async=False)
+    world = BW4TWorld(agents, settings, log_dir=str(tmp_path))
+    grid_world = world.getGridWorld()
+    body = list(grid_world.registered_agents.values())[0]
+    # the number of ticks the agent has stood still with a block, the most of those
+    standing, most_standing = 0, 0
+    location, carried = None, False
+    done = False
+    while not done:
+        done = world.step()
+        carried = carried or len(body.is_carrying) > 0
+        standing = standing + 1 if len(body.is_carrying) > 0 and tuple(body.location) == location else 0
+        most_standing = max(most_standing, standing)
+        location = tuple(body.location)
+    world.flushLoggers()
+    assert carried
+    # it gives up on the drop zone and drops the block instead of waiting with it until the deadline
+    assert most_standing <= 2 * Team40Agent.MAX_DROP_ATTEMPTS
+
+
+def test_remove_delivered():
+    agent = Team40Agent({})
+    agent._teamMembers = ['agent2']
+    agent._activeObjectives = [{'location': (3, 4)}, {'location': (3, 5)}]
+    agent._removeDelivered([Message({'block': (3, 4)}, 'agent2'),
+                            Message('Dropped goal block {} at location (3, 5)', 'agent3'),
+                            Message('Dropped goal block {} at location (3, 4)', 'agent2')])
+    assert agent._activeObjectives == [{'location': (3, 5)}]
@@ -0,0 +1,40 @@
+import numpy as np
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import DEFAULT_WORLDSETTINGS
+from bw4t.VectorWorld import VectorWorld, validate, IDLE, OPEN_DOOR, CLOSE_DOOR
+
+AGENTS = [{'name': 'agent1', 'botclass': BaseLineAgent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {'slowdown': 2}}]
+
+
+def test_validate():
+    settings = dict(DEFAULT_WORLDSETTINGS, deadline=300)
+    assert validate(AGENTS, settings, [1, 2]) == []
+    assert validate(AGENTS, dict(settings, layout='generated', layout_seed=2), [1]) == []
+
+
+def test_many_doors():
+    # more doors than fit in 64 bits
+    settings = dict(DEFAULT_WORLDSETTINGS, nr_rooms=72, rooms_per_row=12, deadline=200)
+    assert validate(AGENTS, settings, [1]) == []
+    world = VectorWorld.fromSeeds(AGENTS, settings, [1, 2])
+    assert world.getOpenDoors().shape == (2, 72)
+    assert not world.getOpenDoors().any()
+
+    def doUntilDone(action:int, door:int):
+        # the agent of the first world acts on the door, the rest idles
+        actions = np.full(world.getDeciding().shape, IDLE, dtype=int)
+        targets = np.full(actions.shape, -1, dtype=int)
+        actions[0, 0], targets[0, 0] = action, door
+        while not world.getDeciding()[0, 0]:
+            world.step(np.full(actions.shape, IDLE, dtype=int))
+        world.step(actions, targets)
+        for _ in range(3):
+            world.step(np.full(actions.shape, IDLE, dtype=int))
+
+    doUntilDone(OPEN_DOOR, 70)
+    assert world.getOpenDoors()[0].tolist() == [door == 70 for door in range(72)]
+    assert not world.getOpenDoors()[1].any()
+    doUntilDone(OPEN_DOOR, 3)
+    doUntilDone(CLOSE_DOOR, 70)
+    assert world.getOpenDoors()[0].tolist() == [door == 3 for door in range(72)]
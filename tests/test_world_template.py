@@ -0,0 +1,61 @@
+import gzip
+import random
+import pytest
+from agents1.Team40Agent import Team40Agent
+from agents1.BW4TBaselineAgent import BaseLineAgent
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.WorldTemplate import WorldTemplate
+
+AGENTS = [{'name': 'agent1', 'botclass': Team40Agent, 'settings': {}},
+          {'name': 'agent2', 'botclass': BaseLineAgent, 'settings': {}}]
+
+
+def runWorld(log_dir, seed:int, **settings)->list:
+    '''
+    @return the contents of the log files in the order of the loggers
+    '''
+    random.seed(seed)
+    settings = dict(DEFAULT_WORLDSETTINGS, fast_forward=True, deadline=400, random_seed=seed, log_async=False,
+                    log_events=True, **settings)
+    world = BW4TWorld(AGENTS, settings, log_dir=str(log_dir)).run()
+    logs = []
+    for logger in world.getGridWorld()._GridWorld__loggers:
+        with (gzip.open if logger.file_name.endswith('.gz') else open)(logger.file_name, 'rb') as f:
+            logs.append(f.read())
+    return logs
+
+
+@pytest.fixture
+def builds(monkeypatch)->list:
+    '''
+    @return the list of the world sizes of the templates built from now on.
+    The templates cached so far are forgotten.
+    '''
+    monkeypatch.setattr(WorldTemplate, '_templates', {})
+    sizes = []
+    build = BW4TWorld._buildTemplate
+    def buildTemplate(self, world_size):
+        sizes.append(world_size)
+        return build(self, world_size)
+    monkeypatch.setattr(BW4TWorld, '_buildTemplate', buildTemplate)
+    return sizes
+
+
+@pytest.mark.parametrize('layout', [{}, {'layout': 'generated', 'nr_rooms': 8, 'rooms_per_row': 4}])
+def test_same_logs_as_built_from_scratch(tmp_path, builds, layout):
+    for seed in (1, 2):
+        scratch = runWorld(tmp_path / f'scratch{seed}', seed, cache_template=False, **layout)
+        # the first seed builds the template, the second one installs the cached one
+        cached = runWorld(tmp_path / f'cached{seed}', seed, **layout)
+        assert len(scratch) == 2
+        assert cached == scratch
+    assert len(builds) == 3
+
+
+def test_saved_template(tmp_path, builds):
+    logs = runWorld(tmp_path / 'built', 1, layout_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('template_*.pkl'))) == 1
+    # another process loads the template instead of building it
+    WorldTemplate._templates.clear()
+    assert runWorld(tmp_path / 'loaded', 1, layout_dir=str(tmp_path)) == logs
+    assert len(builds) == 1